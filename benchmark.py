@@ -0,0 +1,402 @@
+"""Benchmark the hot paths of graph construction, evaluation, permutation and parsing.
+
+Every benchmark uses fixed seeds and the embeddings shipped in the embeddings
+directory, so that results from different versions of the code, or from
+different machines, measure the same work.
+
+    python benchmark.py run [--output FILE] [--filter TEXT] [--repeat N]
+    python benchmark.py compare BASELINE CURRENT [--threshold FRACTION] [--import-budget SECONDS]
+                                                 [--racing-generations N]
+
+The run command times each benchmark and saves the results as JSON. The
+compare command reports the ratio of each current time to its baseline,
+and exits with a non-zero status if any benchmark has slowed by more than
+the threshold, if importing the command line interface takes longer
+than its budget, as checked by g560.import_budget, or if racing changes
+the individuals bred by a seeded search, as checked by g560.racing_check.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import redirect_stdout
+
+import numpy
+
+from g560.gp_graph import DEFAULT_GEWIRTZ_SVG_FILEPATH
+from g560.import_budget import DEFAULT_BUDGET as DEFAULT_IMPORT_BUDGET, check_import_budget
+from g560.racing_check import DEFAULT_GENERATIONS as DEFAULT_RACING_GENERATIONS, check_racing
+
+SEED = 0
+
+EMBEDDINGS_DIRPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embeddings')
+
+DEFAULT_RESULTS_FILEPATH = 'benchmark-results.json'
+
+# The registered benchmarks, mapping each name to a function which prepares
+# the benchmark and returns a callable doing the work to be timed
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _seeded_genome(seed=SEED):
+    from g560.population import Population
+    return Population.random(1, 8, 10, numpy.random.RandomState(seed))[0]
+
+
+def _quietly(function, *args, **kwargs):
+    with redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+@benchmark('gp_graph.make')
+def _gp_graph_make():
+    from g560 import gewirtz, gp_graph, petersen
+    g = gewirtz.make()
+    p = petersen.make()
+    return lambda: gp_graph.make(g, p)
+
+
+@benchmark('gp_graph.template_from_svg_file')
+def _template_from_svg_file():
+    from g560.gp_graph import template_from_svg_file
+    return lambda: template_from_svg_file.__wrapped__(DEFAULT_GEWIRTZ_SVG_FILEPATH)
+
+
+@benchmark('gp_graph.make_symmetrical_from_permutation')
+def _make_symmetrical_from_permutation():
+    from g560.gp_graph import make_symmetrical_from_permutation
+    genome = _seeded_genome()
+    make_symmetrical_from_permutation(genome)
+    return lambda: make_symmetrical_from_permutation(genome)
+
+
+@benchmark('cli.fitness')
+def _cli_fitness():
+    from g560.cli import fitness
+    genome = _seeded_genome()
+    # Compile the template before timing
+    fitness(genome)
+    return lambda: fitness(genome)
+
+
+@benchmark('distance.distance_report[rotation]')
+def _distance_report():
+    from g560.distance import distance_report
+    from g560.gp_graph import template_from_svg_file
+    template = template_from_svg_file(DEFAULT_GEWIRTZ_SVG_FILEPATH)
+    genome = _seeded_genome()
+    adjacency = template.adjacency(genome)
+    rotation = template.rotation(len(genome))
+    return lambda: distance_report(adjacency, rotation)
+
+
+@benchmark('short_cycles.short_cycles[g560,6]')
+def _short_cycles():
+    from g560.gp_graph import template_from_svg_file
+    from g560.short_cycles import short_cycles
+    adjacency = template_from_svg_file(DEFAULT_GEWIRTZ_SVG_FILEPATH).adjacency(_seeded_genome())
+    return lambda: short_cycles(adjacency, 6)
+
+
+@benchmark('racing.SampledEvaluator.mean_distances[100x8]')
+def _sampled_mean_distances():
+    from g560.gp_graph import template_from_svg_file
+    from g560.population import Population
+    from g560.racing import INITIAL_SOURCES, SampledEvaluator
+    genomes = Population.random(100, 8, 10, numpy.random.RandomState(SEED)).genomes()
+    sampler = SampledEvaluator(template_from_svg_file(DEFAULT_GEWIRTZ_SVG_FILEPATH), 8)
+    sources = numpy.stack([sampler.source_order(genome)[:INITIAL_SOURCES] for genome in genomes])
+    return lambda: sampler.mean_distances(genomes, sources)
+
+
+@benchmark('replacement.replacement_adjacency[circulant100000,petersen]')
+def _replacement_adjacency():
+    from g560 import petersen
+    from g560.replacement import circulant_adjacency, replacement_adjacency
+    base_adjacency = circulant_adjacency(100000, [1, 2, 3, 5, 8])
+    ports = numpy.array([numpy.random.RandomState(SEED + i).permutation(10) for i in range(8)])
+    return lambda: replacement_adjacency(base_adjacency, petersen.edges, ports)
+
+
+@benchmark('cycles.cycle_basis[g560]')
+def _cycle_basis():
+    from g560.cycles import cycle_basis
+    from g560.gp_graph import template_from_svg_file
+    adjacency = template_from_svg_file(DEFAULT_GEWIRTZ_SVG_FILEPATH).adjacency(_seeded_genome())
+    return lambda: cycle_basis(adjacency)
+
+
+@benchmark('spectrum.eigenvalues[dense]')
+def _spectrum_dense():
+    from g560.gp_graph import template_from_svg_file
+    from g560.spectrum import eigenvalues
+    adjacency = template_from_svg_file(DEFAULT_GEWIRTZ_SVG_FILEPATH).adjacency(_seeded_genome())
+    return lambda: eigenvalues(adjacency)
+
+
+@benchmark('spectrum.eigenvalues[rotation]')
+def _spectrum_rotation():
+    from g560.gp_graph import template_from_svg_file
+    from g560.spectrum import eigenvalues
+    template = template_from_svg_file(DEFAULT_GEWIRTZ_SVG_FILEPATH)
+    genome = _seeded_genome()
+    adjacency = template.adjacency(genome)
+    rotation = template.rotation(len(genome))
+    return lambda: eigenvalues(adjacency, rotation)
+
+
+@benchmark('steinhaus_johnson_trotter.permutations[8]')
+def _sjt_permutations():
+    from g560.steinhaus_johnson_trotter import permutations
+    items = tuple(range(8))
+    return lambda: sum(1 for _ in permutations(items))
+
+
+@benchmark('steinhaus_johnson_trotter.unrank_many[10]')
+def _sjt_unrank_many():
+    from g560.steinhaus_johnson_trotter import unrank_many
+    indexes = numpy.random.RandomState(SEED).randint(0, 3628800, size=10000)
+    return lambda: unrank_many(indexes, 10)
+
+
+@benchmark('permute.permute_by_distance')
+def _permute_by_distance():
+    from g560.permute import permute_by_distance
+    seq = tuple(range(10))
+    distances = numpy.random.RandomState(SEED).randint(0, 100, size=1000).tolist()
+
+    def run():
+        random.seed(SEED)
+        for distance in distances:
+            permute_by_distance(seq, distance)
+    return run
+
+
+@benchmark('permute.permute_many_by_distances')
+def _permute_many_by_distances():
+    from g560.permute import permute_many_by_distances
+    random_state = numpy.random.RandomState(SEED)
+    seqs = random_state.random_sample((10000, 10)).argsort(axis=1).astype(numpy.uint8)
+    distances = random_state.randint(0, 100, size=len(seqs))
+    return lambda: permute_many_by_distances(seqs, distances, numpy.random.RandomState(SEED))
+
+
+def _embedding_filepaths():
+    return sorted(glob.glob(os.path.join(EMBEDDINGS_DIRPATH, '*.svg')))
+
+
+def _register_svg_benchmarks():
+    for svg_filepath in _embedding_filepaths():
+        filename = os.path.basename(svg_filepath)
+
+        def parse(svg_filepath=svg_filepath):
+            from g560.read_svg_embedding import embeddings_from_svg_file
+            return lambda: embeddings_from_svg_file.__wrapped__(svg_filepath, use_sidecar=False)
+
+        def load(svg_filepath=svg_filepath):
+            from g560.read_svg_embedding import embeddings_from_svg_file
+            # Ensure the sidecar exists, so only loading it is timed
+            embeddings_from_svg_file.__wrapped__(svg_filepath)
+            return lambda: embeddings_from_svg_file.__wrapped__(svg_filepath)
+
+        benchmark('read_svg_embedding.parse[{}]'.format(filename))(parse)
+        benchmark('read_svg_embedding.sidecar[{}]'.format(filename))(load)
+
+
+_register_svg_benchmarks()
+
+
+@benchmark('cli.main[population=20,generations=3]')
+def _cli_main():
+    from g560.cli import main
+    return lambda: _quietly(main, 20, seed=SEED, generations=3)
+
+
+@benchmark('optimize.search_shard[prefix=0-1-2]')
+def _optimize_search_shard():
+    import optimize
+    # A bounded slice of find_optimal_permutations_for_node(): the 7! permutations
+    # of one shard of the first vertex, searched from scratch each time
+    optimize.node_problems(DEFAULT_GEWIRTZ_SVG_FILEPATH)
+
+    def run():
+        checkpoint_dirpath = tempfile.mkdtemp(prefix='g560-benchmark-')
+        try:
+            optimize.search_shard(DEFAULT_GEWIRTZ_SVG_FILEPATH, 0, (0, 1, 2), checkpoint_dirpath)
+        finally:
+            shutil.rmtree(checkpoint_dirpath)
+    return run
+
+
+def time_callable(function, repeat=5, min_time=0.2):
+    """Time a callable, calling it enough times per repetition to take at least min_time seconds.
+
+    Returns:
+        A dictionary of the median and minimum seconds per call, the number of
+        calls per repetition, and the number of repetitions.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        'seconds': statistics.median(timings),
+        'min_seconds': min(timings),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(names=None, repeat=5, min_time=0.2):
+    """Run benchmarks, printing each result as it is obtained.
+
+    Args:
+        names: The names of the benchmarks to run. Defaults to all of them.
+        repeat: The number of timed repetitions of each benchmark.
+        min_time: The least duration in seconds of each repetition.
+
+    Returns:
+        A dictionary describing the environment and the results.
+    """
+    names = list(BENCHMARKS) if names is None else names
+    results = OrderedDict()
+    for name in names:
+        result = time_callable(BENCHMARKS[name](), repeat, min_time)
+        print("{:<60} {:>12.6f} s".format(name, result['seconds']))
+        results[name] = result
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'benchmarks': results,
+    }
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """Compare two sets of results, as returned by run_benchmarks().
+
+    Args:
+        baseline: The results against which to compare.
+        current: The results to be compared.
+        threshold: The fractional slowdown beyond which a benchmark has regressed.
+
+    Returns:
+        A list of (name, baseline_seconds, current_seconds, ratio, status) tuples for
+        the benchmarks in both, where status is 'regression', 'improvement' or 'ok'.
+    """
+    comparisons = []
+    for name, result in current['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        baseline_seconds = baseline['benchmarks'][name]['seconds']
+        ratio = result['seconds'] / baseline_seconds
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        comparisons.append((name, baseline_seconds, result['seconds'], ratio, status))
+    return comparisons
+
+
+def _load_results(filepath):
+    with open(filepath) as results_file:
+        return json.load(results_file)
+
+
+def run_command(args):
+    names = [name for name in BENCHMARKS if args.filter is None or args.filter in name]
+    results = run_benchmarks(names, repeat=args.repeat, min_time=args.min_time)
+    with open(args.output, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    print("Results written to", args.output)
+    return 0
+
+
+def compare_command(args):
+    baseline = _load_results(args.baseline)
+    current = _load_results(args.current)
+    comparisons = compare_results(baseline, current, args.threshold)
+    for name, baseline_seconds, current_seconds, ratio, status in comparisons:
+        print("{:<60} {:>12.6f} {:>12.6f} {:>7.2f}x {}".format(
+            name, baseline_seconds, current_seconds, ratio, status.upper() if status == 'regression' else status))
+    missing = sorted(set(baseline['benchmarks']) - set(current['benchmarks']))
+    if missing:
+        print("Not in current results:", ', '.join(missing))
+    regressions = [comparison for comparison in comparisons if comparison[4] == 'regression']
+    if regressions:
+        print("{} of {} benchmarks regressed by more than {:.0%}".format(
+            len(regressions), len(comparisons), args.threshold), file=sys.stderr)
+    failures = []
+    if args.import_budget > 0:
+        failures.extend(check_import_budget(args.import_budget))
+    if args.racing_generations > 0:
+        failures.extend(check_racing(generations=args.racing_generations))
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if regressions or failures else 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the g560 code.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks and save the results as JSON.")
+    run_parser.add_argument('--output', default=DEFAULT_RESULTS_FILEPATH,
+                            help="The JSON file in which the results are saved.")
+    run_parser.add_argument('--filter', default=None,
+                            help="Run only the benchmarks whose names contain this text.")
+    run_parser.add_argument('--repeat', type=int, default=5,
+                            help="The number of timed repetitions of each benchmark.")
+    run_parser.add_argument('--min-time', type=float, default=0.2,
+                            help="The least duration in seconds of each repetition.")
+    run_parser.set_defaults(function=run_command)
+
+    compare_parser = subparsers.add_parser('compare', help="Compare results against a baseline.")
+    compare_parser.add_argument('baseline', help="A JSON file of baseline results.")
+    compare_parser.add_argument('current', help="A JSON file of results to compare with the baseline.")
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="The fractional slowdown beyond which a benchmark has regressed.")
+    compare_parser.add_argument('--import-budget', type=float, default=DEFAULT_IMPORT_BUDGET,
+                                help="The greatest acceptable median time to import the command line"
+                                     " interface, in seconds, or 0 to skip the check.")
+    compare_parser.add_argument('--racing-generations', type=int, default=DEFAULT_RACING_GENERATIONS,
+                                help="The number of generations of the seeded search which must breed the same"
+                                     " individuals with racing as without, or 0 to skip the check.")
+    compare_parser.set_defaults(function=compare_command)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    sys.exit(args.function(args))
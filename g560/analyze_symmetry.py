@@ -1,8 +1,6 @@
 from collections import Counter
 from itertools import chain
 
-from asq import query
-
 from g560.read_svg_embedding import vertex_and_edge_lists_from_svg_file
 
 
@@ -61,6 +59,8 @@ def extract_symmetry_from_vertex_and_edge_lists(vertices, edges):
         the returned structure will describe 8*10*7=560 connections
         between vertices, when in fact the graph has only 280 edges.
     """
+    from asq import query
+
     # Add all edges in both directions to help us find symmetries
     reversed_edges = ((b, a) for a, b in edges)
     all_edges = chain(edges, reversed_edges)
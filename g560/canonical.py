@@ -0,0 +1,62 @@
+"""Canonical forms of genomes under the automorphisms of the Petersen graph.
+
+Petersen vertex P of each cluster is attached to the gene[P]-th out-edge of
+its Gewirtz vertex. Relabelling the vertices of a cluster by an automorphism
+a of the Petersen graph preserves the edges within it, and attaches vertex
+a[P] to the out-edge formerly attached to P, so the gene becomes gene[a]
+when viewed as a mapping. Since every cluster using one gene can be relabelled
+by the same automorphism, independently of the clusters using the other
+genes, genomes whose genes are related gene by gene in this way make
+isomorphic g560 graphs, with the same fitness.
+
+The canonical form of a gene is the lexicographically least of its images
+under the 120 automorphisms, and the canonical form of a genome is that of
+each of its genes. Keying fitness caches on canonical genomes means each of
+these classes of up to 120^8 equivalent genomes is evaluated only once.
+"""
+from functools import lru_cache
+
+import numpy
+
+from g560 import petersen
+
+
+@lru_cache()
+def gene_automorphisms():
+    """The automorphisms of the Petersen graph as an integer array of shape (120, 10)."""
+    automorphisms = numpy.array(petersen.automorphisms(), dtype=numpy.intp)
+    automorphisms.flags.writeable = False
+    return automorphisms
+
+
+def canonical_genes(genes, automorphisms=None):
+    """Replace each gene by the least of its images under a group of automorphisms.
+
+    Args:
+        genes: An integer array of shape (..., gene_length) of genes.
+        automorphisms: An optional integer array of shape (num_automorphisms, gene_length),
+            each row a permutation of the positions of a gene. Defaults to
+            those of the Petersen graph.
+
+    Returns:
+        An array of the same shape and type as genes, in which each gene is the
+        lexicographically least gene[a] for the automorphisms a.
+    """
+    genes = numpy.asarray(genes)
+    automorphisms = gene_automorphisms() if automorphisms is None else numpy.asarray(automorphisms)
+    # images[..., i, :] is genes[..., automorphisms[i]]
+    images = genes[..., automorphisms]
+    # Narrow down the images which are least at each position in turn
+    least = numpy.ones(images.shape[:-1], dtype=bool)
+    maximum = numpy.iinfo(numpy.intp).max
+    for position in range(images.shape[-1]):
+        values = numpy.where(least, images[..., position], maximum)
+        least &= values == values.min(axis=-1)[..., numpy.newaxis]
+    chosen = numpy.argmax(least, axis=-1).ravel()
+    flat_images = images.reshape((-1,) + images.shape[-2:])
+    return flat_images[numpy.arange(len(flat_images)), chosen].reshape(genes.shape)
+
+
+def canonical_genome(genome, automorphisms=None):
+    """The canonical form of a single genome, as a tuple of tuples."""
+    return tuple(map(tuple, canonical_genes(numpy.asarray(genome), automorphisms).tolist()))
@@ -0,0 +1,40 @@
+"""Atomic checkpoints for long-running searches.
+
+Checkpoints are JSON files. Each is written to a temporary file which is
+flushed to disk and then renamed over the previous checkpoint, so a process
+killed at any moment leaves either the old checkpoint or the new one, never a
+partial file.
+"""
+import json
+import os
+
+import numpy
+
+
+def write_json_atomically(filepath, data):
+    """Write data as JSON to a file, replacing any existing file atomically."""
+    temporary_filepath = filepath + '.tmp'
+    with open(temporary_filepath, 'w') as json_file:
+        json.dump(data, json_file)
+        json_file.flush()
+        os.fsync(json_file.fileno())
+    os.replace(temporary_filepath, filepath)
+
+
+def read_json(filepath):
+    with open(filepath) as json_file:
+        return json.load(json_file)
+
+
+def random_state_to_json(random_state):
+    """The state of a numpy.random.RandomState as a JSON-serializable list."""
+    name, keys, position, has_gauss, cached_gaussian = random_state.get_state()
+    return [name, keys.tolist(), position, has_gauss, cached_gaussian]
+
+
+def random_state_from_json(data):
+    """A numpy.random.RandomState in the state returned by random_state_to_json()."""
+    name, keys, position, has_gauss, cached_gaussian = data
+    random_state = numpy.random.RandomState()
+    random_state.set_state((name, numpy.array(keys, dtype=numpy.uint32), position, has_gauss, cached_gaussian))
+    return random_state
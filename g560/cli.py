@@ -1,57 +1,54 @@
+import argparse
+import os
 import random
-from functools import lru_cache
-from itertools import accumulate, zip_longest, tee, chain, islice
+import sys
+from collections import OrderedDict
+from itertools import zip_longest, tee, chain
+from multiprocessing import Pool
 
-import math
-from networkx import average_shortest_path_length
+import numpy
 
-from g560.gp_graph import make_symmetrical_from_permutation
-from g560.permute import make_perms, permute_by_distance
-from g560.zipf import zipf
+from g560.checkpoint import read_json, random_state_from_json, random_state_to_json, write_json_atomically
+from g560.distance import SearchBuffers, symmetric_distance_profile
+from g560.fitness_store import FitnessCache, FitnessStore, decode_genome, embedding_digest, encode_genome
+from g560.gp_graph import GPTemplate, template_from_svg_file, DEFAULT_GEWIRTZ_SVG_FILEPATH
+from g560.incremental import IncrementalEvaluator
+from g560.islands import DEFAULT_MIGRATION_TIMEOUT
+from g560.permute import permute_many_by_distances
+from g560.population import Population, rank_scaled_fitnesses, stochastic_universal_indexes
+from g560.racing import DEFAULT_Z, SampledEvaluator, race
+from g560.shared import attach_arrays, release_arrays, share_arrays
+from g560.telemetry import PROFILERS, Telemetry, open_sink
+from g560.zipf import BoundedZipf
 
 
-def make_random_genotype(num_genes, gene_length):
-    perms = make_perms(gene_length)
-    genome = tuple(random.choice(perms) for _ in range(num_genes))
-    return genome
+# The GA operations below, on sequences of genomes, are kept for existing callers.
+# They are thin wrappers over g560.population.Population, which main() uses directly.
 
+def _random_state(random_state):
+    # Without a RandomState, draw from the random module as these functions always have
+    return numpy.random.RandomState(random.getrandbits(32)) if random_state is None else random_state
 
-def make_random_population(population_size, num_genes, gene_length):
-    return tuple(make_random_genotype(num_genes, gene_length)
-            for _ in range(population_size))
 
+def make_random_genotype(num_genes, gene_length, random_state=None):
+    return Population.random(1, num_genes, gene_length, _random_state(random_state))[0]
 
-def rank(fitnesses, individuals, most_to_least_fit_survival_ratio=2, maximize=True):
-    # Sort from most fit to least fit
-    ranked_fitnesses, ranked_individuals = map(list, zip(*sorted(zip(fitnesses, individuals), reverse=maximize)))
-    base = exponent_base(most_to_least_fit_survival_ratio, len(ranked_fitnesses))
-    scaled_fitnesses = [pow(base, -i) for i in range(len(ranked_fitnesses))]
-    return scaled_fitnesses, ranked_individuals
+
+def make_random_population(population_size, num_genes, gene_length, random_state=None):
+    return tuple(Population.random(population_size, num_genes, gene_length, _random_state(random_state)).genomes())
 
 
-def exponent_base(r, n):
-    return math.pow(1 / r, 1 / (1 - n))
+def rank(fitnesses, individuals, most_to_least_fit_survival_ratio=2, maximize=True):
+    scaled_fitnesses, ranked = Population.from_genomes(individuals).rank(
+        fitnesses, most_to_least_fit_survival_ratio, maximize)
+    return scaled_fitnesses.tolist(), ranked.genomes()
 
 
 def stochastic_universal_sample(sorted_fitnesses, sorted_individuals, num_selected, phase=None):
     if phase is None:
         phase = random.uniform(0.0, 1.0)
-    elif not (0.0 <= phase <= 1.0):
-        raise ValueError("phase {} out of range 0 to 1")
-    cumulative_fitness = list(accumulate(sorted_fitnesses))
-    total_fitness = cumulative_fitness[-1]
-    spacing = total_fitness / num_selected
-    start = phase * spacing
-    pointers = [start + i * spacing for i in range(num_selected)]
-
-    survivors = []
-    index = 0
-    for pointer in pointers:
-        while cumulative_fitness[index] < pointer:
-            index += 1
-        survivors.append(sorted_individuals[index])
-
-    return survivors
+    population = Population.from_genomes(sorted_individuals)
+    return population.stochastic_universal_sample(sorted_fitnesses, num_selected, None, phase).genomes()
 
 
 def batches(iterable, n, fillvalue=None):
@@ -76,32 +73,239 @@ def wrapped_pairwise(iterable):
     return zip(a, chain(b, single(first)))
 
 
-def uniform_crossover(parents):
-    return tuple(map(random.choice, zip(*parents)))
+def uniform_crossover(parents, random_state=None):
+    first, second = parents
+    children = Population.from_genomes([first]).uniform_crossover(
+        Population.from_genomes([second]), 1, _random_state(random_state))
+    return children[0]
 
 
-def zipf_mutation(individual, mutation_distribution):
-    return type(individual)(permute_by_distance(perm, distance)
-                            for perm, distance in zip(individual, iter(mutation_distribution.rvs, None)))
+def zipf_mutation(population, mutation_distribution, random_state):
+    """Mutate every gene of every individual in a population at once.
 
+    One distance is drawn for each gene of each individual in a single sample,
+    and each gene is permuted by its distance.
 
-@lru_cache(maxsize=10000)
-def fitness(genome):
-    # Construct a 560 according the the genome
-    graph = make_symmetrical_from_permutation(genome)
-    # Return the average shortest path length
-    aspl = average_shortest_path_length(graph)
-    print(aspl, genome)
-    return aspl
+    Args:
+        population: A Population.
+        mutation_distribution: A BoundedZipf distribution of distances.
+        random_state: A numpy.random.RandomState from which the random choices are drawn.
+
+    Returns:
+        A Population of the mutated genomes.
+    """
+    genes = population.genes
+    distances = mutation_distribution.rvs(genes.shape[0] * genes.shape[1], random_state)
+    mutated = permute_many_by_distances(genes.reshape(-1, genes.shape[2]), distances, random_state)
+    return Population(mutated.reshape(genes.shape))
 
 
-def shuffle(lst):
-    items = lst.copy()
-    random.shuffle(items)
-    return items
+def fitness(genome, gewirtz_svg_filepath=DEFAULT_GEWIRTZ_SVG_FILEPATH):
+    return template_fitness(template_from_svg_file(gewirtz_svg_filepath), genome)
 
 
-def main(population_size):
+def template_fitness(template, genome, buffers=None):
+    # Construct a 560 according the the genome
+    adjacency = template.adjacency(genome)
+    # Return the average shortest path length, searching only from one vertex
+    # in each orbit of the rotational symmetry the genome inherits from the embedding
+    return symmetric_distance_profile(adjacency, template.rotation(len(genome)), buffers).aspl
+
+
+# The template, and the search buffers reused by every evaluation, in a worker process
+_worker_template = None
+_worker_buffers = None
+
+
+def _initialize_worker(gewirtz_svg_filepath, shared_dirpath=None):
+    global _worker_template, _worker_buffers
+    if shared_dirpath is None:
+        # Compile the template once, up front, rather than in the first evaluation
+        _worker_template = template_from_svg_file(gewirtz_svg_filepath)
+    else:
+        # Attach the template the parent shared, without reading the embedding
+        _worker_template = GPTemplate.from_arrays(attach_arrays(shared_dirpath))
+    _worker_buffers = SearchBuffers()
+
+
+def _evaluate_in_worker(genome):
+    return template_fitness(_worker_template, genome, _worker_buffers)
+
+
+def evaluate_population(individuals, lineages, cache, evaluator, pool=None, keys=None):
+    """Compute the fitness of each individual in a population.
+
+    Each distinct key which is not already in the cache is evaluated once,
+    for the first individual with that key, either in this process using the
+    incremental evaluator, or by the workers of a process pool.
+
+    Args:
+        individuals: A sequence of genomes.
+        lineages: A sequence of the same length as individuals, each element of
+            which is a sequence of genomes from which the individual was derived.
+        cache: A FitnessCache, which will be updated with the newly
+            evaluated genomes.
+        evaluator: An IncrementalEvaluator used when pool is None.
+        pool: An optional multiprocessing pool initialized with _initialize_worker().
+        keys: An optional sequence of the same length as individuals of the
+            genomes under which their fitnesses are cached, such as their
+            canonical forms. Individuals with the same key must have the same
+            fitness. Defaults to the individuals themselves.
+
+    Returns:
+        A list of fitnesses corresponding to individuals.
+    """
+    keys = individuals if keys is None else keys
+    known = cache.get_many(keys)
+
+    pending = OrderedDict()
+    for individual, key, lineage in zip(individuals, keys, lineages):
+        if key not in known:
+            pending.setdefault(key, (individual, lineage))
+
+    evaluated = _evaluate_exactly(pending, evaluator, pool)
+    cache.put_many(evaluated)
+    known.update(evaluated)
+
+    return [known[key] for key in keys]
+
+
+def _evaluate_exactly(pending, evaluator, pool=None):
+    """Evaluate the exact fitnesses of an OrderedDict mapping keys to (individual, lineage) pairs.
+
+    Returns:
+        A list of (key, fitness) pairs, in the order of pending.
+    """
+    if pool is None:
+        return [(key, evaluator.evaluate(individual, bases=lineage))
+                for key, (individual, lineage) in pending.items()]
+    return list(zip(pending, pool.map(_evaluate_in_worker, [individual for individual, _ in pending.values()])))
+
+
+def race_population(individuals, lineages, cache, evaluator, sampler, num_exact, pool=None, keys=None, z=DEFAULT_Z,
+                    selections=None):
+    """Compute the fitness of each individual in a population only as precisely as is needed to select from it.
+
+    Fitnesses not already in the cache are estimated from samples of their
+    sources, which are refined until the selection from the population is
+    decided, as in g560.racing.race(). The num_exact best individuals are
+    evaluated exactly as by evaluate_population(), and only exact fitnesses
+    are cached. Genomes which are only estimated are not counted as misses
+    of the cache.
+
+    Args:
+        individuals, lineages, cache, evaluator, pool, keys: As for evaluate_population().
+        sampler: A g560.racing.SampledEvaluator.
+        num_exact: The number of best individuals whose fitnesses must be exact.
+        z: The half-width of the confidence intervals, in standard errors.
+        selections: An optional array of the number of times the individual at
+            each rank is selected. If None, the whole order is decided.
+
+    Returns:
+        A 4-tuple of a list of fitnesses corresponding to individuals, some of
+        which are estimates, the number of distinct genomes evaluated
+        exactly, the set of the keys estimated instead, and the number of
+        sources searched from in making estimates.
+    """
+    keys = individuals if keys is None else keys
+    known = cache.get_many(keys)
+    lineage_of = {}
+    for key, lineage in zip(keys, lineages):
+        lineage_of.setdefault(key, lineage)
+    num_evaluated = 0
+
+    def evaluate_exact(pending):
+        nonlocal num_evaluated
+        evaluated = _evaluate_exactly(
+            OrderedDict((key, (individual, lineage_of[key])) for key, individual in pending.items()), evaluator, pool)
+        cache.put_many(evaluated)
+        num_evaluated += len(evaluated)
+        return evaluated
+
+    fitnesses, estimated, num_sources = race(individuals, keys, known, sampler, evaluate_exact, num_exact, z,
+                                             selections=selections)
+    cache.misses -= len(estimated)
+    return fitnesses, num_evaluated, estimated, num_sources
+
+
+# The version of the layout of GA checkpoint files
+_CHECKPOINT_FORMAT = 1
+
+
+def save_checkpoint(filepath, settings, generation, individuals, lineages, best, random_state, cache):
+    """Atomically save the state of the search at the end of a generation.
+
+    Args:
+        filepath: The JSON file in which the checkpoint is saved.
+        settings: A dictionary of the settings which a resumed search must share.
+        generation: The number of generations completed.
+        individuals: The Population to be evaluated in the next generation.
+        lineages: The lineages of those individuals.
+        best: The best genome found so far.
+        random_state: The numpy.random.RandomState of the search.
+        cache: The FitnessCache of the search.
+    """
+    write_json_atomically(filepath, {
+        'format': _CHECKPOINT_FORMAT,
+        'settings': settings,
+        'generation': generation,
+        'individuals': individuals.genes.tolist(),
+        'lineages': [[encode_genome(genome).hex() for genome in lineage] for lineage in lineages],
+        'best': best,
+        'random_state': random_state_to_json(random_state),
+        'cache': {
+            'items': [[encode_genome(genome).hex(), fitness] for genome, fitness in cache.items()],
+            'hits': cache.hits,
+            'misses': cache.misses,
+        },
+    })
+
+
+def load_checkpoint(filepath, settings, cache):
+    """Load the state of a search saved by save_checkpoint().
+
+    Args:
+        filepath: The JSON file in which the checkpoint was saved.
+        settings: The settings of the search being resumed, which must match those saved.
+        cache: A FitnessCache, into which the saved cache is restored.
+
+    Returns:
+        A 5-tuple of the number of generations completed, the individuals, their
+        lineages, the best genome and the random state.
+
+    Raises:
+        ValueError: If the checkpoint is incompatible with the settings.
+    """
+    checkpoint = read_json(filepath)
+    if checkpoint.get('format') != _CHECKPOINT_FORMAT:
+        raise ValueError("Checkpoint {} has an unsupported format".format(filepath))
+    for name, value in settings.items():
+        if checkpoint['settings'].get(name) != value:
+            raise ValueError("Checkpoint {} was made with {} {!r}, not {!r}".format(
+                filepath, name, checkpoint['settings'].get(name), value))
+    individuals = Population(checkpoint['individuals'])
+    gene_length = individuals.gene_length
+
+    def decode(key):
+        return decode_genome(bytes.fromhex(key), gene_length)
+
+    lineages = [tuple(map(decode, lineage)) for lineage in checkpoint['lineages']]
+    best = checkpoint['best']
+    if best is not None:
+        best = tuple(map(tuple, best))
+    cache.restore(((decode(key), fitness) for key, fitness in checkpoint['cache']['items']),
+                  checkpoint['cache']['hits'], checkpoint['cache']['misses'])
+    return checkpoint['generation'], individuals, lineages, best, random_state_from_json(checkpoint['random_state'])
+
+
+def shuffle(lst, random_state=None):
+    return Population.from_genomes(lst).shuffle(_random_state(random_state)).genomes()
+
+
+def main(population_size, workers=1, seed=None, gewirtz_svg_filepath=DEFAULT_GEWIRTZ_SVG_FILEPATH,
+         store_filepath=None, cache_size=10000, generations=None, telemetry=None,
+         checkpoint_filepath=None, checkpoint_interval=10, resume=False, migrate=None, label=None,
+         racing=False, racing_z=DEFAULT_Z):
     num_children_per_couple = 2
     if population_size % num_children_per_couple != 0:
         raise ValueError("Population size must be even")
@@ -111,10 +315,16 @@ def main(population_size):
 
     elite_count = 2  # Retain the best four
     incomers_count = 2
+    most_to_least_fit_survival_ratio = 10
 
     assert elite_count % num_children_per_couple == 0
     assert incomers_count % num_children_per_couple == 0
 
+    # All random choices are made in this process, in the same order regardless
+    # of the number of workers, and evaluation is deterministic, so a given
+    # seed reproduces the same search however it is parallelized.
+    random_state = numpy.random.RandomState(seed)
+
     # Create initial population
     elite = (
         (
@@ -129,42 +339,264 @@ def main(population_size):
         ),
     )
 
-    individuals = make_random_population(population_size - len(elite), num_genes, gene_length) + elite
+    individuals = Population.concatenate([
+        Population.random(population_size - len(elite), num_genes, gene_length, random_state),
+        Population.from_genomes(elite)])
+
+    # The genomes from which each individual was derived, used as the starting
+    # points for incrementally evaluating their fitness.
+    lineages = [()] * len(individuals)
+
+    # Retain distances for two generations, so parents are always available.
+    template = template_from_svg_file(gewirtz_svg_filepath)
+    evaluator = IncrementalEvaluator(
+        num_vertices=template.num_vertices,
+        intra_edges=template.intra_edges,
+        inter_edges=template.inter_edges,
+        capacity=2 * population_size)
+    if store_filepath is None:
+        fitness_cache = FitnessCache(cache_size)
+    else:
+        fitness_cache = FitnessStore(store_filepath, embedding_digest(gewirtz_svg_filepath), cache_size)
+    # Estimates fitnesses from sampled sources, when racing
+    sampler = SampledEvaluator(template, num_genes) if racing else None
+
+    generation = 0
+    best = None
+
+    # A resumed search continues exactly as the original would have, because
+    # the random state and every other input to the next generation is restored
+    settings = {
+        'population_size': population_size,
+        'num_genes': num_genes,
+        'gene_length': gene_length,
+        'embedding': embedding_digest(gewirtz_svg_filepath),
+    }
+    if resume and checkpoint_filepath is not None and os.path.exists(checkpoint_filepath):
+        generation, individuals, lineages, best, random_state = load_checkpoint(
+            checkpoint_filepath, settings, fitness_cache)
+        print("Resumed from {} after generation {}".format(checkpoint_filepath, generation))
+
+    # Workers attach the template through shared memory rather than each compiling their own
+    shared_dirpath = share_arrays(template.arrays()) if workers > 1 else None
+    try:
+        pool = (Pool(workers, initializer=_initialize_worker, initargs=(gewirtz_svg_filepath, shared_dirpath))
+                if workers > 1 else None)
+    except BaseException:
+        if shared_dirpath is not None:
+            release_arrays(shared_dirpath)
+        raise
 
-    mutation_distribution = zipf(population_size * num_genes, 2.5)
+    mutation_distribution = BoundedZipf(population_size * num_genes, 2.5)
 
-    best = None
+    telemetry = telemetry or Telemetry()
+    # Distinguishes the output of concurrent searches, such as islands
+    prefix = "{} ".format(label) if label else ""
 
     try:
-        while True:
+        while generations is None or generation < generations:
+            generation += 1
+            telemetry.start_generation(generation)
+            hits, misses = fitness_cache.hits, fitness_cache.misses
+            construction_seconds = evaluator.construction_seconds
+
+            # Selection depends only on ranks, so once the phase of its pointers is
+            # drawn, racing knows how many times the individual at each rank is selected
+            num_survivors = (len(individuals) - elite_count - incomers_count) // num_children_per_couple
+            phase = random_state.uniform(0.0, 1.0)
+
+            # Evaluation - graph construction is timed separately only when evaluating in this process
+            with telemetry.phase('evaluation'):
+                # Fitnesses are cached under canonical genomes, so individuals making
+                # isomorphic graphs by way of Petersen automorphisms are evaluated once
+                genomes = individuals.genomes()
+                keys = individuals.canonical().genomes()
+                if sampler is None:
+                    fitnesses = evaluate_population(genomes, lineages, fitness_cache, evaluator, pool, keys)
+                    evaluations = fitness_cache.misses - misses
+                    exact_fitnesses = fitnesses
+                    racing_fields = {}
+                else:
+                    # The elite must be exact, being carried forward and reported as best, as must any emigrants
+                    num_exact = max(elite_count, getattr(migrate, 'num_migrants', 0))
+                    selections = numpy.bincount(
+                        stochastic_universal_indexes(
+                            rank_scaled_fitnesses(len(individuals), most_to_least_fit_survival_ratio),
+                            num_survivors, phase),
+                        minlength=len(individuals))
+                    fitnesses, evaluations, estimated, num_sources = race_population(
+                        genomes, lineages, fitness_cache, evaluator, sampler, num_exact, pool, keys, racing_z,
+                        selections)
+                    exact_fitnesses = [fitness for fitness, key in zip(fitnesses, keys) if key not in estimated]
+                    racing_fields = dict(estimated=len(estimated), sampled_sources=num_sources)
+            construction_seconds = evaluator.construction_seconds - construction_seconds
+            telemetry.add_time('evaluation', -construction_seconds)
+            telemetry.add_time('construction', construction_seconds)
 
             # Selection
-            fitnesses = [fitness(individual) for individual in individuals]
-            print(sorted(fitnesses))
-            ranked_fitnesses, ranked_individuals = rank(fitnesses, individuals, most_to_least_fit_survival_ratio=10,  maximize=False)  # minimize
+            with telemetry.phase('selection'):
+                ranked_fitnesses, ranked_individuals = individuals.rank(fitnesses, most_to_least_fit_survival_ratio,  maximize=False)  # minimize
 
-            best = ranked_individuals[0]
-            elite = ranked_individuals[:elite_count]
+                best = ranked_individuals[0]
+                elite = ranked_individuals[:elite_count]
 
-            num_survivors = (len(individuals) - elite_count - incomers_count) // num_children_per_couple
-            survivors = stochastic_universal_sample(ranked_fitnesses, ranked_individuals, num_survivors)
+                survivors = ranked_individuals.stochastic_universal_sample(ranked_fitnesses, num_survivors, random_state,
+                                                                           phase)
 
-            # Combination
-            shuffled_parents = shuffle(survivors)
-            couples = list(wrapped_pairwise(shuffled_parents))
-            children = [uniform_crossover(couple) for couple in couples for _ in range(num_children_per_couple)]
+            # Migration - a callable exchanging the ranked individuals with other populations
+            immigrants = None
+            if migrate is not None:
+                with telemetry.phase('migration'):
+                    immigrants = migrate(generation, ranked_individuals)
 
-            # Mutation
-            mutated_child_population = [zipf_mutation(individual, mutation_distribution) for individual in children]
+            # Combination - each parent is coupled with the next, wrapping around
+            with telemetry.phase('crossover'):
+                shuffled_parents = survivors.shuffle(random_state)
+                partners = shuffled_parents[numpy.roll(numpy.arange(len(shuffled_parents)), -1)]
+                children = shuffled_parents.uniform_crossover(partners, num_children_per_couple, random_state)
+                couples = list(zip(shuffled_parents.genomes(), partners.genomes()))
+                child_lineages = [couple for couple in couples for _ in range(num_children_per_couple)]
 
-            # Make room for the elite
-            mutated_child_population.extend(elite)
-            mutated_child_population.extend(make_random_population(incomers_count, num_genes, gene_length))
-            assert len(mutated_child_population) == len(individuals)
-            individuals = mutated_child_population
+            # Mutation
+            with telemetry.phase('mutation'):
+                mutated_children = zipf_mutation(children, mutation_distribution, random_state)
+
+            # Make room for the elite, and any immigrants, who take the places
+            # of the random incomers and then of the last children
+            with telemetry.phase('replacement'):
+                num_immigrants = 0 if immigrants is None else len(immigrants)
+                num_incomers = max(incomers_count - num_immigrants, 0)
+                num_children = len(mutated_children) - max(num_immigrants - incomers_count, 0)
+                incomers = Population.random(num_incomers, num_genes, gene_length, random_state)
+                newcomers = [incomers] if immigrants is None else [immigrants, incomers]
+                mutated_child_population = Population.concatenate([mutated_children[:num_children], elite] + newcomers)
+                assert len(mutated_child_population) == len(individuals)
+                individuals = mutated_child_population
+                lineages = (child_lineages[:num_children] + [(individual,) for individual in elite.genomes()]
+                            + [()] * (num_immigrants + num_incomers))
+
+            if checkpoint_filepath is not None and (generation % checkpoint_interval == 0 or generation == generations):
+                with telemetry.phase('checkpoint'):
+                    save_checkpoint(checkpoint_filepath, settings, generation, individuals, lineages, best,
+                                    random_state, fitness_cache)
+
+            evaluation_seconds = telemetry.phase_seconds('evaluation', 'construction')
+            record = telemetry.end_generation(
+                evaluations=evaluations,
+                evaluations_per_second=evaluations / evaluation_seconds if evaluation_seconds > 0 else None,
+                cache_hits=fitness_cache.hits - hits,
+                cache_misses=fitness_cache.misses - misses,
+                cache_hit_rate=fitness_cache.statistics()['hit_rate'],
+                best_fitness=float(min(exact_fitnesses)),
+                median_fitness=float(numpy.median(exact_fitnesses)),
+                **racing_fields)
+            print("{prefix}Generation {generation} : best {best_fitness:.6f} median {median_fitness:.6f}"
+                  " {evaluations} evaluations in {wall_seconds:.3f} s".format(
+                      prefix=prefix, **record))
     finally:
-        print("Best :", best)
+        if pool is not None:
+            pool.terminate()
+            release_arrays(shared_dirpath)
+        telemetry.close()
+        print(prefix + "Fitness cache :", fitness_cache.statistics())
+        print(prefix + "Best :", best)
+    return best
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Search for g560 graphs with a small average shortest path length.")
+    parser.add_argument('--population-size', type=int, default=100,
+                        help="The number of individuals in each generation.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="The number of processes used to evaluate fitness.")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="Seed for the random number generators, for reproducible searches.")
+    parser.add_argument('--embedding', default=DEFAULT_GEWIRTZ_SVG_FILEPATH,
+                        help="An SVG file containing a symmetrical embedding of the Gewirtz graph.")
+    parser.add_argument('--store', default=None,
+                        help="An SQLite database in which fitnesses are persisted and shared between searches.")
+    parser.add_argument('--cache-size', type=int, default=10000,
+                        help="The number of fitnesses held in memory.")
+    parser.add_argument('--telemetry', default=None,
+                        help="Where to write a JSON record of each generation: a file, '-' for standard"
+                             " output, or a socket as tcp://host:port or unix://path.")
+    parser.add_argument('--profile-generation', type=int, default=None,
+                        help="The number of a generation to run under a profiler.")
+    parser.add_argument('--profiler', choices=PROFILERS, default='cprofile',
+                        help="Profile the chosen generation's time with cProfile, or its memory with tracemalloc.")
+    parser.add_argument('--profile-output', default=None,
+                        help="The file in which the profile is saved.")
+    parser.add_argument('--checkpoint', default=None,
+                        help="A JSON file in which the state of the search is periodically saved.")
+    parser.add_argument('--checkpoint-interval', type=int, default=10,
+                        help="The number of generations between checkpoints.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the search from the checkpoint, if it exists.")
+    parser.add_argument('--generations', type=int, default=None,
+                        help="The generation after which to stop, counting any completed before resuming."
+                             " By default the search runs until interrupted.")
+    parser.add_argument('--racing', action='store_true',
+                        help="Estimate fitnesses from samples of their sources, refining them only as far as"
+                             " is needed to select the same individuals as exact fitnesses would. The elite"
+                             " are always evaluated exactly.")
+    parser.add_argument('--racing-z', type=float, default=DEFAULT_Z,
+                        help="The half-width of the confidence intervals of the estimates, in standard errors.")
+    parser.add_argument('--islands', type=int, default=1,
+                        help="The number of populations evolved in separate processes, exchanging migrants.")
+    parser.add_argument('--migration-interval', type=int, default=10,
+                        help="The number of generations between migrations between islands.")
+    parser.add_argument('--migrants', type=int, default=2,
+                        help="The number of its best individuals each island sends in each migration.")
+    parser.add_argument('--topology', choices=('ring', 'random'), default='ring',
+                        help="Send migrants to the next island in a fixed ring, or in a new random ring each time.")
+    parser.add_argument('--transport', choices=('queue', 'socket'), default='queue',
+                        help="Exchange migrants through multiprocessing queues, or through stream sockets at"
+                             " the --island-addresses, by default Unix domain sockets in a temporary directory.")
+    parser.add_argument('--island-addresses', nargs='+', default=None, metavar='ADDRESS',
+                        help="The socket address of each island, as unix://path or tcp://host:port, for the"
+                             " socket transport.")
+    parser.add_argument('--local-islands', type=int, nargs='+', default=None, metavar='INDEX',
+                        help="The indexes of the islands to run in this process, when the others are run"
+                             " elsewhere, such as on other machines. By default all are run here.")
+    parser.add_argument('--migration-timeout', type=float, default=DEFAULT_MIGRATION_TIMEOUT,
+                        help="The number of seconds an island waits for its immigrants before failing.")
+    args = parser.parse_args(argv)
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume requires --checkpoint")
+    if args.islands > 1 and args.checkpoint is not None:
+        parser.error("--checkpoint is not supported with --islands")
+    if args.islands > 1 and args.profile_generation is not None:
+        parser.error("--profile-generation is not supported with --islands")
+    if args.island_addresses is not None:
+        if args.transport != 'socket':
+            parser.error("--island-addresses requires --transport socket")
+        if len(args.island_addresses) != args.islands:
+            parser.error("--island-addresses needs one address for each of the {} islands".format(args.islands))
+    if args.local_islands is not None and args.island_addresses is None:
+        parser.error("--local-islands requires --island-addresses")
+    return args
 
 
 if __name__ == '__main__':
-    main(100)
+    args = parse_args(sys.argv[1:])
+    if args.islands > 1:
+        from g560.islands import run_islands
+        bests = run_islands(args.islands, args.population_size, generations=args.generations,
+                            migration_interval=args.migration_interval, num_migrants=args.migrants,
+                            topology=args.topology, transport=args.transport, seed=args.seed,
+                            telemetry_target=args.telemetry, workers=args.workers,
+                            gewirtz_svg_filepath=args.embedding, store_filepath=args.store,
+                            cache_size=args.cache_size, racing=args.racing, racing_z=args.racing_z,
+                            addresses=args.island_addresses, local_islands=args.local_islands,
+                            migration_timeout=args.migration_timeout)
+        print("Best :", min((best for best in bests if best is not None),
+                            key=lambda genome: fitness(genome, args.embedding), default=None))
+    else:
+        telemetry = Telemetry(open_sink(args.telemetry) if args.telemetry is not None else None,
+                              profile_generation=args.profile_generation, profiler=args.profiler,
+                              profile_filepath=args.profile_output)
+        main(args.population_size, workers=args.workers, seed=args.seed, gewirtz_svg_filepath=args.embedding,
+             store_filepath=args.store, cache_size=args.cache_size, generations=args.generations,
+             telemetry=telemetry, checkpoint_filepath=args.checkpoint, checkpoint_interval=args.checkpoint_interval,
+             resume=args.resume, racing=args.racing, racing_z=args.racing_z)
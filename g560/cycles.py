@@ -1,39 +1,327 @@
-from itertools import combinations
+"""The cycle space of a graph over GF(2), as packed bit vectors.
 
-import networkx
+Each edge set of a graph is a vector over GF(2) with one bit per edge, packed
+into 64-bit words in the same bit order as the bitsets of g560.distance.
+The symmetric difference of edge sets is then the XOR of their vectors, so
+any combination of cycles, of two basis cycles or of many, is a handful of
+vectorized operations on an array of words rather than the construction of
+subgraphs. The cycle space is spanned by the fundamental cycles of a
+spanning forest, one for each edge not in the forest.
 
-from g560 import gewirtz
+Graphs are represented by adjacency arrays, as in g560.distance.
+"""
+import sys
+import time
 
+import numpy
 
-def symmetric_difference(graph, cycle_a, cycle_b):
-    # get edges
-    edges_a = list(graph.subgraph(cycle_a).edges())
-    edges_b = list(graph.subgraph(cycle_b).edges())
+from g560.distance import adjacency_array, popcounts, unpack
+from g560.short_cycles import enumerate_cycles
 
-    # also get reverse edges as graph undirected
-    edges_a += [e[::-1] for e in edges_a]
-    edges_b += [e[::-1] for e in edges_b]
+_WORD = numpy.dtype('<u8')
 
-    # find edges that are in either but not in both
-    edges_c = set(edges_a) ^ set(edges_b)
 
-    cycle_c = frozenset(networkx.Graph(list(edges_c)).nodes())
-    return cycle_c
+def edge_list(adjacency):
+    """The edges of the graph with an adjacency array, and the index of each edge in each slot of the array.
+
+    Returns:
+        A 2-tuple of an integer array of shape (m, 2) of the edges (u, v),
+        with u < v, in lexicographic order, and an integer array with the shape
+        of the adjacency array holding the index of the edge from u to
+        adjacency[u, j], or -1 for padding.
+    """
+    n, degree = adjacency.shape
+    tails = numpy.repeat(numpy.arange(n), degree)
+    heads = adjacency.ravel()
+    forward = heads < n
+    lesser = numpy.minimum(tails, heads)
+    greater = numpy.maximum(tails, heads)
+    keys = lesser * (n + 1) + greater
+    unique_keys, slot_edges = numpy.unique(keys[forward], return_inverse=True)
+    slots = numpy.full(n * degree, -1, dtype=numpy.intp)
+    slots[forward] = slot_edges
+    edges = numpy.column_stack(divmod(unique_keys, n + 1))
+    return edges, slots.reshape(n, degree)
+
+
+def pack(bits):
+    """Pack an array of bools into bit vectors, the inverse of g560.distance.unpack().
+
+    Args:
+        bits: An array of shape (..., num_bits) of bools.
+
+    Returns:
+        An array of shape (..., num_words) of 64-bit words.
+    """
+    bits = numpy.asarray(bits, dtype=bool)
+    num_words = max(1, (bits.shape[-1] + 63) // 64)
+    padded = numpy.zeros(bits.shape[:-1] + (num_words * 64,), dtype=bool)
+    padded[..., :bits.shape[-1]] = bits
+    octets = numpy.packbits(padded.reshape(padded.shape[:-1] + (num_words * 8, 8))[..., ::-1], axis=-1)
+    return numpy.ascontiguousarray(octets.reshape(bits.shape[:-1] + (num_words * 8,))).view(_WORD)
+
+
+def cycle_basis(adjacency, edges=None, slots=None):
+    """A basis of the cycle space of a graph, of the fundamental cycles of a breadth-first spanning forest.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        edges, slots: Optionally, the result of edge_list(adjacency).
+
+    Returns:
+        An array of shape (m - n + c, num_words) of bit vectors over the edges,
+        where c is the number of connected components.
+    """
+    if edges is None or slots is None:
+        edges, slots = edge_list(adjacency)
+    n = len(adjacency)
+    num_edges = len(edges)
+    num_words = max(1, (num_edges + 63) // 64)
+    # paths[v] is the edge set of the forest path from the root of v's tree to v
+    paths = numpy.zeros((n, num_words), dtype=_WORD)
+    visited = numpy.zeros(n, dtype=bool)
+    in_forest = numpy.zeros(num_edges, dtype=bool)
+    for root in range(n):
+        if visited[root]:
+            continue
+        visited[root] = True
+        layer = [root]
+        while layer:
+            next_layer = []
+            for u in layer:
+                for v, edge in zip(adjacency[u].tolist(), slots[u].tolist()):
+                    if v < n and not visited[v]:
+                        visited[v] = True
+                        in_forest[edge] = True
+                        paths[v] = paths[u]
+                        paths[v, edge // 64] ^= numpy.uint64(1) << numpy.uint64(edge % 64)
+                        next_layer.append(v)
+            layer = next_layer
+    chords = numpy.flatnonzero(~in_forest)
+    basis = paths[edges[chords, 0]] ^ paths[edges[chords, 1]]
+    basis[numpy.arange(len(chords)), chords // 64] ^= numpy.left_shift(
+        numpy.ones(len(chords), dtype=_WORD), (chords % 64).astype(_WORD))
+    return basis
+
+
+def combine(vectors, coefficients):
+    """Sum vectors over GF(2).
+
+    Args:
+        vectors: An array of shape (b, num_words) of bit vectors, such as a cycle basis.
+        coefficients: An array of shape (k, b) of bools, selecting the vectors in each of k sums.
+
+    Returns:
+        An array of shape (k, num_words) of the sums.
+    """
+    coefficients = numpy.asarray(coefficients, dtype=bool)
+    sums = numpy.zeros((len(coefficients), vectors.shape[1]), dtype=_WORD)
+    for index, column in enumerate(coefficients.T):
+        sums[column] ^= vectors[index]
+    return sums
+
+
+def pairwise_sums(vectors):
+    """The sums over GF(2) of every pair of vectors.
+
+    Returns:
+        A 2-tuple of an array of shape (b * (b - 1) / 2, num_words) of the
+        sums, and a 2-tuple of the arrays of first and second indexes of the
+        vectors in each pair.
+    """
+    first, second = numpy.triu_indices(len(vectors), 1)
+    return vectors[first] ^ vectors[second], (first, second)
+
+
+def lengths(vectors):
+    """The number of edges in each edge set."""
+    return popcounts(vectors).sum(axis=-1).astype(numpy.intp)
+
+
+def rank(vectors):
+    """The rank over GF(2) of a set of vectors, by Gaussian elimination.
+
+    Args:
+        vectors: An array of shape (k, num_words) of bit vectors.
+    """
+    rows = numpy.array(vectors, dtype=_WORD)
+    result = 0
+    for bit in range(rows.shape[1] * 64):
+        word, mask = bit // 64, numpy.uint64(1) << numpy.uint64(bit % 64)
+        candidates = numpy.flatnonzero(rows[result:, word] & mask) + result
+        if len(candidates) == 0:
+            continue
+        pivot = candidates[0]
+        rows[[result, pivot]] = rows[[pivot, result]]
+        others = candidates[1:]
+        rows[others] ^= rows[result]
+        result += 1
+        if result == len(rows):
+            break
+    return result
+
+
+def _slot_bits(vectors, slots):
+    """For each edge set, whether the edge in each slot of the adjacency array is in the set."""
+    num_edges = slots.max() + 1
+    bits = unpack(vectors, num_edges)
+    padded = numpy.column_stack((bits, numpy.zeros(len(bits), dtype=bool)))
+    return padded[:, slots]
+
+
+def vertex_degrees(vectors, slots):
+    """The degree of each vertex in each of a set of edge sets.
+
+    Args:
+        vectors: An array of shape (k, num_words) of bit vectors.
+        slots: The second result of edge_list().
+
+    Returns:
+        An integer array of shape (k, n).
+    """
+    return _slot_bits(vectors, slots).sum(axis=-1)
+
+
+def is_simple_cycle(vectors, adjacency, slots):
+    """Determine which edge sets are single simple cycles.
+
+    An edge set is a simple cycle if every vertex has degree zero or two in
+    it, and a walk along its edges from any of its vertices first returns
+    after traversing all of them. The walks along every edge set are taken
+    together, a step at a time.
+
+    Args:
+        vectors: An array of shape (k, num_words) of bit vectors.
+        adjacency: An adjacency array of shape (n, d).
+        slots: The second result of edge_list(adjacency).
+
+    Returns:
+        An array of bools, one per edge set.
+    """
+    # Bound the memory of the per-slot arrays, which are k * n * d elements
+    chunk_size = max(1, 2 ** 22 // slots.size)
+    if len(vectors) > chunk_size:
+        return numpy.concatenate([is_simple_cycle(vectors[start:start + chunk_size], adjacency, slots)
+                                  for start in range(0, len(vectors), chunk_size)])
+    slot_bits = _slot_bits(vectors, slots)
+    degrees = slot_bits.sum(axis=-1)
+    simple = ((degrees == 0) | (degrees == 2)).all(axis=1) & (degrees.sum(axis=1) > 0)
+    rows = numpy.flatnonzero(simple)
+    num_edges = lengths(vectors[rows])
+    start = numpy.argmax(degrees[rows] > 0, axis=1)
+    previous = numpy.full(len(rows), -1)
+    current = start
+    steps = numpy.zeros(len(rows), dtype=numpy.intp)
+    walking = numpy.ones(len(rows), dtype=bool)
+    for step in range(1, int(num_edges.max()) + 1 if len(rows) else 0):
+        # Leave each vertex by its edge in the set which does not lead back
+        exits = slot_bits[rows[:, numpy.newaxis], current[:, numpy.newaxis], numpy.arange(adjacency.shape[1])]
+        exits &= adjacency[current] != previous[:, numpy.newaxis]
+        following = adjacency[current, numpy.argmax(exits, axis=1)]
+        previous, current = current, numpy.where(walking, following, current)
+        returned = walking & (current == start)
+        steps[returned] = step
+        walking &= ~returned
+    simple[rows] = steps == num_edges
+    return simple
+
+
+def cycle_vectors(cycles, slots, adjacency):
+    """The bit vectors of cycles given as sequences of vertices.
+
+    Args:
+        cycles: An integer array of shape (k, length), each row a cycle of vertices.
+        slots: The second result of edge_list(adjacency).
+        adjacency: An adjacency array of shape (n, d).
+
+    Returns:
+        An array of shape (k, num_words) of bit vectors.
+    """
+    num_edges = slots.max() + 1
+    tails = cycles
+    heads = numpy.roll(cycles, -1, axis=1)
+    # The slot of each cycle edge in the row of the adjacency array of its tail
+    columns = numpy.argmax(adjacency[tails] == heads[..., numpy.newaxis], axis=-1)
+    edge_indexes = slots[tails, columns]
+    bits = numpy.zeros((len(cycles), num_edges), dtype=bool)
+    bits[numpy.arange(len(cycles))[:, numpy.newaxis], edge_indexes] = True
+    return pack(bits)
+
+
+def short_cycle_vectors(adjacency, max_length, slots=None):
+    """All the cycles of a graph up to a given length, as bit vectors.
+
+    Returns:
+        A dictionary mapping each length from three to max_length to an array of the
+        bit vectors of the cycles of that length, in the canonical order of
+        g560.short_cycles.enumerate_cycles().
+    """
+    if slots is None:
+        _, slots = edge_list(adjacency)
+    return {length: cycle_vectors(enumerate_cycles(adjacency, length), slots, adjacency)
+            for length in range(3, max_length + 1)}
+
+
+def girth(adjacency, max_length=None):
+    """The length of the shortest cycle of a graph, or None if it has no cycle up to max_length."""
+    max_length = len(adjacency) if max_length is None else max_length
+    for length in range(3, max_length + 1):
+        if len(enumerate_cycles(adjacency, length)) > 0:
+            return length
+    return None
+
 
 def cycles(g):
-    cycle_basis = networkx.cycle_basis(g)
-    for cycle_a, cycle_b in combinations(cycle_basis, 2):
-        yield symmetric_difference(g, cycle_a, cycle_b)
-    yield from map(frozenset, cycle_basis)
-
-def main():
-    g = gewirtz.make()
-    cs = cycles(g)
-    quads = [tuple(c) for c in cs if len(c) == 4]
-    print(quads)
-    print(len(quads))
-    freq = sorted((sum(1 for q in quads if i in q) for i in range(56)))
-    print(freq)
+    """Generate the fundamental cycles of a networkx graph, and the sums of every pair of them.
+
+    Yields:
+        The frozenset of the nodes of each pairwise sum, then of each fundamental cycle.
+    """
+    nodes, adjacency = adjacency_array(g)
+    edges, slots = edge_list(adjacency)
+    basis = cycle_basis(adjacency, edges, slots)
+    sums, _ = pairwise_sums(basis)
+    for vectors in (sums, basis):
+        for bits in unpack(vectors, len(edges)):
+            yield frozenset(nodes[vertex] for vertex in numpy.unique(edges[bits]).tolist())
+
+
+def main(argv=None):
+    """Examine the cycle spaces of the Gewirtz graph and a g560 graph."""
+    from g560 import gewirtz
+    from g560.gp_graph import DEFAULT_GEWIRTZ_SVG_FILEPATH, template_from_svg_file
+
+    argv = sys.argv[1:] if argv is None else argv
+    gewirtz_svg_filepath = argv[0] if argv else DEFAULT_GEWIRTZ_SVG_FILEPATH
+
+    genome = tuple(tuple(numpy.random.RandomState(0).permutation(10).tolist()) for _ in range(8))
+    graphs = (
+        ('Gewirtz', numpy.array(gewirtz.neighbours)),
+        ('g560', template_from_svg_file(gewirtz_svg_filepath).adjacency(genome)),
+    )
+    for name, adjacency in graphs:
+        start = time.perf_counter()
+        edges, slots = edge_list(adjacency)
+        basis = cycle_basis(adjacency, edges, slots)
+        sums, _ = pairwise_sums(basis)
+        pair_cycles = is_simple_cycle(sums, adjacency, slots)
+        graph_girth = girth(adjacency)
+        short = short_cycle_vectors(adjacency, graph_girth + 1, slots)
+        elapsed = time.perf_counter() - start
+
+        assert len(basis) == len(edges) - len(adjacency) + 1
+        assert rank(basis) == len(basis)
+        for vectors in short.values():
+            assert is_simple_cycle(vectors, adjacency, slots).all()
+            assert rank(numpy.concatenate((basis, vectors))) == len(basis)
+        print("{} : {} edges, cycle space of dimension {}, girth {}, {} in {:.3f}s".format(
+            name, len(edges), len(basis), graph_girth,
+            ', '.join("{} {}-cycles".format(len(vectors), length) for length, vectors in short.items() if len(vectors)),
+            elapsed))
+        print("{} : {} of {} pairs of basis cycles sum to a simple cycle, {} of them {}-cycles".format(
+            name, int(pair_cycles.sum()), len(sums), int((pair_cycles & (lengths(sums) == graph_girth)).sum()),
+            graph_girth))
+
 
 if __name__ == '__main__':
     main()
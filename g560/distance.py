@@ -0,0 +1,569 @@
+"""Fast shortest path statistics for sparse graphs of bounded degree.
+
+Graphs are represented by adjacency arrays: integer arrays of shape (n, d)
+where row v holds the indexes of the neighbours of vertex v. Vertices with
+fewer than d neighbours are padded with the value n, which refers to a
+vertex that is never reached. The g560 graphs are 4-regular, so need no
+padding at all.
+
+Breadth-first search is performed from all sources simultaneously. Each
+vertex holds a bitset, packed into 64-bit words, of the sources which have
+reached it so far. One step of the search ORs together the bitsets of each
+vertex's neighbours, so a whole frontier expansion for every source is a
+handful of vectorized operations.
+"""
+import sys
+import time
+from collections import namedtuple
+
+import numpy
+
+
+DistanceProfile = namedtuple('DistanceProfile', ['aspl', 'diameter', 'histogram'])
+DistanceProfile.__doc__ = """Shortest path statistics for a connected graph.
+
+    aspl: The average shortest path length.
+    diameter: The greatest distance between any two vertices.
+    histogram: A tuple where histogram[k] is the number of ordered
+        (source, target) vertex pairs separated by distance k. When
+        the profile was computed with weights, each pair is counted
+        with the weight of its source.
+"""
+
+DistanceReport = namedtuple('DistanceReport', ['aspl', 'diameter', 'radius', 'histogram',
+                                               'eccentricities', 'eccentricity_histogram', 'closeness'])
+DistanceReport.__doc__ = """Shortest path statistics for each vertex, and for the whole of a connected graph.
+
+    aspl: The average shortest path length.
+    diameter: The greatest eccentricity.
+    radius: The least eccentricity.
+    histogram: A tuple where histogram[k] is the number of ordered
+        (source, target) vertex pairs separated by distance k.
+    eccentricities: An array of the eccentricity of each vertex.
+    eccentricity_histogram: A tuple where eccentricity_histogram[e] is the
+        number of vertices with eccentricity e.
+    closeness: An array of the closeness centrality of each vertex, the
+        reciprocal of its mean distance to the other vertices.
+"""
+
+_WORD = numpy.dtype('<u8')
+
+_M1 = numpy.uint64(0x5555555555555555)
+_M2 = numpy.uint64(0x3333333333333333)
+_M4 = numpy.uint64(0x0f0f0f0f0f0f0f0f)
+_H01 = numpy.uint64(0x0101010101010101)
+
+
+class SearchBuffers:
+    """Working arrays for breadth-first searches, allocated once and reused by each search in turn.
+
+    A process evaluating many graphs of the same size, such as a pool
+    worker, keeps one SearchBuffers so that its memory stays flat however
+    many searches it makes. Each array grows to the largest size requested,
+    and is never shrunk. Only one search may use the buffers at a time.
+    """
+
+    def __init__(self):
+        self._arrays = {}
+
+    def get(self, name, shape, dtype=_WORD):
+        """An uninitialized array of the given shape, sharing memory with earlier arrays of the same name."""
+        size = 1
+        for length in shape:
+            size *= length
+        array = self._arrays.get(name)
+        if array is None or array.size < size or array.dtype != dtype:
+            array = numpy.empty(size, dtype=dtype)
+            self._arrays[name] = array
+        return array[:size].reshape(shape)
+
+    @property
+    def nbytes(self):
+        """The total size of the buffers in bytes."""
+        return sum(array.nbytes for array in self._arrays.values())
+
+
+def adjacency_array(graph, nodes=None):
+    """Convert a networkx graph to an adjacency array.
+
+    Args:
+        graph: A networkx graph.
+        nodes: An optional sequence of the nodes of graph, giving the order
+            of the rows in the returned array. If not supplied the iteration
+            order of graph.nodes is used.
+
+    Returns:
+        A 2-tuple where the first element is a list of the nodes in row order,
+        and the second is the adjacency array.
+    """
+    nodes = list(graph.nodes) if nodes is None else list(nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    degree = max((d for _, d in graph.degree), default=0)
+    adjacency = numpy.full((len(nodes), degree), len(nodes), dtype=numpy.intp)
+    for i, node in enumerate(nodes):
+        neighbours = [index[neighbour] for neighbour in graph.neighbors(node)]
+        adjacency[i, :len(neighbours)] = neighbours
+    return nodes, adjacency
+
+
+def adjacency_from_edges(num_vertices, edges):
+    """Make an adjacency array from an array of undirected edges.
+
+    Args:
+        num_vertices: The number of vertices in the graph.
+        edges: An integer array of shape (m, 2) of vertex index pairs.
+
+    Returns:
+        An adjacency array with as many columns as the greatest vertex degree.
+    """
+    edges = numpy.asarray(edges, dtype=numpy.intp).reshape(-1, 2)
+    arcs = numpy.concatenate((edges, edges[:, ::-1]))
+    arcs = arcs[numpy.argsort(arcs[:, 0], kind='mergesort')]
+    degrees = numpy.bincount(arcs[:, 0], minlength=num_vertices)
+    starts = numpy.cumsum(degrees) - degrees
+    slots = numpy.arange(len(arcs)) - numpy.repeat(starts, degrees)
+    adjacency = numpy.full((num_vertices, degrees.max() if len(arcs) else 0), num_vertices, dtype=numpy.intp)
+    adjacency[arcs[:, 0], slots] = arcs[:, 1]
+    return adjacency
+
+
+def source_bitsets(num_vertices, sources, buffers=None):
+    """Make the initial search state in which each source has reached only itself.
+
+    Args:
+        num_vertices: The number of vertices in the graph.
+        sources: A sequence of vertex indexes. Bit i of the returned bitsets
+            corresponds to sources[i].
+        buffers: An optional SearchBuffers in which the state is made.
+
+    Returns:
+        An array of shape (num_vertices + 1, num_words) of 64-bit words. The
+        final row is the permanently empty bitset of the padding vertex.
+    """
+    sources = numpy.asarray(sources, dtype=numpy.intp)
+    num_words = max(1, (len(sources) + 63) // 64)
+    if buffers is None:
+        reached = numpy.zeros((num_vertices + 1, num_words), dtype=_WORD)
+    else:
+        reached = buffers.get('reached', (num_vertices + 1, num_words))
+        reached.fill(0)
+    bits = numpy.arange(len(sources))
+    reached[sources, bits // 64] |= numpy.left_shift(numpy.ones(len(sources), dtype=_WORD),
+                                                     (bits % 64).astype(_WORD))
+    return reached
+
+
+def frontiers(adjacency, sources=None, reached=None, buffers=None):
+    """Breadth-first search from many sources at once.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        sources: An optional sequence of source vertex indexes. If not supplied,
+            all vertices are sources.
+        reached: An optional array returned by source_bitsets() to use as the
+            initial search state. It will be modified in place.
+        buffers: An optional SearchBuffers holding the working arrays.
+
+    Yields:
+        2-tuples of the distance k, and an array of shape (n, num_words) holding
+        for each vertex the bitset of the sources which are exactly distance k
+        away. The yielded array is only valid until the next iteration.
+    """
+    n = len(adjacency)
+    if reached is None:
+        reached = source_bitsets(n, range(n) if sources is None else sources, buffers)
+    columns = [numpy.ascontiguousarray(adjacency[:, column]) for column in range(adjacency.shape[1])]
+    shape = (n, reached.shape[1])
+    if buffers is None:
+        fresh = reached[:n].copy()
+        expanded, gathered, unreached = (numpy.empty(shape, dtype=_WORD) for _ in range(3))
+    else:
+        fresh, expanded, gathered, unreached = (buffers.get(name, shape)
+                                                for name in ('fresh', 'expanded', 'gathered', 'unreached'))
+        fresh[...] = reached[:n]
+    distance = 0
+    while True:
+        yield distance, fresh
+        # Every index is at most n, the padding row, so clipping never applies, but avoids buffering the output
+        numpy.take(reached, columns[0], axis=0, out=expanded, mode='clip')
+        for column in columns[1:]:
+            numpy.take(reached, column, axis=0, out=gathered, mode='clip')
+            expanded |= gathered
+        numpy.invert(reached[:n], out=unreached)
+        numpy.bitwise_and(expanded, unreached, out=fresh)
+        if not fresh.any():
+            return
+        reached[:n] |= fresh
+        distance += 1
+
+
+def popcounts(words):
+    """The number of set bits in each of an array of 64-bit words."""
+    # Sum adjacent bits, then pairs, then nibbles, then gather the byte sums into the top byte
+    x = numpy.array(words, dtype=_WORD)
+    x -= (x >> numpy.uint64(1)) & _M1
+    x = (x & _M2) + ((x >> numpy.uint64(2)) & _M2)
+    x = (x + (x >> numpy.uint64(4))) & _M4
+    return (x * _H01) >> numpy.uint64(56)
+
+
+def popcount(words):
+    """The total number of set bits in an array of 64-bit words."""
+    return int(popcounts(words).sum())
+
+
+def unpack(words, num_bits):
+    """Unpack bitsets into an array of bools.
+
+    Args:
+        words: An array of shape (..., num_words) of 64-bit words.
+        num_bits: The number of meaningful bits in each bitset.
+
+    Returns:
+        An array of shape (..., num_bits) of bools.
+    """
+    octets = numpy.ascontiguousarray(words, dtype=_WORD).view(numpy.uint8)
+    bits = numpy.unpackbits(octets, axis=-1)
+    bits = bits.reshape(bits.shape[:-1] + (octets.shape[-1], 8))[..., ::-1]
+    return bits.reshape(bits.shape[:-2] + (octets.shape[-1] * 8,))[..., :num_bits].astype(bool)
+
+
+def distance_profile(adjacency, sources=None, weights=None, buffers=None):
+    """Compute shortest path statistics with one simultaneous search.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        sources: An optional sequence of source vertex indexes. If not
+            supplied, all vertices are sources.
+        weights: An optional sequence of numbers, one per source, by which
+            the contribution of each source is multiplied. Used to make
+            a few representative sources stand for many others.
+        buffers: An optional SearchBuffers holding the working arrays.
+
+    Returns:
+        A DistanceProfile.
+
+    Raises:
+        ValueError: If some source cannot reach every vertex.
+    """
+    n = len(adjacency)
+    if sources is None:
+        sources = range(n)
+    num_sources = len(sources)
+    if weights is not None:
+        weights = numpy.asarray(weights)
+        if len(weights) > 0 and (weights == weights[0]).all():
+            # Uniform weights can be applied to the totals rather than per source
+            weight, weights = weights[0], None
+            total_weight = weight * num_sources
+        else:
+            total_weight = weights.sum()
+    else:
+        weight = 1
+        total_weight = num_sources
+
+    histogram = []
+    num_reached = 0
+    for distance, fresh in frontiers(adjacency, sources, buffers=buffers):
+        if weights is None:
+            count = popcount(fresh)
+            num_reached += count
+            count *= weight
+        else:
+            per_source = unpack(fresh, num_sources).sum(axis=0)
+            num_reached += int(per_source.sum())
+            count = per_source.dot(weights)
+        histogram.append(count)
+
+    if num_reached != n * num_sources:
+        raise ValueError("Graph is not connected.")
+
+    aspl = sum(k * count for k, count in enumerate(histogram)) / (total_weight * (n - 1))
+    return DistanceProfile(aspl=aspl, diameter=len(histogram) - 1, histogram=tuple(histogram))
+
+
+def distance_matrix(adjacency, sources=None, dtype=numpy.uint8):
+    """Compute the distances from each source to every vertex.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        sources: An optional sequence of source vertex indexes. If not
+            supplied, all vertices are sources.
+        dtype: The integer type of the returned array.
+
+    Returns:
+        An array of shape (len(sources), n) where element [i, v] is the
+        distance from sources[i] to vertex v. Vertices which cannot be
+        reached are given the greatest value representable by dtype.
+    """
+    n = len(adjacency)
+    if sources is None:
+        sources = range(n)
+    num_sources = len(sources)
+    # The distance from a source to a vertex is the number of levels of the
+    # search at which the vertex has not yet been reached from that source.
+    reached = source_bitsets(n, sources)
+    unreached_counts = numpy.zeros((n, reached.shape[1] * 64), dtype=numpy.uint16)
+    for _ in frontiers(adjacency, reached=reached):
+        unreached_counts += numpy.unpackbits(~reached[:n].view(numpy.uint8), axis=1)
+    # Undo the most-significant-bit-first order of unpackbits within each octet
+    bit_order = (numpy.arange(unreached_counts.shape[1]) ^ 7)[:num_sources]
+    distances = unreached_counts[:, bit_order].T.astype(dtype)
+    distances[unpack(~reached[:n], num_sources).T] = numpy.iinfo(dtype).max
+    return distances
+
+
+def batched_average_shortest_path_lengths(adjacency, num_graphs, buffers=None):
+    """Compute the average shortest path lengths of many graphs with one search.
+
+    The graphs must all have the same number of vertices, n, and be combined
+    into a single adjacency array for their disjoint union, in which graph b
+    comprises the vertices b * n to (b + 1) * n - 1. Since no vertex can reach
+    another graph, each vertex need only track the n sources of its own graph,
+    so the cost of each search step is shared between all of the graphs.
+
+    Args:
+        adjacency: An adjacency array of shape (num_graphs * n, d).
+        num_graphs: The number of graphs.
+        buffers: An optional SearchBuffers holding the working arrays.
+
+    Returns:
+        An array of num_graphs average shortest path lengths. Graphs which are
+        not connected have an infinite average shortest path length.
+    """
+    total = len(adjacency)
+    n = total // num_graphs
+    shape = (total + 1, (n + 63) // 64)
+    if buffers is None:
+        reached = numpy.zeros(shape, dtype=_WORD)
+    else:
+        reached = buffers.get('reached', shape)
+        reached.fill(0)
+    local = numpy.arange(total) % n
+    reached[numpy.arange(total), local // 64] = numpy.left_shift(numpy.ones(total, dtype=_WORD),
+                                                                 (local % 64).astype(_WORD))
+    distance_sums = numpy.zeros(num_graphs, dtype=numpy.int64)
+    num_reached = numpy.zeros(num_graphs, dtype=numpy.int64)
+    for distance, fresh in frontiers(adjacency, reached=reached, buffers=buffers):
+        counts = popcounts(fresh).reshape(num_graphs, -1).sum(axis=1).astype(numpy.int64)
+        distance_sums += distance * counts
+        num_reached += counts
+    aspls = distance_sums / float(n * (n - 1))
+    aspls[num_reached != n * n] = numpy.inf
+    return aspls
+
+
+def is_automorphism(adjacency, permutation):
+    """Determine whether a permutation of the vertices preserves adjacency.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        permutation: An integer array of length n mapping each vertex to its image.
+
+    Returns:
+        True if the permutation is an automorphism of the graph, otherwise False.
+    """
+    n = len(adjacency)
+    permutation = numpy.asarray(permutation, dtype=numpy.intp)
+    if permutation.shape != (n,) or not numpy.array_equal(numpy.sort(permutation), numpy.arange(n)):
+        return False
+    padded_permutation = numpy.append(permutation, n)
+    neighbours_of_images = numpy.sort(adjacency[permutation], axis=1)
+    images_of_neighbours = numpy.sort(padded_permutation[adjacency], axis=1)
+    return bool(numpy.array_equal(neighbours_of_images, images_of_neighbours))
+
+
+def orbits(permutation):
+    """The orbits of the cyclic group generated by a permutation of the vertices.
+
+    Args:
+        permutation: An integer array of length n mapping each vertex to its image.
+
+    Returns:
+        A 2-tuple of arrays of the least vertex in each orbit, and the number of
+        vertices in each orbit.
+    """
+    return numpy.unique(least_in_orbits(permutation), return_counts=True)
+
+
+def least_in_orbits(permutation):
+    """The least vertex in the orbit of each vertex under a permutation.
+
+    Args:
+        permutation: An integer array of length n mapping each vertex to its image.
+
+    Returns:
+        An integer array of length n.
+    """
+    permutation = numpy.asarray(permutation, dtype=numpy.intp)
+    identity = numpy.arange(len(permutation))
+    least = identity.copy()
+    image = permutation.copy()
+    while not numpy.array_equal(image, identity):
+        numpy.minimum(least, image, out=least)
+        image = permutation[image]
+    return least
+
+
+def symmetric_distance_profile(adjacency, automorphism=None, buffers=None):
+    """Compute shortest path statistics searching from one vertex per symmetry orbit.
+
+    All vertices in an orbit of an automorphism have identical distance
+    distributions, so searching from one representative of each, weighted
+    by the size of its orbit, gives exactly the same statistics as searching
+    from every vertex.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        automorphism: An optional integer array mapping each vertex to its
+            image under a suspected automorphism of the graph. If it is None
+            or is not in fact an automorphism, every vertex is searched from.
+        buffers: An optional SearchBuffers holding the working arrays.
+
+    Returns:
+        A DistanceProfile.
+
+    Raises:
+        ValueError: If the graph is not connected.
+    """
+    if automorphism is None or not is_automorphism(adjacency, automorphism):
+        return distance_profile(adjacency, buffers=buffers)
+    representatives, sizes = orbits(automorphism)
+    return distance_profile(adjacency, representatives, sizes, buffers)
+
+
+def distance_report(adjacency, automorphism=None):
+    """Compute per-vertex and whole-graph shortest path statistics with one simultaneous search.
+
+    Replaces separate computations of the average shortest path length,
+    diameter, radius, eccentricities and closeness, each of which would
+    otherwise search from every vertex. Every vertex in an orbit of an
+    automorphism has the same statistics as the least in its orbit, so only
+    those representatives are searched from.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        automorphism: An optional integer array mapping each vertex to its
+            image under a suspected automorphism of the graph. If it is None
+            or is not in fact an automorphism, every vertex is searched from.
+
+    Returns:
+        A DistanceReport.
+
+    Raises:
+        ValueError: If the graph is not connected.
+    """
+    n = len(adjacency)
+    if automorphism is None or not is_automorphism(adjacency, automorphism):
+        representative_of = numpy.arange(n)
+    else:
+        representative_of = least_in_orbits(automorphism)
+    sources, source_of, weights = numpy.unique(representative_of, return_inverse=True, return_counts=True)
+    num_sources = len(sources)
+
+    source_eccentricities = numpy.zeros(num_sources, dtype=numpy.intp)
+    distance_sums = numpy.zeros(num_sources, dtype=numpy.int64)
+    num_reached = numpy.zeros(num_sources, dtype=numpy.int64)
+    histogram = []
+    for distance, fresh in frontiers(adjacency, sources):
+        per_source = unpack(fresh, num_sources).sum(axis=0)
+        source_eccentricities[per_source > 0] = distance
+        distance_sums += distance * per_source
+        num_reached += per_source
+        histogram.append(int(per_source.dot(weights)))
+
+    if (num_reached != n).any():
+        raise ValueError("Graph is not connected.")
+
+    eccentricities = source_eccentricities[source_of]
+    with numpy.errstate(divide='ignore'):
+        closeness = ((n - 1) / distance_sums.astype(float))[source_of]
+    return DistanceReport(
+        aspl=sum(k * count for k, count in enumerate(histogram)) / (n * (n - 1)),
+        diameter=int(eccentricities.max()),
+        radius=int(eccentricities.min()),
+        histogram=tuple(histogram),
+        eccentricities=eccentricities,
+        eccentricity_histogram=tuple(numpy.bincount(eccentricities).tolist()),
+        closeness=closeness)
+
+
+def adjacency_picture(adjacency, absent=' ', present='X'):
+    """Render the adjacency matrix of the graph with an adjacency array as text.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        absent: The character marking a pair of vertices which are not adjacent.
+        present: The character marking a pair of adjacent vertices.
+
+    Returns:
+        A string of n lines of n characters, where the v-th character of line
+        u shows whether vertices u and v are adjacent.
+    """
+    n = len(adjacency)
+    adjacent = numpy.zeros((n, n + 1), dtype=bool)
+    adjacent[numpy.repeat(numpy.arange(n), adjacency.shape[1]), adjacency.ravel()] = True
+    cells = numpy.where(adjacent[:, :n], present, absent)
+    return '\n'.join(''.join(row) for row in cells.tolist())
+
+
+def average_shortest_path_length(adjacency):
+    """The average shortest path length of the graph with the given adjacency array.
+
+    Equivalent to networkx.average_shortest_path_length, but very much faster.
+    """
+    return distance_profile(adjacency).aspl
+
+
+def main(argv=None):
+    """Cross-check the distance engine against networkx on random g560 graphs."""
+    import random
+
+    import networkx
+
+    from g560.gp_graph import DEFAULT_GEWIRTZ_SVG_FILEPATH, make_symmetrical_from_permutation, template_from_svg_file
+
+    argv = sys.argv[1:] if argv is None else argv
+    gewirtz_svg_filepath = argv[0] if argv else DEFAULT_GEWIRTZ_SVG_FILEPATH
+    num_trials = int(argv[1]) if len(argv) > 1 else 3
+
+    random.seed(0)
+    for _ in range(num_trials):
+        genome = tuple(tuple(random.sample(range(10), 10)) for _ in range(8))
+        graph = make_symmetrical_from_permutation(genome, gewirtz_svg_filepath)
+
+        start = time.perf_counter()
+        expected_aspl = networkx.average_shortest_path_length(graph)
+        expected_diameter = networkx.diameter(graph)
+        networkx_time = time.perf_counter() - start
+
+        _, adjacency = adjacency_array(graph)
+        start = time.perf_counter()
+        profile = distance_profile(adjacency)
+        engine_time = time.perf_counter() - start
+
+        rotation = template_from_svg_file(gewirtz_svg_filepath).rotation(len(genome))
+        start = time.perf_counter()
+        symmetric_profile = symmetric_distance_profile(adjacency, rotation)
+        symmetric_time = time.perf_counter() - start
+
+        assert abs(profile.aspl - expected_aspl) < 1e-12, (profile.aspl, expected_aspl)
+        assert symmetric_profile == profile, (symmetric_profile, profile)
+        assert profile.diameter == expected_diameter, (profile.diameter, expected_diameter)
+        assert sum(profile.histogram) == len(graph) ** 2
+
+        report = distance_report(adjacency, rotation)
+        expected_eccentricities = networkx.eccentricity(graph)
+        assert report.histogram == profile.histogram, (report.histogram, profile.histogram)
+        assert report.aspl == profile.aspl, (report.aspl, profile.aspl)
+        assert report.radius == networkx.radius(graph, e=expected_eccentricities)
+        assert report.eccentricities.tolist() == [expected_eccentricities[node] for node in graph], "eccentricities"
+        expected_closeness = networkx.closeness_centrality(graph)
+        assert numpy.allclose(report.closeness, [expected_closeness[node] for node in graph]), "closeness"
+        print("ASPL {:.6f} diameter {} networkx {:.4f}s engine {:.6f}s ({:.0f}x) symmetric {:.6f}s ({:.0f}x)".format(
+            profile.aspl, profile.diameter, networkx_time, engine_time, networkx_time / engine_time,
+            symmetric_time, networkx_time / symmetric_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Caches of genome fitnesses.
+
+FitnessCache is an in-memory least-recently-used cache. FitnessStore backs
+such a cache with an SQLite database, so fitnesses survive restarts and are
+shared between any number of concurrent searches on the same embedding.
+The database uses write-ahead logging, so readers never block the writer,
+and each process opens its own connection on first use, so a store may be
+created before worker processes are forked.
+"""
+import os
+import sqlite3
+import struct
+from collections import OrderedDict
+
+import numpy
+
+from g560.permute import lexicographic_rank, lexicographic_ranks, lexicographic_unrank
+from g560.read_svg_embedding import file_digest
+
+
+def encode_genome(genome):
+    """Encode a genome compactly as the lexicographic rank of each gene, as four bytes."""
+    return struct.pack('>{}I'.format(len(genome)), *map(lexicographic_rank, genome))
+
+
+def encode_genomes(genes):
+    """Encode many genomes at once, as encode_genome() does.
+
+    Args:
+        genes: An integer array of shape (k, num_genes, gene_length).
+
+    Returns:
+        A list of k byte strings.
+    """
+    genes = numpy.asarray(genes)
+    ranks = lexicographic_ranks(genes.reshape(-1, genes.shape[-1])).astype('>u4')
+    return [row.tobytes() for row in ranks.reshape(len(genes), -1)]
+
+
+def decode_genome(key, gene_length):
+    """Decode a genome encoded by encode_genome()."""
+    ranks = struct.unpack('>{}I'.format(len(key) // 4), key)
+    return tuple(lexicographic_unrank(rank, gene_length) for rank in ranks)
+
+
+def embedding_digest(svg_filepath):
+    """A digest of the contents of an embedding file, used to identify it in a store."""
+    return file_digest(svg_filepath)
+
+
+class FitnessCache:
+    """An in-memory least-recently-used cache of the fitnesses of genomes."""
+
+    def __init__(self, capacity=10000):
+        """
+        Args:
+            capacity: The maximum number of fitnesses held in memory.
+        """
+        self.capacity = capacity
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _remember(self, genome, fitness):
+        self._cache[genome] = fitness
+        self._cache.move_to_end(genome)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def _lookup(self, genomes):
+        found = {}
+        for genome in genomes:
+            if genome in self._cache:
+                self._cache.move_to_end(genome)
+                found[genome] = self._cache[genome]
+        return found
+
+    def get_many(self, genomes):
+        """Look up the fitnesses of many genomes at once.
+
+        Args:
+            genomes: An iterable of genomes, which may contain duplicates.
+
+        Returns:
+            A dictionary mapping those distinct genomes which are known to their fitnesses.
+        """
+        genomes = list(OrderedDict.fromkeys(genomes))
+        found = self._lookup(genomes)
+        self.hits += len(found)
+        self.misses += len(genomes) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Record the fitnesses of many genomes at once.
+
+        Args:
+            items: An iterable of (genome, fitness) pairs.
+        """
+        for genome, fitness in items:
+            self._remember(genome, fitness)
+
+    def get(self, genome, default=None):
+        return self.get_many([genome]).get(genome, default)
+
+    def put(self, genome, fitness):
+        self.put_many([(genome, fitness)])
+
+    def items(self):
+        """A list of the (genome, fitness) pairs held in memory, from least to most recently used."""
+        return list(self._cache.items())
+
+    def restore(self, items, hits=0, misses=0):
+        """Restore the in-memory state saved by items() and the hit and miss counts.
+
+        Unlike put_many(), nothing is written to any backing store.
+        """
+        for genome, fitness in items:
+            self._remember(genome, fitness)
+        self.hits = hits
+        self.misses = misses
+
+    def statistics(self):
+        """A dictionary of the hit and miss counts, and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._cache),
+        }
+
+
+class FitnessStore(FitnessCache):
+    """A persistent fitness cache, in an SQLite database shared between processes.
+
+    Fitnesses are recorded against a digest of the embedding for which they
+    were computed, so one database may hold the results of searches on
+    several embeddings.
+    """
+
+    # SQLite limits the number of parameters in a single statement
+    _CHUNK_SIZE = 500
+
+    def __init__(self, filepath, embedding, capacity=10000, timeout=60.0):
+        """
+        Args:
+            filepath: The path of the SQLite database file, which will be created
+                if it does not exist.
+            embedding: A string identifying the embedding, such as the result
+                of embedding_digest().
+            capacity: The maximum number of fitnesses held in memory.
+            timeout: The number of seconds to wait for another process to
+                release a lock on the database.
+        """
+        super().__init__(capacity)
+        self.filepath = filepath
+        self.embedding = embedding
+        self.timeout = timeout
+        self._connection = None
+        self._pid = None
+        self._connect()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            connection = sqlite3.connect(self.filepath, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS fitness ('
+                    ' embedding TEXT NOT NULL,'
+                    ' genome BLOB NOT NULL,'
+                    ' fitness REAL NOT NULL,'
+                    ' PRIMARY KEY (embedding, genome)'
+                    ') WITHOUT ROWID')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def __len__(self):
+        row = self._connect().execute(
+            'SELECT COUNT(*) FROM fitness WHERE embedding = ?', (self.embedding,)).fetchone()
+        return row[0]
+
+    def get_many(self, genomes):
+        genomes = list(OrderedDict.fromkeys(genomes))
+        found = self._lookup(genomes)
+        missing_genomes = [genome for genome in genomes if genome not in found]
+        missing = dict(zip(encode_genomes(missing_genomes), missing_genomes)) if missing_genomes else {}
+        keys = list(missing)
+        connection = self._connect()
+        for start in range(0, len(keys), self._CHUNK_SIZE):
+            chunk = keys[start:start + self._CHUNK_SIZE]
+            rows = connection.execute(
+                'SELECT genome, fitness FROM fitness WHERE embedding = ? AND genome IN ({})'.format(
+                    ', '.join('?' * len(chunk))),
+                [self.embedding] + chunk)
+            for key, fitness in rows:
+                genome = missing[bytes(key)]
+                found[genome] = fitness
+                self._remember(genome, fitness)
+        self.hits += len(found)
+        self.misses += len(genomes) - len(found)
+        return found
+
+    def put_many(self, items):
+        items = list(items)
+        if not items:
+            return
+        super().put_many(items)
+        keys = encode_genomes([genome for genome, _ in items])
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                'INSERT OR IGNORE INTO fitness (embedding, genome, fitness) VALUES (?, ?, ?)',
+                ((self.embedding, key, fitness) for key, (_, fitness) in zip(keys, items)))
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
@@ -5,9 +5,14 @@ An integral graph on 56 vertices and 280 egdes that is a regular graph of order
 This is constructed using the algorithm described in the Wolfram Mathworld page:
 
     http://mathworld.wolfram.com/GewirtzGraph.html
+
+The neighbours of each vertex are precomputed from the words by
+neighbours_from_words(), so that importing this module is cheap, and the
+networkx graph is only built when make() is first called. The module
+attributes word_sets, adjacency_matrix, adjacency_array and G, which
+earlier versions built on import, are built when first accessed.
 """
-import numpy
-import networkx
+from functools import lru_cache
 
 words = (
     'abcilu', 'abdfrs', 'abejop', 'abgmnq', 'acdghp', 'acfjnt', 'ackmos',
@@ -20,13 +25,90 @@ words = (
     'fgjpqr', 'fijlos', 'ghjkno', 'gimopu', 'hjlptu', 'iklmnt', 'lmqrsu',
 )
 
-word_sets = tuple(map(set, words))
+# The sorted neighbours of each vertex, as computed by neighbours_from_words()
+neighbours = (
+    (37, 40, 42, 43, 44, 45, 47, 48, 49, 51), (31, 32, 35, 36, 45, 46, 51, 52, 53, 54),
+    (28, 33, 34, 35, 39, 41, 42, 48, 54, 55), (29, 30, 32, 33, 38, 40, 41, 47, 50, 53),
+    (21, 24, 26, 27, 44, 46, 47, 50, 54, 55), (20, 22, 25, 26, 37, 38, 41, 45, 52, 55),
+    (19, 21, 22, 23, 38, 39, 42, 46, 49, 53), (17, 23, 25, 26, 33, 34, 36, 49, 50, 51),
+    (18, 22, 23, 27, 30, 32, 34, 44, 48, 52), (17, 18, 20, 27, 29, 36, 42, 43, 53, 55),
+    (18, 19, 24, 26, 28, 29, 35, 40, 49, 52), (16, 18, 19, 25, 31, 34, 38, 43, 47, 54),
+    (16, 17, 23, 24, 28, 30, 41, 43, 45, 46), (16, 21, 25, 27, 30, 35, 36, 37, 39, 40),
+    (16, 20, 22, 24, 29, 31, 33, 39, 44, 51), (17, 19, 20, 21, 28, 31, 32, 37, 48, 50),
+    (11, 12, 13, 14, 48, 49, 50, 52, 53, 55), (7, 9, 12, 15, 38, 39, 40, 44, 52, 54),
+    (8, 9, 10, 11, 37, 39, 41, 46, 50, 51), (6, 10, 11, 15, 30, 33, 36, 44, 45, 55),
+    (5, 9, 14, 15, 30, 34, 35, 46, 47, 49), (4, 6, 13, 15, 29, 34, 41, 43, 51, 52),
+    (5, 6, 8, 14, 28, 36, 40, 43, 50, 54), (6, 7, 8, 12, 29, 31, 35, 37, 47, 55),
+    (4, 10, 12, 14, 32, 34, 36, 37, 38, 42), (5, 7, 11, 13, 28, 29, 32, 42, 44, 46),
+    (4, 5, 7, 10, 30, 31, 39, 43, 48, 53), (4, 8, 9, 13, 28, 31, 33, 38, 45, 49),
+    (2, 10, 12, 15, 22, 25, 27, 47, 51, 53), (3, 9, 10, 14, 21, 23, 25, 45, 48, 54),
+    (3, 8, 12, 13, 19, 20, 26, 42, 51, 54), (1, 11, 14, 15, 23, 26, 27, 40, 41, 42),
+    (1, 3, 8, 15, 24, 25, 39, 43, 49, 55), (2, 3, 7, 14, 19, 27, 37, 43, 46, 52),
+    (2, 7, 8, 11, 20, 21, 24, 40, 45, 53), (1, 2, 10, 13, 20, 23, 38, 43, 44, 50),
+    (1, 7, 9, 13, 19, 22, 24, 41, 47, 48), (0, 5, 13, 15, 18, 23, 24, 33, 53, 54),
+    (3, 5, 6, 11, 17, 24, 27, 35, 48, 51), (2, 6, 13, 14, 17, 18, 26, 32, 45, 47),
+    (0, 3, 10, 13, 17, 22, 31, 34, 46, 55), (2, 3, 5, 12, 18, 21, 31, 36, 44, 49),
+    (0, 2, 6, 9, 24, 25, 30, 31, 50, 52), (0, 9, 11, 12, 21, 22, 26, 32, 33, 35),
+    (0, 4, 8, 14, 17, 19, 25, 35, 41, 53), (0, 1, 5, 12, 19, 27, 29, 34, 39, 50),
+    (1, 4, 6, 12, 18, 20, 25, 33, 40, 48), (0, 3, 4, 11, 20, 23, 28, 36, 39, 52),
+    (0, 2, 8, 15, 16, 26, 29, 36, 38, 46), (0, 6, 7, 10, 16, 20, 27, 32, 41, 54),
+    (3, 4, 7, 15, 16, 18, 22, 35, 42, 45), (0, 1, 7, 14, 18, 21, 28, 30, 38, 55),
+    (1, 5, 8, 10, 16, 17, 21, 33, 42, 47), (1, 3, 6, 9, 16, 26, 28, 34, 37, 44),
+    (1, 2, 4, 11, 17, 22, 29, 30, 37, 49), (2, 4, 5, 9, 16, 19, 23, 32, 40, 51),
+)
+
+
+def neighbours_from_words():
+    """Compute the neighbours of each vertex: those whose words have no letter in common."""
+    word_sets = _word_sets()
+    return tuple(tuple(j for j, b in enumerate(word_sets) if a.isdisjoint(b)) for a in word_sets)
 
-adjacency_matrix = [[a.isdisjoint(b) for a in word_sets] for b in word_sets]
 
-adjacency_array = numpy.array(adjacency_matrix)
+def edges():
+    """Each edge once, as a 2-tuple of vertices with the lesser first."""
+    return tuple((u, v) for u, vs in enumerate(neighbours) for v in vs if u < v)
+
+
+@lru_cache()
+def _graph():
+    import networkx
+    g = networkx.Graph()
+    g.add_nodes_from(range(len(neighbours)))
+    g.add_edges_from(edges(), weight=True)
+    return g
 
-G = networkx.from_numpy_matrix(adjacency_array)
 
 def make():
-    return G.copy()
+    return _graph().copy()
+
+
+def _word_sets():
+    return tuple(map(set, words))
+
+
+def _adjacency_matrix():
+    word_sets = _word_sets()
+    return [[a.isdisjoint(b) for a in word_sets] for b in word_sets]
+
+
+def _adjacency_array():
+    import numpy
+    return numpy.array(_adjacency_matrix())
+
+
+_LAZY_ATTRIBUTES = {
+    'word_sets': _word_sets,
+    'adjacency_matrix': _adjacency_matrix,
+    'adjacency_array': _adjacency_array,
+    'G': _graph,
+}
+
+
+def __getattr__(name):
+    """Build a lazy module attribute on first access, and keep it."""
+    try:
+        build = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name)) from None
+    value = globals()[name] = build()
+    return value
@@ -1,14 +1,22 @@
 """Two different algorithms for constructing the g560 graph (a.k.a. GP-graph).
 """
 
+import os
 from collections import OrderedDict
+from functools import lru_cache
 from pprint import pprint
 
-from networkx import Graph, union
+import numpy
 
 from g560 import gewirtz, petersen
+from g560.distance import adjacency_from_edges, is_automorphism
 from g560.analyze_symmetry import extract_symmetry_from_vertex_and_edge_lists
 from g560.read_svg_embedding import vertex_and_edge_lists_from_svg_file, graph_from_vertex_and_edge_lists
+from g560.replacement import base_edges, labelled_graph, replacement_edges
+
+DEFAULT_GEWIRTZ_SVG_FILEPATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'embeddings', 'Gewirtz_graph_embeddings_1.svg')
 
 
 def make(g=None, p=None):
@@ -30,36 +38,20 @@ def make(g=None, p=None):
     g = g or gewirtz.make()
     p = p or petersen.make()
 
-    # Make a disconnected graph containing 56 disconnected Peterson graphs
-
-    s = Graph()
-
-    # Add 560 nodes by adding one Petersen graph (10 nodes) for each
-    # of the 56 nodes of the gewirtz graph.
-    for g_node in g.nodes:
-        s = union(s, p, rename=('', '{}-'.format(g_node)))
-
-    neighbours = {n:list(g.neighbors(n)) for n in g.nodes}
+    # The ports of each Gewirtz vertex are its edges in the order networkx
+    # gives its neighbours, and Petersen vertex P is attached to port P
+    g_nodes = list(g.nodes)
+    g_index = {g_node: i for i, g_node in enumerate(g_nodes)}
+    base_adjacency = numpy.array([[g_index[n] for n in g.neighbors(g_node)] for g_node in g_nodes],
+                                 dtype=numpy.intp)
+    p_nodes = list(p.nodes)
+    p_index = {p_node: i for i, p_node in enumerate(p_nodes)}
+    p_edges = [(p_index[a], p_index[b]) for a, b in p.edges]
 
-    for g_edge in g.edges:
-        # This edge will be the ith outedge and jth inedge
-        # Connect g_edge_from-i to g_edge_to-j
+    return labelled_graph(replacement_edges(base_adjacency, p_edges), g_nodes, p_nodes)
 
-        g_from_node, g_to_node = g_edge
-        i = neighbours[g_from_node].index(g_to_node)
-        j = neighbours[g_to_node].index(g_from_node)
 
-        s_from_node = '{}-{}'.format(g_from_node, i)
-        s_to_node = '{}-{}'.format(g_to_node, j)
-
-        #print("{} -- {}".format(s_from_node, s_to_node))
-
-        s.add_edge(s_from_node, s_to_node)
-
-    return s
-
-
-def make_symmetrical(gewirtz_svg_filepath="/Users/rjs/dev/g560/embeddings/Gewirtz_graph_embeddings_1.svg", p=None):
+def make_symmetrical(gewirtz_svg_filepath=DEFAULT_GEWIRTZ_SVG_FILEPATH, p=None):
     """Make a g560 graph, respecting any symmetries in the specified Gewirtz graph.
 
     The separate node numbering schemes of the Gewirtz and Peterson graphs are
@@ -76,6 +68,8 @@ def make_symmetrical(gewirtz_svg_filepath="/Users/rjs/dev/g560/embeddings/Gewirt
         A g560 graph.
     """
 
+    from networkx import Graph, union
+
     g_vertex_list, g_edge_list = vertex_and_edge_lists_from_svg_file(gewirtz_svg_filepath)
 
     g = graph_from_vertex_and_edge_lists(g_vertex_list, g_edge_list)
@@ -107,73 +101,243 @@ def make_symmetrical(gewirtz_svg_filepath="/Users/rjs/dev/g560/embeddings/Gewirt
 
     return s
 
-def make_symmetrical_from_permutation(
-        genome,
-        gewirtz_svg_filepath="/Users/rjs/dev/g560/embeddings/Gewirtz_graph_embeddings_1.svg", p=None):
-    """Make a g560 graph, respecting any symmetries in the specified Gewirtz graph.
 
-    The separate node numbering schemes of the Gewirtz and Peterson graphs are
-    preserved in the labelling scheme of the nodes in the new graph, which have
-    will be strings of the form "G-P" where G and P are the respective names from
-    the supplied Gpewirtz and Peterson graphs.
+class GPTemplate:
+    """A compiled recipe for making g560 graphs from genomes for one Gewirtz embedding.
 
-    Args:
-        gewirtz_svg_filepath: An SVG file containing data containing a symmetrical representation
-            of the Gewirtz graph.
-        p: An optional Peterson graph. If not supplied the default Peterson graph will be used.
+    Everything which does not depend on the genome - the symmetry of the
+    embedding, the edges of the Petersen graphs, and which out-edge of each
+    Gewirtz vertex leads to which neighbour - is computed once, so that making
+    the graph for a genome is a few vectorized indexing operations.
 
-    Returns:
-        A g560 graph.
+    Vertex "G-P" of a g560 graph has the integer index G * len(p) + P.
     """
 
-    g_vertex_list, g_edge_list = vertex_and_edge_lists_from_svg_file(gewirtz_svg_filepath)
-
-    g = graph_from_vertex_and_edge_lists(g_vertex_list, g_edge_list)
-    p = p or petersen.make()
+    def __init__(self, g_vertex_list, g_edge_list, p=None):
+        """
+        Args:
+            g_vertex_list: A sequence of integer Gewirtz vertex labels in order
+                around a symmetrical circular embedding.
+            g_edge_list: A sequence of 2-tuples representing the Gewirtz edges.
+            p: An optional Peterson graph. If not supplied the default Peterson graph will be used.
+        """
+        # The default Petersen graph is used as constants, without building a networkx graph
+        p_nodes, p_edge_list = (petersen.nodes, petersen.edges) if p is None else (p.nodes, p.edges)
+        self.num_clusters = len(g_vertex_list)
+        self.cluster_size = len(p_nodes)
+        self.num_vertices = self.num_clusters * self.cluster_size
+        self.p_nodes = list(p_nodes)
+
+        sources_to_offsets = extract_symmetry_from_vertex_and_edge_lists(g_vertex_list, g_edge_list)
+        self.sources_to_offsets = sources_to_offsets
+
+        source_to_ordered_edges = {}
+        for sources, offsets in sources_to_offsets:
+            for source in sources:
+                source_to_ordered_edges[source] = [(source + offset) % self.num_clusters for offset in offsets]
+        # The ports of each Gewirtz vertex are its edges in order around the embedding
+        self.base_adjacency = numpy.array([source_to_ordered_edges[g_source] for g_source in range(self.num_clusters)],
+                                          dtype=numpy.intp)
+
+        # Each Gewirtz edge once, as (g_source, out_index, g_target, back_index)
+        # where the edge is the out_index-th of g_source and the back_index-th of g_target
+        self.g_sources, self.out_indexes, self.g_targets, self.back_indexes = base_edges(self.base_adjacency)
+
+        p_index = {p_node: i for i, p_node in enumerate(self.p_nodes)}
+        p_edges = numpy.array([(p_index[a], p_index[b]) for a, b in p_edge_list], dtype=numpy.intp)
+        offsets = numpy.arange(self.num_clusters)[:, None, None] * self.cluster_size
+        self.intra_edges = (p_edges[None, :, :] + offsets).reshape(-1, 2)
+        self.intra_adjacency = adjacency_from_edges(self.num_vertices, self.intra_edges)
+
+    def arrays(self):
+        """The arrays from which from_arrays() remakes the template, such as in another process.
+
+        Returns:
+            An OrderedDict mapping names to arrays.
+        """
+        return OrderedDict([
+            ('orbit_sources', numpy.array([source for sources, _ in self.sources_to_offsets for source in sources],
+                                          dtype=numpy.intp)),
+            ('orbit_sizes', numpy.array([len(sources) for sources, _ in self.sources_to_offsets], dtype=numpy.intp)),
+            ('orbit_offsets', numpy.array([offsets for _, offsets in self.sources_to_offsets], dtype=numpy.intp)),
+            ('p_nodes', numpy.array(self.p_nodes)),
+            ('base_adjacency', self.base_adjacency),
+            ('g_sources', self.g_sources),
+            ('out_indexes', self.out_indexes),
+            ('g_targets', self.g_targets),
+            ('back_indexes', self.back_indexes),
+            ('intra_edges', self.intra_edges),
+            ('intra_adjacency', self.intra_adjacency),
+        ])
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Remake a template from the arrays of another, without reading the embedding.
+
+        Args:
+            arrays: A mapping like that returned by arrays(), whose arrays,
+                such as those attached by g560.shared.attach_arrays(), are used
+                without being copied.
+        """
+        template = cls.__new__(cls)
+        template.base_adjacency = arrays['base_adjacency']
+        template.num_clusters, degree = template.base_adjacency.shape
+        template.p_nodes = arrays['p_nodes'].tolist()
+        template.cluster_size = len(template.p_nodes)
+        template.num_vertices = template.num_clusters * template.cluster_size
+        orbit_sources = numpy.split(arrays['orbit_sources'], numpy.cumsum(arrays['orbit_sizes'])[:-1])
+        template.sources_to_offsets = tuple((tuple(sources.tolist()), tuple(offsets.tolist()))
+                                            for sources, offsets in zip(orbit_sources, arrays['orbit_offsets']))
+        template.g_sources = arrays['g_sources']
+        template.out_indexes = arrays['out_indexes']
+        template.g_targets = arrays['g_targets']
+        template.back_indexes = arrays['back_indexes']
+        template.intra_edges = arrays['intra_edges']
+        template.intra_adjacency = arrays['intra_adjacency']
+        return template
+
+    def inter_edges(self, genome):
+        """The Gewirtz edges of the g560 graph for a genome.
+
+        Args:
+            genome: A sequence of permutation genes. The gene for Gewirtz vertex
+                g is genome[g % len(genome)], and Petersen vertex P of that
+                cluster is attached to the gene[P]-th out-edge of g.
+
+        Returns:
+            An integer array of shape (num_clusters * degree / 2, 2) of vertex indexes,
+            with the lesser index of each edge first.
+        """
+        genome = numpy.asarray(genome, dtype=numpy.intp)
+        inverse = numpy.argsort(genome, axis=1)
+        num_genes = len(genome)
+        p_sources = inverse[self.g_sources % num_genes, self.out_indexes]
+        p_targets = inverse[self.g_targets % num_genes, self.back_indexes]
+        return numpy.stack((self.g_sources * self.cluster_size + p_sources,
+                            self.g_targets * self.cluster_size + p_targets), axis=1)
+
+    def edges(self, genome):
+        """All edges of the g560 graph for a genome, as an integer array of shape (m, 2)."""
+        return numpy.concatenate((self.intra_edges, self.inter_edges(genome)))
+
+    def adjacency(self, genome):
+        """The adjacency array of the g560 graph for a genome.
+
+        The first columns hold the Petersen neighbours of each vertex, and
+        the last column its Gewirtz neighbour.
+        """
+        inter_edges = self.inter_edges(genome)
+        gewirtz_neighbours = numpy.empty(self.num_vertices, dtype=numpy.intp)
+        gewirtz_neighbours[inter_edges[:, 0]] = inter_edges[:, 1]
+        gewirtz_neighbours[inter_edges[:, 1]] = inter_edges[:, 0]
+        return numpy.column_stack((self.intra_adjacency, gewirtz_neighbours))
+
+    def adjacencies(self, genomes):
+        """The adjacency arrays of the g560 graphs for many genomes at once, as adjacency() makes them.
+
+        Args:
+            genomes: An integer array of shape (k, num_genes, gene_length), or a sequence of k genomes.
+
+        Returns:
+            An integer array of shape (k, num_vertices, degree).
+        """
+        genomes = numpy.asarray(genomes, dtype=numpy.intp)
+        inverses = numpy.argsort(genomes, axis=2)
+        num_genes = genomes.shape[1]
+        sources = self.g_sources * self.cluster_size + inverses[:, self.g_sources % num_genes, self.out_indexes]
+        targets = self.g_targets * self.cluster_size + inverses[:, self.g_targets % num_genes, self.back_indexes]
+        rows = numpy.arange(len(genomes))[:, numpy.newaxis]
+        gewirtz_neighbours = numpy.empty((len(genomes), self.num_vertices), dtype=numpy.intp)
+        gewirtz_neighbours[rows, sources] = targets
+        gewirtz_neighbours[rows, targets] = sources
+        intra = numpy.broadcast_to(self.intra_adjacency, (len(genomes),) + self.intra_adjacency.shape)
+        return numpy.concatenate((intra, gewirtz_neighbours[:, :, numpy.newaxis]), axis=2)
+
+    def rotation(self, num_genes):
+        """The automorphism of g560 graphs induced by the rotational symmetry of the embedding.
+
+        The genome is applied cyclically around the embedding, so when the
+        number of genes divides the number of Gewirtz vertices between one
+        vertex and its image under the rotation, rotating every cluster
+        onwards by that many positions preserves the graph.
+
+        Args:
+            num_genes: The number of genes in the genomes.
+
+        Returns:
+            An integer array mapping each vertex index to its image, or None if
+            the genomes do not respect the symmetry of the embedding.
+        """
+        step = min(self.sources_to_offsets[0][0][1:], default=self.num_clusters)
+        if step % num_genes != 0:
+            return None
+        return find_cluster_rotation_candidate(self.num_clusters, self.cluster_size, step)
+
+    def graph(self, genome):
+        """The g560 graph for a genome as a networkx graph with "G-P" node labels."""
+        return labelled_graph(self.edges(genome), range(self.num_clusters), self.p_nodes)
+
+
+def find_cluster_rotation_candidate(num_clusters, cluster_size, step):
+    """The vertex permutation moving every cluster of a g560 graph onwards by step clusters.
 
-    s = Graph()
+    Returns:
+        An integer array mapping each vertex index to its image.
+    """
+    vertices = numpy.arange(num_clusters * cluster_size)
+    clusters, p_indexes = divmod(vertices, cluster_size)
+    return (clusters + step) % num_clusters * cluster_size + p_indexes
 
-    # Add 560 nodes by adding one Petersen graph (10 nodes) for each
-    # of the 56 nodes of the gewirtz graph.
-    for g_node in g.nodes:
-        s = union(s, p, rename=('', '{}-'.format(g_node)))
 
-    assert len(s.nodes) == 560
-    assert len(s.edges) == 56 * 15
+def find_cluster_rotation(adjacency, num_clusters, cluster_size):
+    """Search for an automorphism of a g560 graph which rotates its clusters.
 
-    sources_to_offsets = extract_symmetry_from_vertex_and_edge_lists(g_vertex_list, g_edge_list)
+    Vertex "G-P" must have the index G * cluster_size + P in the adjacency array.
 
-    source_to_ordered_edges = OrderedDict()
-    for sources, offsets in sources_to_offsets:
-        for source in sources:
-            targets = [(source + offset) % len(g_vertex_list) for offset in offsets]
-            source_to_ordered_edges[source] = targets
-    #pprint(source_to_ordered_edges)
+    Returns:
+        An integer array mapping each vertex index to its image under the
+        smallest rotation which is an automorphism, or None if there is none.
+    """
+    for step in range(1, num_clusters):
+        if num_clusters % step == 0:
+            rotation = find_cluster_rotation_candidate(num_clusters, cluster_size, step)
+            if is_automorphism(adjacency, rotation):
+                return rotation
+    return None
 
-    for g_source, g_targets in source_to_ordered_edges.items():
 
-        # The permutation-gene associated with g_source tells us how the
-        # g out-edges (g_source, g_target) are mapped onto the Petersen graph
+@lru_cache()
+def template_from_svg_file(gewirtz_svg_filepath=DEFAULT_GEWIRTZ_SVG_FILEPATH):
+    """The GPTemplate for the default Petersen graph and a Gewirtz embedding in an SVG file."""
+    g_vertex_list, g_edge_list = vertex_and_edge_lists_from_svg_file(gewirtz_svg_filepath)
+    return GPTemplate(g_vertex_list, g_edge_list)
 
-        # TODO: Look-up the permutation for this g_source in the genome
-        g_source_permutation = genome[g_source % len(genome)]
 
-        for out_index, g_target in enumerate(g_targets):
-            p_source = g_source_permutation.index(out_index)
+def make_symmetrical_from_permutation(
+        genome,
+        gewirtz_svg_filepath=DEFAULT_GEWIRTZ_SVG_FILEPATH, p=None):
+    """Make a g560 graph, respecting any symmetries in the specified Gewirtz graph.
 
-            g_target_permutation = genome[g_target % len(genome)]
-            back_index = source_to_ordered_edges[g_target].index(g_source)
-            p_target = g_target_permutation.index(back_index)
+    The separate node numbering schemes of the Gewirtz and Peterson graphs are
+    preserved in the labelling scheme of the nodes in the new graph, which have
+    will be strings of the form "G-P" where G and P are the respective names from
+    the supplied Gpewirtz and Peterson graphs.
 
-            s_source = '{}-{}'.format(g_source, p_source)
-            s_target = '{}-{}'.format(g_target, p_target)
-            #print("{} -- {}".format(s_source, s_target))
-            s.add_edge(s_source, s_target)
+    Args:
+        genome: A sequence of permutation genes. See GPTemplate.inter_edges().
+        gewirtz_svg_filepath: An SVG file containing data containing a symmetrical representation
+            of the Gewirtz graph.
+        p: An optional Peterson graph. If not supplied the default Peterson graph will be used.
 
-    assert len(s.nodes) == 560
-    assert len(s.edges) == 56*15 + 280
+    Returns:
+        A g560 graph.
+    """
+    if p is None:
+        template = template_from_svg_file(gewirtz_svg_filepath)
+    else:
+        template = GPTemplate(*vertex_and_edge_lists_from_svg_file(gewirtz_svg_filepath), p=p)
+    return template.graph(genome)
 
-    return s
 
 if __name__ == '__main__':
     s = make_symmetrical()
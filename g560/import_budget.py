@@ -0,0 +1,88 @@
+"""Check that importing the command line interface stays fast.
+
+Every CLI invocation and every worker process pays the cost of importing
+g560.cli before doing any useful work, so heavy dependencies are imported
+only when first used. This check imports the module in fresh interpreters,
+and fails if the median import time exceeds a budget, or if any deferred
+dependency has been imported eagerly.
+
+Usage:
+
+    python -m g560.import_budget [--budget SECONDS] [--repeat N]
+
+The exit status is zero if the check passes. The check is also part of
+the regression gate of `python benchmark.py compare`.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# The greatest acceptable median import time, in seconds
+DEFAULT_BUDGET = 0.5
+
+# The modules which must be cheap to import
+MODULES = ('g560.cli',)
+
+# Dependencies which must not be imported by importing MODULES
+DEFERRED = ('scipy', 'networkx', 'asq', 'lxml')
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'eager': [name for name in {deferred!r} if name in sys.modules]}}))
+'''
+
+
+def measure_import(modules=MODULES, deferred=DEFERRED):
+    """Import modules in a fresh interpreter.
+
+    Returns:
+        A 2-tuple of the import time in seconds, and a list of those deferred
+        dependencies which were imported.
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c', _PROBE.format(modules=tuple(modules), deferred=tuple(deferred))],
+        universal_newlines=True)
+    result = json.loads(output.strip().splitlines()[-1])
+    return result['elapsed'], result['eager']
+
+
+def check_import_budget(budget, repeat=5, modules=MODULES, deferred=DEFERRED):
+    """Check that modules import within budget seconds, without their deferred dependencies.
+
+    Returns:
+        A list of failure messages, which is empty if the check passes.
+    """
+    measurements = [measure_import(modules, deferred) for _ in range(repeat)]
+    elapsed = statistics.median(seconds for seconds, _ in measurements)
+    eager = sorted(set(name for _, names in measurements for name in names))
+    failures = []
+    if elapsed > budget:
+        failures.append("Importing {} took {:.3f} s, over the budget of {:.3f} s".format(
+            ', '.join(modules), elapsed, budget))
+    if eager:
+        failures.append("Importing {} eagerly imported {}".format(', '.join(modules), ', '.join(eager)))
+    print("Median import time of {} : {:.3f} s (budget {:.3f} s)".format(', '.join(modules), elapsed, budget))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that importing the g560 CLI stays fast.")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="The greatest acceptable median import time, in seconds.")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="The number of fresh interpreters in which to time the import.")
+    args = parser.parse_args(argv)
+    failures = check_import_budget(args.budget, args.repeat)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
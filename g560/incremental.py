@@ -0,0 +1,177 @@
+"""Incremental re-evaluation of the average shortest path length.
+
+A child genome produced by crossover and mutation differs from one of its
+parents in only a few genes, so the g560 graph it describes differs from its
+parent's graph in only some of the Gewirtz (inter-cluster) edges. Rather than
+solving all-pairs shortest paths from scratch, the distance matrix of the
+parent is retained and only the rows for sources whose distances can change
+are recomputed.
+
+Given the old distances D, deleting an edge (a, b) can only affect a source s
+if it leaves a or b with no remaining neighbour one step closer to s. Inserting
+an edge (a, b) can only affect a source s if |D[s, a] - D[s, b]| > 1. Rows for
+all other sources are carried over unchanged.
+"""
+import time
+from collections import OrderedDict
+
+import numpy
+
+from g560.distance import adjacency_from_edges, distance_matrix
+
+
+def affected_by_deletions(distances, adjacency, deleted_edges):
+    """Find the sources whose distances may change when edges are deleted.
+
+    Args:
+        distances: A square distance matrix for the graph before deletion.
+        adjacency: The adjacency array of the graph before deletion.
+        deleted_edges: An iterable of 2-tuples of vertex indexes.
+
+    Returns:
+        A boolean array with one element per source.
+    """
+    affected = numpy.zeros(len(distances), dtype=bool)
+    lost_parents = {}
+    for a, b in deleted_edges:
+        for u, v in ((a, b), (b, a)):
+            is_parent = distances[:, u].astype(numpy.intp) + 1 == distances[:, v]
+            lost_parents[v] = lost_parents.get(v, 0) + is_parent
+    for v, lost in lost_parents.items():
+        neighbours = adjacency[v][adjacency[v] < len(distances)]
+        parents = (distances[:, neighbours].astype(numpy.intp) + 1 == distances[:, v, None]).sum(axis=1)
+        affected |= (lost > 0) & (lost == parents)
+    return affected
+
+
+def affected_by_insertions(distances, inserted_edges):
+    """Find the sources whose distances may change when edges are inserted.
+
+    Args:
+        distances: A square distance matrix for the graph before insertion.
+        inserted_edges: An iterable of 2-tuples of vertex indexes.
+
+    Returns:
+        A boolean array with one element per source.
+    """
+    affected = numpy.zeros(len(distances), dtype=bool)
+    for a, b in inserted_edges:
+        affected |= numpy.abs(distances[:, a].astype(numpy.intp) - distances[:, b]) > 1
+    return affected
+
+
+def update_distances(distances, old_adjacency, new_adjacency, deleted_edges, inserted_edges):
+    """Update a distance matrix following the deletion and insertion of edges.
+
+    Args:
+        distances: The square distance matrix of the old graph.
+        old_adjacency: The adjacency array of the old graph.
+        new_adjacency: The adjacency array of the new graph.
+        deleted_edges: A collection of edges in the old graph but not the new.
+        inserted_edges: A collection of edges in the new graph but not the old.
+
+    Returns:
+        A 2-tuple of the distance matrix of the new graph, and the number of
+        sources for which distances were recomputed.
+    """
+    affected = affected_by_deletions(distances, old_adjacency, deleted_edges)
+    affected |= affected_by_insertions(distances, inserted_edges)
+    sources = numpy.flatnonzero(affected)
+    updated = distances.copy()
+    if len(sources) > 0:
+        rows = distance_matrix(new_adjacency, sources, dtype=distances.dtype)
+        updated[sources] = rows
+        updated[:, sources] = rows.T
+    return updated, len(sources)
+
+
+class IncrementalEvaluator:
+    """Evaluate average shortest path lengths of genomes from those of similar genomes.
+
+    The distance matrices of the most recently evaluated genomes are retained,
+    so that a subsequently evaluated genome can be evaluated as an update to
+    the nearest of its relatives.
+    """
+
+    def __init__(self, num_vertices, intra_edges, inter_edges, capacity=64):
+        """
+        Args:
+            num_vertices: The number of vertices in each graph.
+            intra_edges: The edges common to the graphs for all genomes, as
+                2-tuples of integer vertex indexes.
+            inter_edges: A callable which accepts a genome and returns the
+                remaining edges of its graph as an integer array of shape
+                (m, 2), with the lesser vertex index of each edge first.
+            capacity: The number of distance matrices to retain.
+        """
+        self._num_vertices = num_vertices
+        self._intra_edges = numpy.asarray(intra_edges, dtype=numpy.intp).reshape(-1, 2)
+        self._inter_edges = inter_edges
+        self._capacity = capacity
+        self._states = OrderedDict()
+        self.num_full = 0
+        self.num_incremental = 0
+        self.num_sources_recomputed = 0
+        # The cumulative time spent constructing graphs, as opposed to computing distances
+        self.construction_seconds = 0.0
+
+    def _adjacency(self, edges):
+        all_edges = numpy.concatenate((self._intra_edges,
+                                       numpy.array(sorted(edges), dtype=numpy.intp).reshape(-1, 2)))
+        return adjacency_from_edges(self._num_vertices, all_edges)
+
+    def _nearest(self, edges, bases):
+        nearest = None
+        for base in bases:
+            state = self._states.get(base)
+            if state is None:
+                continue
+            difference = len(edges ^ state[0])
+            if nearest is None or difference < nearest[0]:
+                nearest = (difference, base, state)
+        return nearest
+
+    def evaluate(self, genome, bases=()):
+        """Compute the average shortest path length of the graph for a genome.
+
+        Args:
+            genome: The genome to be evaluated.
+            bases: An optional sequence of previously evaluated genomes, such as
+                the parents of genome. The distance matrix of whichever of these
+                is nearest to genome is updated to give the result. If none
+                have been retained, the distances are computed from scratch.
+
+        Returns:
+            The average shortest path length.
+
+        Raises:
+            ValueError: If the graph for genome is not connected.
+        """
+        state = self._states.get(genome)
+        if state is None:
+            start = time.perf_counter()
+            edges = frozenset(map(tuple, numpy.asarray(self._inter_edges(genome)).tolist()))
+            adjacency = self._adjacency(edges)
+            self.construction_seconds += time.perf_counter() - start
+            nearest = self._nearest(edges, bases)
+            if nearest is None:
+                distances = distance_matrix(adjacency)
+                self.num_full += 1
+            else:
+                _, base, (base_edges, base_adjacency, base_distances, _) = nearest
+                distances, num_sources = update_distances(
+                    base_distances, base_adjacency, adjacency,
+                    deleted_edges=base_edges - edges, inserted_edges=edges - base_edges)
+                self.num_incremental += 1
+                self.num_sources_recomputed += num_sources
+            if distances.max() == numpy.iinfo(distances.dtype).max:
+                raise ValueError("Graph is not connected.")
+            n = self._num_vertices
+            aspl = int(distances.sum(dtype=numpy.int64)) / (n * (n - 1))
+            state = (edges, adjacency, distances, aspl)
+            self._states[genome] = state
+            if len(self._states) > self._capacity:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(genome)
+        return state[3]
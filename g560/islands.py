@@ -0,0 +1,392 @@
+"""An island model of the genetic algorithm.
+
+Several populations, the islands, evolve independently in separate processes,
+each running the search of g560.cli.main with its own random state. Every
+migration_interval generations each island sends copies of its best
+individuals to another island, chosen by the topology, and receives the same
+number of immigrants, which take the places of the random incomers (and then
+of the last children) in its next generation.
+
+Islands communicate through a transport, which delivers messages between
+islands identified by their index. QueueTransport uses multiprocessing queues
+between processes on one machine, and SocketTransport uses stream sockets,
+addressed as 'unix://path' or 'tcp://host:port', so that islands need not
+share a machine. Since each island waits for its immigrants before breeding,
+a seeded island search is reproducible whichever transport is used.
+
+An island waits only so long for its immigrants, so the others fail rather
+than hang if one dies, and the process running the islands stops them all
+as soon as any one exits without finishing its search. With the socket
+transport the islands of one search may be run by several processes, on
+different machines, each running some of the islands.
+"""
+import json
+import os
+import queue
+import shutil
+import socket
+import tempfile
+import threading
+import sys
+import time
+from contextlib import redirect_stdout
+from multiprocessing import Process, Queue
+
+import numpy
+
+from g560.population import Population
+from g560.telemetry import Telemetry, connect, open_sink, parse_socket_address
+
+TOPOLOGIES = ('ring', 'random')
+
+TRANSPORTS = ('queue', 'socket')
+
+# The number of seconds an island waits for its immigrants before giving up
+DEFAULT_MIGRATION_TIMEOUT = 600.0
+
+# The number of seconds between checks that every island is still running
+_POLL_INTERVAL = 1.0
+
+
+class IslandError(RuntimeError):
+    """An island exited without finishing its search."""
+
+
+def migration_targets(topology, num_islands, epoch, topology_seed=0):
+    """The island to which each island sends its emigrants in one migration.
+
+    Args:
+        topology: 'ring' for each island to send to the next, or 'random' for
+            the islands to be arranged in a new random ring for each migration.
+        num_islands: The number of islands.
+        epoch: The number of the migration, counting from one.
+        topology_seed: The seed of the random rings, which must be the same for all islands.
+
+    Returns:
+        A list whose i-th element is the destination of island i's emigrants.
+    """
+    if topology == 'ring':
+        return [(index + 1) % num_islands for index in range(num_islands)]
+    if topology == 'random':
+        order = numpy.random.RandomState([topology_seed, epoch]).permutation(num_islands).tolist()
+        targets = [None] * num_islands
+        for position, index in enumerate(order):
+            targets[index] = order[(position + 1) % num_islands]
+        return targets
+    raise ValueError("topology {!r} is not one of {}".format(topology, ', '.join(TOPOLOGIES)))
+
+
+class _Transport:
+    """Delivers messages, each a JSON-serializable dictionary, between islands."""
+
+    def __init__(self):
+        self.index = None
+        self._pending = []
+
+    def bind(self, index):
+        """Prepare to send and receive messages as the island with this index, in its own process."""
+        self.index = index
+
+    def send(self, destination, message):
+        raise NotImplementedError
+
+    def _get(self, timeout):
+        raise NotImplementedError
+
+    def receive(self, source, epoch, timeout=None):
+        """Wait for the message sent by an island in a migration.
+
+        Messages from other islands, or from other migrations, which arrive
+        meanwhile are kept until they are received.
+
+        Raises:
+            TimeoutError: If the message does not arrive within timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            for message in self._pending:
+                if message['source'] == source and message['epoch'] == epoch:
+                    self._pending.remove(message)
+                    return message
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("No message from island {} in migration {}".format(source, epoch))
+            try:
+                self._pending.append(self._get(remaining))
+            except queue.Empty:
+                pass
+
+    def close(self):
+        pass
+
+
+class QueueTransport(_Transport):
+    """A transport between processes on one machine, through one multiprocessing queue per island."""
+
+    def __init__(self, num_islands):
+        super().__init__()
+        self._inboxes = [Queue() for _ in range(num_islands)]
+
+    def send(self, destination, message):
+        self._inboxes[destination].put(message)
+
+    def _get(self, timeout):
+        return self._inboxes[self.index].get(timeout=timeout)
+
+
+class SocketTransport(_Transport):
+    """A transport through stream sockets, each island listening at its own address.
+
+    Each message is sent as one line of JSON on a new connection.
+    """
+
+    def __init__(self, addresses, connect_timeout=60.0):
+        """
+        Args:
+            addresses: The address of each island, as 'unix://path' or 'tcp://host:port'.
+            connect_timeout: The number of seconds for which to retry connecting to
+                an island which is not yet listening.
+        """
+        super().__init__()
+        self.addresses = list(addresses)
+        self.connect_timeout = connect_timeout
+        self._inbox = None
+        self._listener = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_inbox'] = None
+        state['_listener'] = None
+        return state
+
+    def bind(self, index):
+        super().bind(index)
+        family, address = parse_socket_address(self.addresses[index])
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(address)
+        self._listener.listen()
+        self._inbox = queue.Queue()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                return  # The listener was closed
+            with connection, connection.makefile('r', encoding='utf-8') as stream:
+                for line in stream:
+                    self._inbox.put(json.loads(line))
+
+    def send(self, destination, message):
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                connection = connect(self.addresses[destination])
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        with connection:
+            connection.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+    def _get(self, timeout):
+        return self._inbox.get(timeout=timeout)
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+
+class Migration:
+    """The migration callable through which one island exchanges individuals with the others."""
+
+    def __init__(self, transport, index, num_islands, interval, num_migrants, topology='ring', topology_seed=0,
+                 timeout=DEFAULT_MIGRATION_TIMEOUT):
+        """
+        Args:
+            transport: A transport, bound to index.
+            index: The index of this island.
+            num_islands: The number of islands.
+            interval: The number of generations between migrations.
+            num_migrants: The number of individuals sent by each island in each migration.
+            topology: One of TOPOLOGIES. See migration_targets().
+            topology_seed: The seed of the random topology, which must be the same for all islands.
+            timeout: The number of seconds to wait for immigrants, after which a TimeoutError
+                is raised, or None to wait indefinitely.
+        """
+        self.transport = transport
+        self.index = index
+        self.num_islands = num_islands
+        self.interval = interval
+        self.num_migrants = num_migrants
+        self.topology = topology
+        self.topology_seed = topology_seed
+        self.timeout = timeout
+
+    def __call__(self, generation, ranked_individuals):
+        """Send the best of the ranked individuals, and return the immigrants, if a migration is due."""
+        if self.num_islands < 2 or generation % self.interval != 0:
+            return None
+        epoch = generation // self.interval
+        targets = migration_targets(self.topology, self.num_islands, epoch, self.topology_seed)
+        emigrants = ranked_individuals[:self.num_migrants]
+        self.transport.send(targets[self.index], {
+            'source': self.index,
+            'epoch': epoch,
+            'genes': emigrants.genes.tolist(),
+        })
+        message = self.transport.receive(targets.index(self.index), epoch, self.timeout)
+        return Population(numpy.array(message['genes'], dtype=numpy.uint8).reshape(
+            (-1,) + ranked_individuals.genes.shape[1:]))
+
+
+def island_seed(seed, index):
+    """The seed of the random state of one island, or None if the search is unseeded."""
+    return None if seed is None else [seed, index]
+
+
+def run_island(index, transport, num_islands, migration_interval, num_migrants, topology, topology_seed,
+               results=None, seed=None, telemetry_target=None, migration_timeout=DEFAULT_MIGRATION_TIMEOUT,
+               **kwargs):
+    """Run the search of one island, in the current process.
+
+    Args:
+        index: The index of this island.
+        transport: A transport, which will be bound to index.
+        num_islands: The number of islands.
+        migration_interval: The number of generations between migrations.
+        num_migrants: The number of individuals sent by each island in each migration.
+        topology: One of TOPOLOGIES.
+        topology_seed: The seed of the random topology, which must be the same for all islands.
+        results: An optional multiprocessing queue on which (index, best) is put when the
+            search ends, unless it fails.
+        seed: The seed of the whole island search, from which that of this island is derived.
+        telemetry_target: An optional telemetry sink, as accepted by open_sink(), shared by all islands.
+        migration_timeout: The number of seconds to wait for immigrants, or None to wait indefinitely.
+        **kwargs: Further arguments to g560.cli.main().
+    """
+    from g560.cli import main
+
+    transport.bind(index)
+    migrate = Migration(transport, index, num_islands, migration_interval, num_migrants, topology, topology_seed,
+                        migration_timeout)
+    telemetry = None
+    if telemetry_target is not None:
+        telemetry = _IslandTelemetry(index, open_sink(telemetry_target))
+    # Line buffering keeps the lines printed by concurrent islands whole
+    try:
+        with open(sys.stdout.fileno(), 'w', buffering=1, closefd=False) as stdout, redirect_stdout(stdout):
+            best = main(seed=island_seed(seed, index), telemetry=telemetry, migrate=migrate,
+                        label="Island {}".format(index), **kwargs)
+    finally:
+        transport.close()
+    # An island which fails reports nothing, so its exit is noticed by run_islands()
+    if results is not None:
+        results.put((index, best))
+
+
+class _IslandTelemetry(Telemetry):
+
+    def __init__(self, index, sink):
+        super().__init__(sink)
+        self.island = index
+
+    def end_generation(self, **fields):
+        return super().end_generation(island=self.island, **fields)
+
+
+def run_islands(num_islands, population_size, generations=None, migration_interval=10, num_migrants=2,
+                topology='ring', transport='queue', addresses=None, seed=None, telemetry_target=None,
+                migration_timeout=DEFAULT_MIGRATION_TIMEOUT, local_islands=None, **kwargs):
+    """Run an island search, with each island in its own process.
+
+    Args:
+        num_islands: The number of islands.
+        population_size: The number of individuals on each island.
+        generations: The generation after which every island stops, or None to run until interrupted.
+        migration_interval: The number of generations between migrations.
+        num_migrants: The number of individuals sent by each island in each migration.
+        topology: One of TOPOLOGIES.
+        transport: 'queue' or 'socket'.
+        addresses: The socket addresses of the islands, for the socket transport. By
+            default each island listens on a Unix domain socket in a temporary directory.
+        seed: An optional seed, for a reproducible search.
+        telemetry_target: An optional telemetry sink, as accepted by open_sink(), shared by all islands.
+        migration_timeout: The number of seconds each island waits for its immigrants,
+            or None to wait indefinitely.
+        local_islands: The indexes of the islands run by this process, when the others
+            are run elsewhere with the socket transport. Defaults to every island.
+        **kwargs: Further arguments to g560.cli.main(), such as gewirtz_svg_filepath.
+
+    Returns:
+        A list of the best genome of each island, or None for those run elsewhere.
+
+    Raises:
+        IslandError: If any island exits without finishing its search, in which
+            case the others are stopped.
+    """
+    if num_migrants > population_size:
+        raise ValueError("Cannot send {} migrants from a population of {}".format(num_migrants, population_size))
+    local_islands = range(num_islands) if local_islands is None else sorted(set(local_islands))
+    if not all(0 <= index < num_islands for index in local_islands):
+        raise ValueError("Local islands {} are not all among the {} islands".format(local_islands, num_islands))
+    distributed = len(local_islands) < num_islands
+    if distributed and (transport != 'socket' or addresses is None):
+        raise ValueError("Islands run elsewhere need the socket transport, with the addresses of every island")
+    if distributed and topology == 'random' and seed is None:
+        raise ValueError("Islands run elsewhere need a seed, so that all agree on the random topology")
+    topology_seed = seed if seed is not None else int.from_bytes(os.urandom(4), 'little')
+    socket_dirpath = None
+    if transport == 'queue':
+        island_transport = QueueTransport(num_islands)
+    elif transport == 'socket':
+        if addresses is None:
+            socket_dirpath = tempfile.mkdtemp(prefix='g560-islands-')
+            addresses = ['unix://' + os.path.join(socket_dirpath, 'island-{}.sock'.format(index))
+                         for index in range(num_islands)]
+        if len(addresses) != num_islands:
+            raise ValueError("{} addresses given for {} islands".format(len(addresses), num_islands))
+        island_transport = SocketTransport(addresses)
+    else:
+        raise ValueError("transport {!r} is not one of {}".format(transport, ', '.join(TRANSPORTS)))
+
+    results = Queue()
+    processes = {
+        index: Process(target=run_island,
+                       args=(index, island_transport, num_islands, migration_interval, num_migrants, topology,
+                             topology_seed, results, seed, telemetry_target, migration_timeout),
+                       kwargs=dict(kwargs, population_size=population_size, generations=generations))
+        for index in local_islands}
+    try:
+        for process in processes.values():
+            process.start()
+        bests = [None] * num_islands
+        unfinished = set(processes)
+        while unfinished:
+            # An island which had exited before waiting began, yet has not reported, has died,
+            # since a finished island's result is flushed to the queue before it exits
+            exited = {index: processes[index].exitcode for index in unfinished
+                      if processes[index].exitcode is not None}
+            try:
+                index, best = results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if exited:
+                    raise IslandError("Island {} exited with code {} without finishing its search".format(
+                        *min(exited.items())))
+                continue
+            bests[index] = best
+            unfinished.discard(index)
+        for process in processes.values():
+            process.join()
+        return bests
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        if socket_dirpath is not None:
+            shutil.rmtree(socket_dirpath, ignore_errors=True)
@@ -1,12 +1,41 @@
 from functools import lru_cache
+from math import factorial
 from random import randrange, choice
 
-from g560.steinhaus_johnson_trotter import permutations
+import numpy
+
+from g560.steinhaus_johnson_trotter import PermutationSequence, unrank_many
 
 
 @lru_cache()
 def make_perms(size):
-    return list(permutations(tuple(range(size))))
+    """All permutations of range(size) in Steinhaus Johnson Trotter order.
+
+    The permutations are computed on demand, so the sequence is cheap to make
+    and occupies almost no memory, however large size! may be.
+    """
+    return PermutationSequence(size)
+
+
+def lexicographic_rank(permutation):
+    """The index of a permutation of range(n) in lexicographic order of all such permutations."""
+    rank = 0
+    remaining = sorted(permutation)
+    for item in permutation:
+        index = remaining.index(item)
+        rank = rank * len(remaining) + index
+        del remaining[index]
+    return rank
+
+
+def lexicographic_unrank(rank, size):
+    """The permutation of range(size) at the given index in lexicographic order."""
+    indexes = []
+    for radix in range(1, size + 1):
+        rank, index = divmod(rank, radix)
+        indexes.append(index)
+    remaining = list(range(size))
+    return tuple(remaining.pop(index) for index in reversed(indexes))
 
 
 def permute_by_distance(seq, distance):
@@ -17,4 +46,50 @@ def permute_by_distance(seq, distance):
     source_indexes = perms[source_index]
     target_indexes = perms[target_index]
     items = type(seq)(seq[source_indexes.index(target_index)] for target_index in target_indexes)
-    return items
\ No newline at end of file
+    return items
+
+
+def permute_many_by_distances(seqs, distances, random_state):
+    """Randomly permute many sequences, each a given Cayley distance, at once.
+
+    A vectorized equivalent of applying permute_by_distance() to each sequence.
+
+    Args:
+        seqs: An array of shape (k, n) whose rows are the sequences to permute.
+        distances: An integer array of k distances.
+        random_state: A numpy.random.RandomState from which the random choices are drawn.
+
+    Returns:
+        An array of the same shape and type as seqs, containing the permuted sequences.
+    """
+    seqs = numpy.asarray(seqs)
+    k, size = seqs.shape
+    num_perms = factorial(size)
+    source_indexes = random_state.randint(0, num_perms, size=k).astype(numpy.int64)
+    signs = random_state.randint(0, 2, size=k).astype(numpy.int64) * 2 - 1
+    target_indexes = (source_indexes + signs * numpy.asarray(distances, dtype=numpy.int64)) % num_perms
+    sources = unrank_many(source_indexes, size)
+    targets = unrank_many(target_indexes, size)
+    # The position of each item in its source permutation
+    rows = numpy.arange(k)[:, None]
+    inverse_sources = numpy.empty_like(sources)
+    inverse_sources[rows, sources] = numpy.arange(size, dtype=sources.dtype)
+    return seqs[rows, inverse_sources[rows, targets]]
+
+
+def lexicographic_ranks(permutations):
+    """The lexicographic_rank() of each of many permutations of range(n) at once.
+
+    Args:
+        permutations: An integer array of shape (k, n) whose rows are permutations.
+
+    Returns:
+        An array of k int64 ranks. n must be at most 20.
+    """
+    permutations = numpy.asarray(permutations)
+    size = permutations.shape[-1]
+    # The number of later items less than each item
+    later = numpy.triu(numpy.ones((size, size), dtype=bool), k=1)
+    lesser = ((permutations[:, None, :] < permutations[:, :, None]) & later).sum(axis=2)
+    radices = numpy.array([factorial(size - 1 - i) for i in range(size)], dtype=numpy.int64)
+    return lesser.astype(numpy.int64).dot(radices)
@@ -1,5 +1,4 @@
-import networkx
-from networkx.generators.small import make_small_undirected_graph
+from functools import lru_cache
 
 # A Petersen graph where the vertex order is a Hamiltonian path
 description = [
@@ -19,12 +18,61 @@ description = [
         [9, 2, 6],  # 10
     ]
 ]
-P = make_small_undirected_graph(description)
-assert len(P) == 10
-assert len(P.edges) == 15
-assert all(d == 3 for _, d in P.degree)
+
+# The zero-based vertices and edges of the graph described, in the order
+# networkx gives them, so they can be used without building the graph
+nodes = tuple(range(description[2]))
+edges = tuple(sorted({tuple(sorted((a - 1, b - 1)))
+                      for a, neighbours in enumerate(description[3], start=1)
+                      for b in neighbours}))
+
+
+@lru_cache()
+def automorphisms():
+    """The 120 automorphisms of the graph described.
+
+    Returns:
+        A tuple of tuples, each mapping every vertex to its image, in
+        lexicographic order, starting with the identity.
+    """
+    neighbours = [set() for _ in nodes]
+    for a, b in edges:
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+
+    def extend(images):
+        # Map the next vertex to each unused vertex whose adjacency to the images so far matches its own
+        vertex = len(images)
+        if vertex == len(nodes):
+            yield tuple(images)
+            return
+        for image in nodes:
+            if image not in images and all((image in neighbours[images[other]]) == (other in neighbours[vertex])
+                                           for other in range(vertex)):
+                yield from extend(images + [image])
+
+    result = tuple(extend([]))
+    assert len(result) == 120
+    return result
+
+
+@lru_cache()
+def _graph():
+    from networkx.generators.small import make_small_undirected_graph
+    P = make_small_undirected_graph(description)
+    assert len(P) == 10
+    assert len(P.edges) == 15
+    assert all(d == 3 for _, d in P.degree)
+    return P
 
 #P = networkx.petersen_graph()
 
 def make():
-    return P.copy()
+    return _graph().copy()
+
+
+def __getattr__(name):
+    """Build the graph P, which earlier versions built on import, on first access."""
+    if name == 'P':
+        return _graph()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,180 @@
+"""An array-backed population of genomes for the genetic algorithm.
+
+A genome is a sequence of genes, each a permutation of range(gene_length). A
+Population holds the genomes of a whole generation in a single array of shape
+(population_size, num_genes, gene_length), so that ranking, selection,
+crossover and the making of new individuals are each a few vectorized
+operations, however large the population. Individual genomes are converted
+to tuples of tuples, the form used as keys by the fitness caches and the
+incremental evaluator, only when requested.
+"""
+import math
+
+import numpy
+
+from g560.canonical import canonical_genes
+from g560.fitness_store import encode_genomes
+
+
+def exponent_base(r, n):
+    """The base b for which b ** -(n - 1) == 1 / r."""
+    return math.pow(1 / r, 1 / (1 - n))
+
+
+def rank_scaled_fitnesses(n, most_to_least_fit_survival_ratio):
+    """The fitnesses given by rank to n genomes, decreasing geometrically from 1."""
+    base = exponent_base(most_to_least_fit_survival_ratio, n)
+    return base ** -numpy.arange(n, dtype=float)
+
+
+def stochastic_universal_indexes(fitnesses, num_selected, phase):
+    """The indexes of the genomes chosen by stochastic universal sampling, in increasing order.
+
+    Args:
+        fitnesses: The non-negative fitnesses of the genomes.
+        num_selected: The number of genomes to select.
+        phase: The phase of the equally spaced pointers, in the range 0 to 1.
+    """
+    cumulative_fitness = numpy.cumsum(fitnesses)
+    spacing = cumulative_fitness[-1] / num_selected
+    pointers = (phase + numpy.arange(num_selected)) * spacing
+    indexes = numpy.searchsorted(cumulative_fitness, pointers, side='left')
+    return numpy.minimum(indexes, len(fitnesses) - 1)
+
+
+class Population:
+    """A sequence of genomes stored in a (population_size, num_genes, gene_length) uint8 array."""
+
+    def __init__(self, genes):
+        """
+        Args:
+            genes: An integer array of shape (population_size, num_genes, gene_length).
+        """
+        genes = numpy.asarray(genes, dtype=numpy.uint8)
+        if genes.ndim != 3:
+            raise ValueError("Population genes must have three dimensions, not {}".format(genes.ndim))
+        self.genes = genes
+
+    @classmethod
+    def from_genomes(cls, genomes, num_genes=None, gene_length=None):
+        """Make a population from a sequence of genomes, each a sequence of genes.
+
+        The shape of an empty population is given by num_genes and gene_length.
+        """
+        genomes = list(genomes)
+        if not genomes:
+            return cls(numpy.empty((0, num_genes, gene_length), dtype=numpy.uint8))
+        return cls(numpy.array(genomes, dtype=numpy.uint8))
+
+    @classmethod
+    def random(cls, population_size, num_genes, gene_length, random_state):
+        """Make a population of genomes whose genes are uniformly random permutations.
+
+        Args:
+            population_size: The number of genomes.
+            num_genes: The number of genes in each genome.
+            gene_length: The number of items permuted by each gene.
+            random_state: A numpy.random.RandomState from which the random choices are drawn.
+        """
+        keys = random_state.random_sample((population_size, num_genes, gene_length))
+        return cls(keys.argsort(axis=-1))
+
+    @classmethod
+    def concatenate(cls, populations):
+        """Make a population from the genomes of several populations, in order."""
+        return cls(numpy.concatenate([population.genes for population in populations]))
+
+    def __len__(self):
+        return len(self.genes)
+
+    def __getitem__(self, index):
+        """A single genome as a tuple of tuples for an integer index, otherwise a Population."""
+        if isinstance(index, (int, numpy.integer)):
+            return tuple(map(tuple, self.genes[index].tolist()))
+        return Population(self.genes[index])
+
+    def __iter__(self):
+        return iter(self.genomes())
+
+    @property
+    def num_genes(self):
+        return self.genes.shape[1]
+
+    @property
+    def gene_length(self):
+        return self.genes.shape[2]
+
+    def genomes(self):
+        """A list of the genomes, each a tuple of tuples."""
+        genes = list(map(tuple, self.genes.reshape(-1, self.gene_length).tolist()))
+        return list(zip(*[iter(genes)] * self.num_genes))
+
+    def keys(self):
+        """A list of compact byte string keys for the genomes, as made by fitness_store.encode_genome()."""
+        return encode_genomes(self.genes)
+
+    def canonical(self):
+        """A Population of the canonical forms of the genomes. See g560.canonical."""
+        return Population(canonical_genes(self.genes))
+
+    def rank(self, fitnesses, most_to_least_fit_survival_ratio=2, maximize=True):
+        """Sort the population from most to least fit, and scale the fitnesses by rank.
+
+        Ties in fitness are broken by comparing the genomes lexicographically.
+
+        Args:
+            fitnesses: A sequence of the fitnesses of the genomes.
+            most_to_least_fit_survival_ratio: The ratio of the scaled fitness of the
+                most fit genome to that of the least fit.
+            maximize: True if greater fitnesses are better, False if lesser are.
+
+        Returns:
+            A 2-tuple of an array of scaled fitnesses, decreasing geometrically from
+            1, and the ranked Population.
+        """
+        fitnesses = numpy.asarray(fitnesses, dtype=float)
+        flattened = self.genes.reshape(len(self), -1)
+        # numpy.lexsort sorts by its last key first
+        order = numpy.lexsort(tuple(flattened[:, ::-1].T) + (fitnesses,))
+        if maximize:
+            order = order[::-1]
+        return rank_scaled_fitnesses(len(self), most_to_least_fit_survival_ratio), self[order]
+
+    def stochastic_universal_sample(self, fitnesses, num_selected, random_state, phase=None):
+        """Select genomes with probability proportional to fitness by stochastic universal sampling.
+
+        Args:
+            fitnesses: The non-negative fitnesses of the genomes, such as those scaled by rank().
+            num_selected: The number of genomes to select.
+            random_state: A numpy.random.RandomState from which the phase is drawn.
+            phase: An optional phase of the equally spaced pointers, in the range 0 to 1.
+
+        Returns:
+            A Population of the selected genomes, in the order of this population.
+        """
+        if phase is None:
+            phase = random_state.uniform(0.0, 1.0)
+        elif not (0.0 <= phase <= 1.0):
+            raise ValueError("phase {} out of range 0 to 1".format(phase))
+        return self[stochastic_universal_indexes(fitnesses, num_selected, phase)]
+
+    def shuffle(self, random_state):
+        """A Population of the same genomes in a random order."""
+        return self[random_state.permutation(len(self))]
+
+    def uniform_crossover(self, partners, num_children, random_state):
+        """Combine each genome with a partner, taking each gene from either with equal probability.
+
+        Args:
+            partners: A Population of the same size, where partners[i] is the partner of self[i].
+            num_children: The number of children made from each couple.
+            random_state: A numpy.random.RandomState from which the random choices are drawn.
+
+        Returns:
+            A Population of len(self) * num_children genomes, the children of each
+            couple being consecutive.
+        """
+        firsts = numpy.repeat(self.genes, num_children, axis=0)
+        seconds = numpy.repeat(partners.genes, num_children, axis=0)
+        choices = random_state.randint(0, 2, size=firsts.shape[:2] + (1,)).astype(bool)
+        return Population(numpy.where(choices, firsts, seconds))
@@ -2,9 +2,10 @@ from collections import Counter
 from itertools import combinations, chain
 from pprint import pprint
 
-from asq import query
+import numpy
 
 from g560 import gewirtz
+from g560.short_cycles import cycle_counts, enumerate_cycles
 
 
 def find_quads(g):
@@ -19,11 +20,11 @@ def find_quads(g):
 
 
 def main():
-    g = gewirtz.make()
-    q = list(find_quads(g))
-    print(len(q))
+    adjacency = numpy.array(gewirtz.neighbours)
+    assert cycle_counts(adjacency)[4] == 630
 
-    quads = query(q).distinct(frozenset).to_list()
+    # Each quad once, as (a, b, c, d) around the cycle from its least vertex a
+    quads = [tuple(quad) for quad in enumerate_cycles(adjacency, 4).tolist()]
 
     # https://books.google.no/books?id=brziBQAAQBAJ&pg=PA123&lpg=PA123&dq=gewirtz+630&source=bl&ots=GoniUSAlUk&sig=Fq_7YVjAprOPofYs3_Kvn1wUjKY&hl=no&sa=X&ved=0ahUKEwj96v24ov7ZAhWGJJoKHZ3FAOAQ6AEILjAB#v=onepage&q=gewirtz%20630&f=false
     assert len(quads) == 630
@@ -0,0 +1,328 @@
+"""Approximate fitness from sampled sources, refined by racing.
+
+The average shortest path length of a g560 graph is the mean, over one
+source vertex in each orbit of its rotational symmetry, of the mean distance
+from that source to every other vertex. A random sample of those sources
+gives an unbiased estimate, together with a confidence interval from the
+spread of the sampled means.
+
+Selection in the genetic algorithm depends only on the ranks of the
+fitnesses, and stochastic universal sampling of rank-scaled fitnesses,
+once its phase is drawn, selects the individual at each rank a known number
+of times. The survivors are taken in order of rank, and the elite are the
+best few, so the selection is the same as from exact fitnesses as long as
+the individual at every selected rank, and at every rank of the elite, is
+known. Racing evaluates the whole population from a few sources, then
+repeatedly doubles the sample of every individual whose interval overlaps
+another's where either could hold such a rank, and evaluates exactly those
+whose samples would be complete. Only individuals which could hold nothing
+but ranks which are never selected are left with estimates, and then only
+their order among themselves is unknown. The elite are always evaluated
+exactly, so the best individual is reported with its exact fitness.
+
+The confidence intervals are only approximate, so an estimate far from the
+exact fitness could still change the selection, though rarely with the
+default half-width.
+
+Many graphs are searched together by packing their samples into the lanes
+of 64-bit words: with eight sources each, eight graphs share one word per
+vertex. The graphs share their Petersen edges, so the neighbours along
+those are gathered once for every lane, and only the Gewirtz neighbours are
+gathered lane by lane.
+"""
+import zlib
+from collections import OrderedDict
+
+import numpy
+
+from g560.distance import orbits, unpack
+from g560.fitness_store import encode_genome
+
+_WORD = numpy.dtype('<u8')
+
+# The number of sources from which each individual is first estimated
+INITIAL_SOURCES = 8
+
+# The half-width of the confidence intervals, in standard errors
+DEFAULT_Z = 3.0
+
+
+def batched_source_distance_sums(adjacencies, sources):
+    """The sum of the distances from each of some sources to every vertex, in each of several graphs.
+
+    Args:
+        adjacencies: An integer array of shape (k, n, d) of the adjacency
+            arrays of k graphs on the same n vertices.
+        sources: An integer array of shape (k, s) of the sources in each
+            graph, where s is at most 64.
+
+    Returns:
+        A 2-tuple of an integer array of shape (k, s) of the distance sums, and
+        an array of k bools which are True for the graphs in which every
+        source reached every vertex.
+    """
+    adjacencies = numpy.asarray(adjacencies, dtype=numpy.intp)
+    sources = numpy.asarray(sources, dtype=numpy.intp)
+    num_graphs, n, degree = adjacencies.shape
+    num_sources = sources.shape[1]
+    lanes = 64 // num_sources
+    num_words = (num_graphs + lanes - 1) // lanes
+
+    # Graph b occupies bits lane * num_sources onwards of word b // lanes, where lane = b % lanes
+    graphs = numpy.arange(num_graphs)
+    words, graph_lanes = divmod(graphs, lanes)
+    bits = graph_lanes[:, numpy.newaxis] * num_sources + numpy.arange(num_sources)
+    reached = numpy.zeros((n + 1, num_words), dtype=_WORD)
+    # Graphs sharing a word may share sources, so the bits are combined unbuffered
+    numpy.bitwise_or.at(reached, (sources, numpy.broadcast_to(words[:, numpy.newaxis], sources.shape)),
+                        numpy.left_shift(numpy.uint64(1), bits.astype(_WORD)))
+
+    shared = [column for column in range(degree)
+              if (adjacencies[:, :, column] == adjacencies[0, :, column]).all()]
+    shared_neighbours = [adjacencies[0, :, column] for column in shared]
+    # For each lane and unshared column, the neighbours of each vertex in the graph in that lane of each word
+    padded = numpy.full((num_words * lanes, n, degree), n, dtype=numpy.intp)
+    padded[:num_graphs] = adjacencies
+    padded = padded.reshape(num_words, lanes, n, degree)
+    lane_neighbours = [(numpy.uint64(((1 << num_sources) - 1) << (lane * num_sources)),
+                        numpy.ascontiguousarray(padded[:, lane, :, column].T))
+                       for lane in range(lanes) for column in range(degree) if column not in shared]
+    word_indexes = numpy.arange(num_words)
+
+    sums = numpy.zeros(num_words * 64, dtype=numpy.int64)
+    counts = numpy.ones(num_words * 64, dtype=numpy.int64)
+    distance = 0
+    while True:
+        expanded = numpy.zeros((n, num_words), dtype=_WORD)
+        for neighbours in shared_neighbours:
+            expanded |= reached[neighbours]
+        for mask, neighbours in lane_neighbours:
+            expanded |= reached[neighbours, word_indexes] & mask
+        fresh = expanded & ~reached[:n]
+        if not fresh.any():
+            break
+        reached[:n] |= fresh
+        distance += 1
+        per_bit = unpack(fresh, num_words * 64).sum(axis=0)
+        sums += distance * per_bit
+        counts += per_bit
+
+    bit_indexes = words[:, numpy.newaxis] * 64 + bits
+    return sums[bit_indexes], (counts[bit_indexes] == n).all(axis=1)
+
+
+class SampledEvaluator:
+    """Estimates of the average shortest path lengths of g560 graphs from samples of their sources."""
+
+    def __init__(self, template, num_genes, seed=0):
+        """
+        Args:
+            template: The GPTemplate from which graphs are made.
+            num_genes: The number of genes in each genome.
+            seed: Combined with each genome to choose the order in which its sources are sampled.
+        """
+        self.template = template
+        self.seed = seed
+        self.num_vertices = template.num_vertices
+        rotation = template.rotation(num_genes)
+        candidates = None
+        if rotation is not None:
+            representatives, sizes = orbits(rotation)
+            if (sizes == sizes[0]).all():
+                candidates = representatives
+        # Sources are drawn uniformly from one vertex per equally sized orbit, or from every vertex
+        self.candidates = numpy.arange(self.num_vertices) if candidates is None else candidates
+
+    def source_order(self, key):
+        """The order in which the candidate sources of a genome are sampled.
+
+        It depends only on the genome, so racing is reproducible whatever the
+        order in which genomes are evaluated.
+        """
+        state = numpy.random.RandomState(zlib.crc32(encode_genome(key)) ^ self.seed)
+        return self.candidates[state.permutation(len(self.candidates))]
+
+    def mean_distances(self, genomes, sources):
+        """The mean distance from each of some sources to every other vertex, in the graph for each genome.
+
+        Args:
+            genomes: A sequence of k genomes.
+            sources: An integer array of shape (k, s) of the sources in each graph.
+
+        Returns:
+            A float array of shape (k, s).
+
+        Raises:
+            ValueError: If any graph is not connected.
+        """
+        adjacencies = self.template.adjacencies(genomes)
+        sums, connected = batched_source_distance_sums(adjacencies, sources)
+        if not connected.all():
+            raise ValueError("Graph is not connected.")
+        return sums / (self.num_vertices - 1)
+
+
+def confidence_interval(samples, population_size, z=DEFAULT_Z, resolution=0.0):
+    """A confidence interval for the mean of a finite population from a sample drawn without replacement.
+
+    Args:
+        samples: The sampled values.
+        population_size: The number of values in the population.
+        z: The half-width of the interval, in standard errors.
+        resolution: The least standard deviation assumed, so that a small
+            sample of identical values does not give an interval of zero width.
+
+    Returns:
+        A 2-tuple of the lower and upper bounds.
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    num_samples = len(samples)
+    mean = samples.mean()
+    if num_samples >= population_size:
+        return mean, mean
+    deviation = max(samples.std(ddof=1) if num_samples > 1 else 0.0, resolution)
+    correction = ((population_size - num_samples) / (population_size - 1)) ** 0.5
+    half_width = z * deviation / num_samples ** 0.5 * correction
+    return mean - half_width, mean + half_width
+
+
+def possible_elite(lowers, uppers, multiplicities, num_exact):
+    """Find the genomes which could be among the best num_exact individuals.
+
+    Args:
+        lowers, uppers: Arrays of the bounds of the fitness of each distinct
+            genome, equal for those known exactly. Lesser is better.
+        multiplicities: An array of the number of individuals with each genome.
+        num_exact: The number of best individuals.
+
+    Returns:
+        An array of bools, True for the genomes which could be among the best.
+    """
+    if num_exact <= 0:
+        return numpy.zeros(len(lowers), dtype=bool)
+    order = numpy.argsort(uppers, kind='mergesort')
+    covered = numpy.cumsum(multiplicities[order])
+    threshold = uppers[order[min(numpy.searchsorted(covered, num_exact), len(order) - 1)]]
+    return lowers <= threshold
+
+
+def unresolved(lowers, uppers, exact, multiplicities, num_exact, selections=None):
+    """Find the estimates which must be refined for the selection, and the best, to be known.
+
+    Args:
+        lowers, uppers: Arrays of the bounds of the fitness of each distinct
+            genome, equal for those known exactly. Lesser is better.
+        exact: An array of bools, True for the fitnesses known exactly.
+        multiplicities: An array of the number of individuals with each genome.
+        num_exact: The number of best individuals whose fitnesses must be exact.
+        selections: An optional array of the number of times the individual
+            at each rank, from best to worst, is selected. If None, the whole
+            order of the fitnesses must be known. The best num_exact ranks
+            are treated as selected.
+
+    Returns:
+        An array of bools, True for the inexact fitnesses which must be refined.
+    """
+    # An interval overlapping any other leaves the order undecided
+    overlaps = (lowers[:, numpy.newaxis] <= uppers) & (lowers <= uppers[:, numpy.newaxis])
+    numpy.fill_diagonal(overlaps, False)
+    if selections is None:
+        refine = overlaps.any(axis=1)
+    else:
+        # The individuals of each genome take ranks after those of the genomes
+        # which are certainly better, and before those which are certainly worse
+        better = uppers < lowers[:, numpy.newaxis]
+        first = better.dot(multiplicities)
+        last = first + overlaps.dot(multiplicities) + multiplicities - 1
+        # The number of selected ranks before each rank
+        selected = (numpy.asarray(selections) > 0) | (numpy.arange(len(selections)) < num_exact)
+        preceding = numpy.concatenate(([0], numpy.cumsum(selected)))
+        could_be_selected = preceding[last + 1] > preceding[first]
+        # Which individual holds a selected rank is undecided while it, or any
+        # individual whose order with it is undecided, could hold that rank
+        refine = overlaps.any(axis=1) & could_be_selected
+        refine |= overlaps.dot(could_be_selected)
+    refine |= possible_elite(lowers, uppers, multiplicities, num_exact)
+    return refine & ~exact
+
+
+def race(individuals, keys, known, sampler, evaluate_exact, num_exact, z=DEFAULT_Z,
+         initial_sources=INITIAL_SOURCES, selections=None):
+    """Evaluate a population only as precisely as is needed to select from it.
+
+    Args:
+        individuals: A sequence of genomes.
+        keys: A sequence of the same length of the genomes under which their
+            fitnesses are known, such as their canonical forms.
+        known: A dictionary mapping keys to their exact fitnesses.
+        sampler: A SampledEvaluator.
+        evaluate_exact: A callable which accepts an OrderedDict mapping keys to
+            individuals, and returns a list of (key, exact fitness) pairs.
+        num_exact: The number of best individuals whose fitnesses must be exact.
+        z: The half-width of the confidence intervals, in standard errors.
+        initial_sources: The number of sources from which each fitness is first estimated.
+        selections: An optional array of the number of times the individual at
+            each rank, from best to worst, is selected. If None, fitnesses are
+            refined until the whole order of the population is known.
+
+    Returns:
+        A 3-tuple of a list of fitnesses corresponding to individuals, some of
+        which are estimates, the set of the keys whose fitnesses were
+        estimated without being evaluated exactly, and the total number of
+        sources searched from in making estimates.
+    """
+    exact = dict(known)
+    individual_of = OrderedDict()
+    for individual, key in zip(individuals, keys):
+        individual_of.setdefault(key, individual)
+    distinct = list(individual_of)
+    multiplicities = numpy.array([0] * len(distinct))
+    position = {key: index for index, key in enumerate(distinct)}
+    for key in keys:
+        multiplicities[position[key]] += 1
+
+    num_candidates = len(sampler.candidates)
+    resolution = 1 / (sampler.num_vertices - 1)
+    orders = {}
+    samples = {}
+    num_sources_searched = 0
+    pending = [key for key in distinct if key not in exact]
+    num_sources = initial_sources
+    while pending:
+        # Refine the pending estimates, or evaluate exactly those whose samples would be complete
+        if num_sources >= num_candidates:
+            exact.update(evaluate_exact(OrderedDict((key, individual_of[key]) for key in pending)))
+        else:
+            # Genomes which became pending later have smaller samples, so are extended separately
+            batches = OrderedDict()
+            for key in pending:
+                if key not in orders:
+                    orders[key] = sampler.source_order(key)
+                    samples[key] = numpy.empty(0)
+                batches.setdefault(len(samples[key]), []).append(key)
+            for have, batch in batches.items():
+                # At most 64 sources per genome in each search
+                for start in range(have, num_sources, 64):
+                    stop = min(start + 64, num_sources)
+                    sources = numpy.stack([orders[key][start:stop] for key in batch])
+                    means = sampler.mean_distances([individual_of[key] for key in batch], sources)
+                    for key, row in zip(batch, means):
+                        samples[key] = numpy.concatenate((samples[key], row))
+                    num_sources_searched += sources.size
+
+        lowers = numpy.empty(len(distinct))
+        uppers = numpy.empty(len(distinct))
+        is_exact = numpy.zeros(len(distinct), dtype=bool)
+        for index, key in enumerate(distinct):
+            if key in exact:
+                lowers[index] = uppers[index] = exact[key]
+                is_exact[index] = True
+            else:
+                lowers[index], uppers[index] = confidence_interval(samples[key], num_candidates, z, resolution)
+        pending = [distinct[index] for index in
+                   numpy.flatnonzero(unresolved(lowers, uppers, is_exact, multiplicities, num_exact, selections))]
+        num_sources *= 2
+
+    estimates = {key: exact[key] if key in exact else float(samples[key].mean()) for key in distinct}
+    estimated = {key for key in distinct if key not in exact}
+    return [estimates[key] for key in keys], estimated, num_sources_searched
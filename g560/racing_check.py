@@ -0,0 +1,101 @@
+"""Check that racing selects exactly as evaluating every individual exactly does.
+
+Racing estimates fitnesses only as precisely as selection needs, so a
+seeded search must breed the same individuals with racing as without it.
+This check runs a short seeded search both ways, and fails unless both end
+with the same population, lineages, best genome and random state. It also
+reports how many individuals each evaluated exactly.
+
+Usage:
+
+    python -m g560.racing_check [--population-size N] [--generations N] [--seed N]
+
+The exit status is zero if the check passes. The check is also part of
+the regression gate of `python benchmark.py compare`.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+from g560.telemetry import Telemetry
+
+DEFAULT_POPULATION_SIZE = 100
+
+DEFAULT_GENERATIONS = 5
+
+DEFAULT_SEED = 560
+
+# The parts of the final checkpoint which must be the same with and without racing
+_COMPARED = ('individuals', 'lineages', 'best', 'random_state')
+
+
+class _RecordingTelemetry(Telemetry):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def end_generation(self, **fields):
+        record = super().end_generation(**fields)
+        self.records.append(record)
+        return record
+
+
+def run_search(racing, population_size=DEFAULT_POPULATION_SIZE, generations=DEFAULT_GENERATIONS,
+               seed=DEFAULT_SEED):
+    """Run a seeded search, with or without racing.
+
+    Returns:
+        A 2-tuple of the final checkpoint, and a list of the number of genomes
+        evaluated exactly in each generation.
+    """
+    from g560.cli import main
+
+    telemetry = _RecordingTelemetry()
+    with tempfile.TemporaryDirectory() as dirpath:
+        checkpoint_filepath = os.path.join(dirpath, 'checkpoint.json')
+        with redirect_stdout(io.StringIO()):
+            main(population_size, seed=seed, generations=generations, telemetry=telemetry,
+                 checkpoint_filepath=checkpoint_filepath, checkpoint_interval=generations, racing=racing)
+        with open(checkpoint_filepath) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+    return checkpoint, [record['evaluations'] for record in telemetry.records]
+
+
+def check_racing(population_size=DEFAULT_POPULATION_SIZE, generations=DEFAULT_GENERATIONS, seed=DEFAULT_SEED):
+    """Check that a seeded search ends with the same population with racing as without.
+
+    Returns:
+        A list of failure messages, which is empty if the check passes.
+    """
+    exact_checkpoint, exact_evaluations = run_search(False, population_size, generations, seed)
+    racing_checkpoint, racing_evaluations = run_search(True, population_size, generations, seed)
+    failures = ["Racing changed the {} after {} generations of a search seeded with {}".format(
+                    part, generations, seed)
+                for part in _COMPARED if racing_checkpoint[part] != exact_checkpoint[part]]
+    print("Exact evaluations per generation : {} without racing, {} with racing".format(
+        exact_evaluations, racing_evaluations))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that racing selects exactly as exact evaluation does.")
+    parser.add_argument('--population-size', type=int, default=DEFAULT_POPULATION_SIZE,
+                        help="The size of the population searched.")
+    parser.add_argument('--generations', type=int, default=DEFAULT_GENERATIONS,
+                        help="The number of generations searched.")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help="The seed of the searches.")
+    args = parser.parse_args(argv)
+    failures = check_racing(args.population_size, args.generations, args.seed)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
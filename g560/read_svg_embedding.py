@@ -1,20 +1,41 @@
+"""Read graphs from SVG drawings of their circular embeddings.
+
+Parsing the XML of a large catalogue of embeddings is slow compared with
+everything else a worker does at start up, so the first load of an SVG file
+writes a compiled sidecar file alongside it, named by appending '.npz' to the
+SVG file name, which holds the vertex positions and edge arrays of every
+embedding in the file. The sidecar records a digest of the SVG file from which
+it was compiled, and later loads use it, skipping the XML entirely, so long as
+the digest still matches.
+"""
+import hashlib
+import os
 from functools import lru_cache
-from pprint import pprint
 from statistics import mean
 
-from euclidian.cartesian2 import Point2
-from lxml import etree
-from networkx import Graph
+import numpy
+
+# The suffix appended to an SVG file name to name its compiled sidecar file
+SIDECAR_SUFFIX = '.npz'
+
+# The version of the layout of the sidecar file
+_SIDECAR_FORMAT = 1
+
+
+def file_digest(filepath):
+    """A hexadecimal SHA-1 digest of the contents of a file."""
+    with open(filepath, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
 
 
 @lru_cache()
-def vertex_and_edge_lists_from_svg_file(svg_filepath):
+def vertex_and_edge_lists_from_svg_file(svg_filepath, index=0):
     """Read an SVG representation of a graph.
 
     The graph must be a circular embedding, with all nodes
     lying on a circle, and all edges as chords of the circle.
 
-    Assumes the following SVG structure:
+    Expects the following SVG structure:
 
         <svg>
             <g>
@@ -37,10 +58,13 @@ def vertex_and_edge_lists_from_svg_file(svg_filepath):
 
     Where line elements are used to represent edges, and circle elements are
     used to represent vertices (nodes). Correspondence is done on the basis
-    of equality of coordinates.
+    of the coincidence of line ends with circle centres. A file may contain
+    a catalogue of several embeddings, each a group of such groups, in which
+    case index selects one of them. See embeddings_from_svg_file().
 
     Args:
         svg_filepath: An SVG file containing data with the above structure.
+        index: The index of the embedding in the file.
 
     Returns:
         A 2-tuple where the first element is a sequence of integer vertex labels,
@@ -48,11 +72,157 @@ def vertex_and_edge_lists_from_svg_file(svg_filepath):
         The vertices will be ordered anticlockwise from the negative x axis.
 
     """
-    tree = etree.parse(svg_filepath)
-    root = tree.getroot()
-    edge_group = root[0][0][0]
-    node_group = root[0][0][1]
-    return vertex_and_edge_lists_from_svg_elements(node_group, edge_group)
+    positions, edges = embeddings_from_svg_file(svg_filepath)[index]
+    return range(len(positions)), tuple(map(tuple, edges.tolist()))
+
+
+@lru_cache()
+def embeddings_from_svg_file(svg_filepath, use_sidecar=True):
+    """Read every circular embedding of a graph in an SVG file.
+
+    An embedding is the content of the innermost group element containing
+    both line and circle elements, whether directly or within child groups.
+
+    Args:
+        svg_filepath: An SVG file containing one or more embeddings structured as
+            described for vertex_and_edge_lists_from_svg_file().
+        use_sidecar: If True, read the embeddings from the compiled sidecar file
+            if it is up to date, and otherwise write it.
+
+    Returns:
+        A list containing a 2-tuple for each embedding in document order. The first
+        element is an array of shape (n, 2) of the positions of the vertices,
+        ordered anticlockwise from the negative x axis, and the second an integer
+        array of shape (m, 2) of the edges between the vertices with those indexes.
+    """
+    if not use_sidecar:
+        return _compile_embeddings(svg_filepath)
+    digest = file_digest(svg_filepath)
+    sidecar_filepath = svg_filepath + SIDECAR_SUFFIX
+    embeddings = _read_sidecar(sidecar_filepath, digest)
+    if embeddings is None:
+        embeddings = _compile_embeddings(svg_filepath)
+        _write_sidecar(sidecar_filepath, digest, embeddings)
+    return embeddings
+
+
+def _read_sidecar(sidecar_filepath, digest):
+    try:
+        with numpy.load(sidecar_filepath) as sidecar:
+            if int(sidecar['format']) != _SIDECAR_FORMAT or str(sidecar['digest']) != digest:
+                return None
+            positions = numpy.split(sidecar['positions'], numpy.cumsum(sidecar['vertex_counts'])[:-1])
+            edges = numpy.split(sidecar['edges'], numpy.cumsum(sidecar['edge_counts'])[:-1])
+    except (OSError, KeyError, ValueError):
+        return None
+    return list(zip(positions, edges))
+
+
+def _write_sidecar(sidecar_filepath, digest, embeddings):
+    temporary_filepath = '{}.{}.tmp'.format(sidecar_filepath, os.getpid())
+    try:
+        with open(temporary_filepath, 'wb') as sidecar_file:
+            numpy.savez(
+                sidecar_file,
+                format=_SIDECAR_FORMAT,
+                digest=digest,
+                vertex_counts=numpy.array([len(positions) for positions, _ in embeddings], dtype=numpy.intp),
+                edge_counts=numpy.array([len(edges) for _, edges in embeddings], dtype=numpy.intp),
+                positions=numpy.concatenate([positions for positions, _ in embeddings]),
+                edges=numpy.concatenate([edges for _, edges in embeddings]))
+        os.replace(temporary_filepath, sidecar_filepath)
+    except OSError:
+        # The sidecar is only an optimization, so an unwritable directory is not an error
+        if os.path.exists(temporary_filepath):
+            os.remove(temporary_filepath)
+
+
+def _compile_embeddings(svg_filepath):
+    """Parse the embeddings in an SVG file, streaming its elements."""
+    from lxml import etree
+
+    embeddings = []
+    # The line and circle attributes found so far within each open group
+    frames = [([], [])]
+    for event, element in etree.iterparse(svg_filepath, events=('start', 'end')):
+        tag = etree.QName(element).localname
+        if event == 'start':
+            if tag == 'g':
+                frames.append(([], []))
+            continue
+        if tag == 'line':
+            frames[-1][0].append(tuple(float(element.attrib[name]) for name in ('x1', 'y1', 'x2', 'y2')))
+        elif tag == 'circle':
+            frames[-1][1].append((float(element.attrib['cx']), float(element.attrib['cy']),
+                                  float(element.attrib.get('r', 0.0))))
+        elif tag == 'g':
+            lines, circles = frames.pop()
+            if lines and circles:
+                embeddings.append(_embedding_from_lines_and_circles(lines, circles))
+            else:
+                frames[-1][0].extend(lines)
+                frames[-1][1].extend(circles)
+        element.clear()
+    lines, circles = frames.pop()
+    if lines and circles:
+        embeddings.append(_embedding_from_lines_and_circles(lines, circles))
+    if not embeddings:
+        raise ValueError("No embedding found in {}".format(svg_filepath))
+    return embeddings
+
+
+def _embedding_from_lines_and_circles(lines, circles):
+    circles = numpy.array(circles, dtype=float).reshape(-1, 3)
+    lines = numpy.array(lines, dtype=float).reshape(-1, 4)
+    positions = circles[:, :2]
+    # The exact mean, since whether a vertex on the negative x axis is ordered
+    # first or last depends on the sign of its tiny vertical offset from the centre
+    center = numpy.array([mean(positions[:, 0].tolist()), mean(positions[:, 1].tolist())])
+    offsets = positions - center
+    order = numpy.argsort(numpy.arctan2(offsets[:, 1], offsets[:, 0]), kind='mergesort')
+    positions = positions[order]
+    radius = circles[:, 2].max()
+    tolerance = radius / 2 if radius > 0 else 1e-6 * max(numpy.ptp(positions, axis=0).max(), 1.0)
+    ends = lines.reshape(-1, 2)
+    edges = match_points(positions, ends, tolerance).reshape(-1, 2)
+    return positions, edges
+
+
+def match_points(positions, points, tolerance):
+    """Find the position nearest to each of many points, using a spatial hash.
+
+    Args:
+        positions: An array of shape (n, 2) of distinct positions.
+        points: An array of shape (k, 2) of points, each of which should lie
+            within tolerance of one of the positions.
+        tolerance: The greatest distance at which a point matches a position.
+
+    Returns:
+        An integer array of k indexes into positions.
+
+    Raises:
+        ValueError: If any point is not within tolerance of a position.
+    """
+    # Hash positions into square cells the size of the tolerance, so that a
+    # point's match lies in the point's cell or one of the eight around it
+    cells = {}
+    for index, cell in enumerate(map(tuple, numpy.floor(positions / tolerance).astype(numpy.int64).tolist())):
+        cells.setdefault(cell, []).append(index)
+    point_cells = numpy.floor(points / tolerance).astype(numpy.int64).tolist()
+    indexes = numpy.empty(len(points), dtype=numpy.intp)
+    for i, ((cx, cy), (x, y)) in enumerate(zip(point_cells, points.tolist())):
+        best = None
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for index in cells.get((cx + dx, cy + dy), ()):
+                    px, py = positions[index]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if best is None or distance < best[0]:
+                        best = (distance, index)
+        if best is None or best[0] > tolerance ** 2:
+            raise ValueError("Line end ({}, {}) does not coincide with any vertex".format(x, y))
+        indexes[i] = best[1]
+    return indexes
 
 
 def vertex_and_edge_lists_from_svg_elements(node_group, edge_group):
@@ -77,31 +247,16 @@ def vertex_and_edge_lists_from_svg_elements(node_group, edge_group):
         and the second is a sequence of 2-tuples representing undirected edges.
         The vertices will be ordered anticlockwise from the negative x axis.
     """
-    geometric_vertices = []
-    for i, node in enumerate(node_group):
-        geometric_vertices.append(Point2(x=float(node.attrib['cx']),
-                                         y=float(node.attrib['cy'])))
-    center = Point2(x=mean(v.x for v in geometric_vertices),
-                    y=mean(v.y for v in geometric_vertices))
-    geometric_vertices.sort(key=lambda v: (v - center).atan2())
-
-    geometric_edges = []
-    for edge in edge_group:
-        source_vertex = Point2(x=float(edge.attrib['x1']),
-                               y=float(edge.attrib['y1']))
-        target_vertex = Point2(x=float(edge.attrib['x2']),
-                               y=float(edge.attrib['y2']))
-        edge = (source_vertex, target_vertex)
-        geometric_edges.append(edge)
-
-    vertices = range(len(geometric_vertices))
-    edges = tuple((geometric_vertices.index(from_vertex),
-              geometric_vertices.index(to_vertex))
-             for from_vertex, to_vertex in geometric_edges)
-    return vertices, edges
+    circles = [(float(node.attrib['cx']), float(node.attrib['cy']), float(node.attrib.get('r', 0.0)))
+               for node in node_group]
+    lines = [tuple(float(edge.attrib[name]) for name in ('x1', 'y1', 'x2', 'y2'))
+             for edge in edge_group]
+    positions, edges = _embedding_from_lines_and_circles(lines, circles)
+    return range(len(positions)), tuple(map(tuple, edges.tolist()))
 
 
 def graph_from_vertex_and_edge_lists(vertices, edges):
+    from networkx import Graph
     graph = Graph()
     graph.add_nodes_from(vertices)
     graph.add_edges_from(edges)
@@ -0,0 +1,297 @@
+"""Replacement products of regular base graphs with gadgets.
+
+The replacement product of a d-regular base graph with a gadget on d
+vertices replaces each base vertex u by a copy of the gadget, its cluster,
+and attaches each vertex of the cluster to a different one of the d edges
+of u, its ports. Each base edge then joins the vertices attached to it at
+its two ends. The g560 graphs are replacement products of the Gewirtz graph
+with the Petersen graph.
+
+The ports of each base vertex are the columns of its row of the base
+adjacency array, in order. Which gadget vertex is attached to which port is
+given by permutations like the genes of a genome: gadget vertex P of the
+cluster of u is attached to port ports[u % k][P], where k is the number of
+permutations. By default gadget vertex P is attached to port P.
+
+Vertex P of the cluster of u has the index u * d + P. The products are
+written a chunk of base vertices at a time into preallocated arrays, which
+may be memory-mapped, so products with millions of vertices are made in
+time linear in their size, using little memory besides the result.
+"""
+import sys
+
+import numpy
+
+from g560.distance import adjacency_from_edges
+
+# The number of base vertices processed together
+DEFAULT_CHUNK_SIZE = 16384
+
+
+def _chunks(num_items, chunk_size):
+    for start in range(0, num_items, chunk_size):
+        yield start, min(start + chunk_size, num_items)
+
+
+def _check_base(base_adjacency):
+    base_adjacency = numpy.asarray(base_adjacency)
+    if base_adjacency.ndim != 2:
+        raise ValueError("The base adjacency array must have two dimensions, not {}".format(base_adjacency.ndim))
+    num_base_vertices = len(base_adjacency)
+    if ((base_adjacency < 0) | (base_adjacency >= num_base_vertices)).any():
+        raise ValueError("The base graph must be regular, without padding")
+    return base_adjacency
+
+
+def back_ports(base_adjacency, start=0, stop=None):
+    """Find the port at the far end of each edge of a base graph.
+
+    Args:
+        base_adjacency: An integer array of shape (n, d) of the neighbours of
+            each vertex of a d-regular simple graph, in port order.
+        start, stop: The range of base vertices for which ports are found.
+
+    Returns:
+        An integer array of shape (stop - start, d) in which element [u - start, j]
+        is the port i of v = base_adjacency[u, j] for which base_adjacency[v, i] == u.
+
+    Raises:
+        ValueError: If the far end of an edge does not lead back.
+    """
+    stop = len(base_adjacency) if stop is None else stop
+    vertices = numpy.arange(start, stop)
+    far = base_adjacency[base_adjacency[start:stop]]
+    matches = far == vertices[:, numpy.newaxis, numpy.newaxis]
+    if not matches.any(axis=2).all():
+        raise ValueError("The base adjacency array is not symmetric")
+    return matches.argmax(axis=2)
+
+
+def base_edges(base_adjacency):
+    """Each edge of a base graph once, with the ports of its ends.
+
+    Args:
+        base_adjacency: An integer array of shape (n, d), as for back_ports().
+
+    Returns:
+        A 4-tuple of integer arrays of the sources, out ports, targets and back
+        ports of the edges, where each edge leaves its lesser vertex by the
+        out port and enters its greater vertex by the back port. The edges
+        are ordered by source, then out port.
+    """
+    base_adjacency = _check_base(base_adjacency)
+    sources, out_ports = numpy.nonzero(base_adjacency > numpy.arange(len(base_adjacency))[:, numpy.newaxis])
+    targets = base_adjacency[sources, out_ports]
+    far = base_adjacency[targets] == sources[:, numpy.newaxis]
+    if not far.any(axis=1).all():
+        raise ValueError("The base adjacency array is not symmetric")
+    return sources, out_ports, targets, far.argmax(axis=1)
+
+
+def port_inverses(ports, degree):
+    """The gadget vertex attached to each port, for each permutation of the ports.
+
+    Args:
+        ports: An integer array of shape (k, d) of permutations, or None for
+            the identity.
+        degree: The degree d of the base graph.
+
+    Returns:
+        An integer array of shape (k, d) in which element [i, j] is the gadget
+        vertex attached to port j by permutation i.
+    """
+    if ports is None:
+        return numpy.arange(degree)[numpy.newaxis, :]
+    ports = numpy.asarray(ports, dtype=numpy.intp).reshape(-1, degree)
+    inverses = numpy.argsort(ports, axis=1)
+    if not (numpy.sort(ports, axis=1) == numpy.arange(degree)).all():
+        raise ValueError("Each row of ports must be a permutation of the {} ports".format(degree))
+    return inverses
+
+
+def _gadget_adjacency(gadget_edges, degree):
+    gadget_adjacency = adjacency_from_edges(degree, gadget_edges)
+    if len(gadget_adjacency) != degree:
+        raise ValueError("The gadget must have {} vertices".format(degree))
+    return gadget_adjacency
+
+
+def replacement_adjacency(base_adjacency, gadget_edges, ports=None, out=None, dtype=numpy.int32,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
+    """The adjacency array of the replacement product of a base graph with a gadget.
+
+    Args:
+        base_adjacency: An integer array of shape (n, d) of the neighbours of
+            each vertex of a d-regular simple graph, in port order.
+        gadget_edges: An integer array of shape (e, 2) of the edges of a
+            gadget on the vertices 0 to d - 1.
+        ports: An optional integer array of shape (k, d) of permutations
+            attaching gadget vertices to ports, as described for this module.
+        out: An optional array of shape (n * d, w) into which the adjacency
+            array is written, such as a numpy.memmap, where w is one more than
+            the greatest degree of the gadget.
+        dtype: The integer type of the array made when out is None.
+        chunk_size: The number of base vertices processed together.
+
+    Returns:
+        The adjacency array, in which the first columns hold the gadget
+        neighbours of each vertex, padded with n * d, and the last column its
+        neighbour along a base edge.
+    """
+    base_adjacency = _check_base(base_adjacency)
+    num_base_vertices, degree = base_adjacency.shape
+    num_vertices = num_base_vertices * degree
+    gadget_adjacency = _gadget_adjacency(gadget_edges, degree)
+    inverses = port_inverses(ports, degree)
+    num_permutations = len(inverses)
+
+    shape = (num_vertices, gadget_adjacency.shape[1] + 1)
+    if out is None:
+        out = numpy.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError("out has shape {}, not {}".format(out.shape, shape))
+
+    padding = gadget_adjacency == degree
+    for start, stop in _chunks(num_base_vertices, chunk_size):
+        vertices = numpy.arange(start, stop)
+        offsets = (vertices * degree)[:, numpy.newaxis, numpy.newaxis]
+        intra = numpy.where(padding, num_vertices, gadget_adjacency + offsets)
+        out[start * degree:stop * degree, :-1] = intra.reshape(-1, shape[1] - 1)
+        # The vertex at port j of u is joined to the vertex at the far port of v = base_adjacency[u, j]
+        targets = base_adjacency[start:stop]
+        near = vertices[:, numpy.newaxis] * degree + inverses[vertices % num_permutations]
+        far = targets * degree + inverses[targets % num_permutations, back_ports(base_adjacency, start, stop)]
+        out[near.ravel(), -1] = far.ravel()
+    return out
+
+
+def replacement_edges(base_adjacency, gadget_edges, ports=None, out=None, dtype=numpy.int32,
+                      chunk_size=DEFAULT_CHUNK_SIZE):
+    """The edges of the replacement product of a base graph with a gadget.
+
+    Args:
+        base_adjacency, gadget_edges, ports, dtype, chunk_size: As for replacement_adjacency().
+        out: An optional array of shape (n * e + n * d / 2, 2) into which the
+            edges are written, such as a numpy.memmap.
+
+    Returns:
+        An integer array of shape (m, 2) of the gadget edges of each cluster
+        in turn, followed by the base edges ordered as by base_edges(), each
+        with its lesser vertex first.
+    """
+    base_adjacency = _check_base(base_adjacency)
+    num_base_vertices, degree = base_adjacency.shape
+    gadget_edges = numpy.asarray(gadget_edges, dtype=numpy.intp).reshape(-1, 2)
+    _gadget_adjacency(gadget_edges, degree)
+    inverses = port_inverses(ports, degree)
+    num_permutations = len(inverses)
+
+    num_intra_edges = num_base_vertices * len(gadget_edges)
+    num_edges = num_intra_edges + num_base_vertices * degree // 2
+    if out is None:
+        out = numpy.empty((num_edges, 2), dtype=dtype)
+    elif out.shape != (num_edges, 2):
+        raise ValueError("out has shape {}, not {}".format(out.shape, (num_edges, 2)))
+
+    # The base edges leaving each base vertex towards greater vertices are numbered consecutively
+    is_out_edge = base_adjacency > numpy.arange(num_base_vertices)[:, numpy.newaxis]
+    first_edges = num_intra_edges + numpy.concatenate(([0], numpy.cumsum(is_out_edge.sum(axis=1))))
+
+    for start, stop in _chunks(num_base_vertices, chunk_size):
+        vertices = numpy.arange(start, stop)
+        offsets = (vertices * degree)[:, numpy.newaxis, numpy.newaxis]
+        out[start * len(gadget_edges):stop * len(gadget_edges)] = (gadget_edges + offsets).reshape(-1, 2)
+        rows, out_ports = numpy.nonzero(is_out_edge[start:stop])
+        sources = vertices[rows]
+        targets = base_adjacency[sources, out_ports]
+        far_ports = back_ports(base_adjacency, start, stop)[rows, out_ports]
+        block = out[first_edges[start]:first_edges[stop]]
+        block[:, 0] = sources * degree + inverses[sources % num_permutations, out_ports]
+        block[:, 1] = targets * degree + inverses[targets % num_permutations, far_ports]
+    return out
+
+
+def csr_from_adjacency(adjacency, dtype=numpy.int32):
+    """The compressed sparse row form of a padded adjacency array.
+
+    Returns:
+        A 2-tuple of an integer array of n + 1 offsets into, and an integer
+        array of, the neighbours of each vertex in turn.
+    """
+    present = adjacency < len(adjacency)
+    offsets = numpy.zeros(len(adjacency) + 1, dtype=numpy.int64)
+    numpy.cumsum(present.sum(axis=1), out=offsets[1:])
+    return offsets, adjacency[present].astype(dtype)
+
+
+def labelled_graph(edges, base_nodes, gadget_nodes):
+    """A replacement product as a networkx graph with "G-P" node labels.
+
+    Args:
+        edges: An integer array of shape (m, 2) of the edges of the product.
+        base_nodes: The labels of the base vertices, in order.
+        gadget_nodes: The labels of the gadget vertices, in order.
+
+    Returns:
+        A networkx Graph, in which the vertex with index u * d + P is labelled
+        "G-P", where G is the label of base vertex u and P of gadget vertex P.
+    """
+    from networkx import Graph
+    labels = ['{}-{}'.format(g_node, p_node) for g_node in base_nodes for p_node in gadget_nodes]
+    s = Graph()
+    s.add_nodes_from(labels)
+    s.add_edges_from((labels[u], labels[v]) for u, v in numpy.asarray(edges).tolist())
+    return s
+
+
+def circulant_adjacency(num_vertices, offsets):
+    """The adjacency array of a circulant graph, a regular base graph of any size.
+
+    Args:
+        num_vertices: The number of vertices.
+        offsets: Distinct positive offsets, each less than half of num_vertices.
+
+    Returns:
+        An integer array of shape (num_vertices, 2 * len(offsets)), in which
+        vertex u is adjacent to u + offset and u - offset for each offset.
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    steps = numpy.concatenate((offsets, -offsets))
+    return (numpy.arange(num_vertices)[:, numpy.newaxis] + steps) % num_vertices
+
+
+def main(argv=None):
+    """Check the builder against the g560 template, and time the product of a large base graph."""
+    import time
+
+    from g560 import petersen
+    from g560.gp_graph import DEFAULT_GEWIRTZ_SVG_FILEPATH, template_from_svg_file
+    from g560.population import Population
+
+    argv = sys.argv[1:] if argv is None else argv
+    num_base_vertices = int(argv[0]) if argv else 100000
+
+    template = template_from_svg_file(DEFAULT_GEWIRTZ_SVG_FILEPATH)
+    genome = Population.random(1, 8, 10, numpy.random.RandomState(0))[0]
+    adjacency = replacement_adjacency(template.base_adjacency, petersen.edges, genome)
+    assert numpy.array_equal(adjacency, template.adjacency(genome))
+    edges = replacement_edges(template.base_adjacency, petersen.edges, genome)
+    assert numpy.array_equal(edges, template.edges(genome))
+    print("Gewirtz x Petersen : matches GPTemplate")
+
+    base_adjacency = circulant_adjacency(num_base_vertices, [1, 2, 3, 5, 8])
+    ports = Population.random(8, 1, 10, numpy.random.RandomState(0)).genes.reshape(8, 10)
+    start = time.perf_counter()
+    adjacency = replacement_adjacency(base_adjacency, petersen.edges, ports)
+    adjacency_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    edges = replacement_edges(base_adjacency, petersen.edges, ports)
+    edges_seconds = time.perf_counter() - start
+    assert numpy.array_equal(numpy.sort(adjacency_from_edges(len(adjacency), edges), axis=1),
+                             numpy.sort(adjacency, axis=1))
+    print("Circulant({}) x Petersen : {} vertices, adjacency in {:.3f} s, {} edges in {:.3f} s".format(
+        num_base_vertices, len(adjacency), adjacency_seconds, len(edges), edges_seconds))
+
+
+if __name__ == '__main__':
+    main()
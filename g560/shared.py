@@ -0,0 +1,70 @@
+"""Immutable arrays shared by the processes of a worker pool through memory-mapped files.
+
+The parent process writes each array once, as a .npy file in a directory,
+and each worker maps the files read-only rather than rebuilding the arrays
+itself, so the pages are shared between all the processes, and a worker
+starts without parsing the embedding or rebuilding any graph. Where the
+system has a RAM-backed /dev/shm the directory is made there, so the files
+are never written to disk.
+
+    dirpath = share_arrays({'edges': edges})
+    try:
+        ...  # Workers call attach_arrays(dirpath)
+    finally:
+        release_arrays(dirpath)
+"""
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import numpy
+
+# The directory in which shared arrays are made, where it exists
+SHARED_MEMORY_DIRPATH = '/dev/shm'
+
+_SUFFIX = '.npy'
+
+
+def share_arrays(arrays, dirpath=None):
+    """Write arrays to files which can be mapped into memory by other processes.
+
+    Args:
+        arrays: A mapping of names, which must be valid file names, to arrays.
+        dirpath: An optional directory in which a new directory for the arrays
+            is made. Defaults to /dev/shm where it exists, and otherwise the
+            system temporary directory.
+
+    Returns:
+        The path of the directory holding the arrays, to be passed to
+        attach_arrays(), and finally to release_arrays().
+    """
+    if dirpath is None and os.path.isdir(SHARED_MEMORY_DIRPATH):
+        dirpath = SHARED_MEMORY_DIRPATH
+    shared_dirpath = tempfile.mkdtemp(prefix='g560-shared-', dir=dirpath)
+    try:
+        for name, array in arrays.items():
+            numpy.save(os.path.join(shared_dirpath, name + _SUFFIX), numpy.asarray(array), allow_pickle=False)
+    except BaseException:
+        release_arrays(shared_dirpath)
+        raise
+    return shared_dirpath
+
+
+def attach_arrays(dirpath):
+    """Map the arrays shared by share_arrays() into the memory of this process, read-only.
+
+    Returns:
+        An OrderedDict mapping the names of the arrays, in sorted order, to read-only arrays.
+    """
+    return OrderedDict(
+        (filename[:-len(_SUFFIX)], numpy.load(os.path.join(dirpath, filename), mmap_mode='r'))
+        for filename in sorted(os.listdir(dirpath)) if filename.endswith(_SUFFIX))
+
+
+def release_arrays(dirpath):
+    """Remove the arrays shared by share_arrays().
+
+    Processes which have already attached the arrays may continue to use them.
+    """
+    shutil.rmtree(dirpath, ignore_errors=True)
@@ -0,0 +1,199 @@
+"""Counting and enumerating the short cycles of a graph.
+
+The numbers of 3-, 4- and 5-cycles of a simple graph follow in closed form
+from the traces of powers of its adjacency matrix A, after discounting the
+closed walks which are not cycles (Harary and Manvel, 1971):
+
+    c3 = tr(A^3) / 6
+    c4 = (tr(A^4) - 2m - 4 sum_v C(d_v, 2)) / 8
+    c5 = (tr(A^5) - 5 tr(A^3) - 5 sum_v (d_v - 2) A^3_vv) / 10
+
+where m is the number of edges and d_v the degree of vertex v. The 4-cycles
+through each vertex and each edge follow similarly from the diagonal of A^4
+and from A^3.
+
+Cycles are enumerated in canonical order, each exactly once, as tuples of
+vertices starting from the least vertex of the cycle and continuing towards
+the lesser of its two neighbours on the cycle. All paths of a given length
+are extended together, a step at a time, so even cycles of the 560-vertex
+g560 graphs are enumerated with a few vectorized operations per step.
+
+Graphs are represented by adjacency arrays, as in g560.distance.
+"""
+import sys
+from collections import namedtuple
+
+import numpy
+
+
+ShortCycles = namedtuple('ShortCycles', ['length', 'cycles', 'vertex_counts', 'edge_counts'])
+ShortCycles.__doc__ = """The cycles of one length in a graph, and how many pass through each vertex and edge.
+
+    length: The number of vertices, and of edges, in each cycle.
+    cycles: An integer array of shape (c, length), each row of which is a
+        cycle in canonical order.
+    vertex_counts: An integer array of the number of cycles through each vertex.
+    edge_counts: An integer array with the shape of the adjacency array, where
+        element [u, j] is the number of cycles through the edge from u to
+        adjacency[u, j], or zero for padding.
+"""
+
+
+def matrix_powers(adjacency, max_power):
+    """The integer adjacency matrix of a graph, and its powers.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d), padded with the value n.
+        max_power: The greatest power required.
+
+    Returns:
+        A list of max_power + 1 integer arrays of shape (n, n), the k-th of which is A^k.
+    """
+    n = len(adjacency)
+    matrix = numpy.zeros((n, n + 1))
+    rows = numpy.repeat(numpy.arange(n), adjacency.shape[1])
+    numpy.add.at(matrix, (rows, adjacency.ravel()), 1.0)
+    matrix = numpy.ascontiguousarray(matrix[:, :n])
+    # Floating point products use BLAS, and are exact while the walk counts are below 2^53
+    powers = [numpy.identity(n), matrix]
+    for _ in range(2, max_power + 1):
+        powers.append(powers[-1].dot(matrix))
+    return [numpy.rint(power).astype(numpy.int64) for power in powers[:max_power + 1]]
+
+
+def cycle_counts(adjacency):
+    """Count the 3-, 4- and 5-cycles of a simple graph in closed form.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+
+    Returns:
+        A dictionary mapping each cycle length to the number of cycles of that length.
+    """
+    _, a, a2, a3, a4, a5 = matrix_powers(adjacency, 5)
+    degrees = a.sum(axis=1)
+    num_edges = degrees.sum() // 2
+    trace3 = int(numpy.trace(a3))
+    return {
+        3: trace3 // 6,
+        4: int(numpy.trace(a4) - 2 * num_edges - 2 * (degrees * (degrees - 1)).sum()) // 8,
+        5: int(numpy.trace(a5) - 5 * trace3 - 5 * ((degrees - 2) * numpy.diagonal(a3)).sum()) // 10,
+    }
+
+
+def four_cycle_participation(adjacency):
+    """Count the 4-cycles through each vertex and each edge of a simple graph in closed form.
+
+    A closed walk of length four from v which is not a 4-cycle either
+    retraces one edge, or goes out and back along two edges, so the 4-cycles
+    through v, each traversed in both directions, account for the remainder
+    of A^4_vv. Likewise a walk of length three from u to a neighbour v which
+    is not a path u-x-y-v closing a 4-cycle with the edge must revisit u or v.
+
+    Returns:
+        A 2-tuple of the vertex counts and edge counts, as in ShortCycles.
+    """
+    n = len(adjacency)
+    _, a, _, a3, a4 = matrix_powers(adjacency, 4)
+    degrees = a.sum(axis=1)
+    vertex_counts = (numpy.diagonal(a4) - degrees ** 2 - a.dot(degrees) + degrees) // 2
+    padded_a3 = numpy.column_stack((a3, numpy.zeros(n, dtype=a3.dtype)))
+    padded_degrees = numpy.append(degrees, 1)
+    rows = numpy.arange(n)[:, numpy.newaxis]
+    edge_counts = padded_a3[rows, adjacency] - (degrees[:, numpy.newaxis] + padded_degrees[adjacency] - 1)
+    edge_counts[adjacency == n] = 0
+    return vertex_counts, edge_counts
+
+
+def enumerate_cycles(adjacency, length):
+    """Enumerate the cycles of one length in a simple graph, each exactly once.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        length: The number of vertices in each cycle, at least three.
+
+    Returns:
+        An integer array of shape (c, length), each row of which is a cycle
+        (v0, v1, ..., v(length-1)) in which v0 is the least vertex and v1 < v(length-1),
+        with the rows in lexicographic order.
+    """
+    if length < 3:
+        raise ValueError("Cycles have at least three vertices, not {}".format(length))
+    n = len(adjacency)
+    # Paths from each start vertex through vertices greater than it
+    paths = numpy.arange(n)[:, numpy.newaxis]
+    for _ in range(length - 1):
+        neighbours = adjacency[paths[:, -1]]
+        valid = (neighbours < n) & (neighbours > paths[:, :1])
+        for column in range(paths.shape[1]):
+            valid &= neighbours != paths[:, column:column + 1]
+        path_indexes, neighbour_indexes = numpy.nonzero(valid)
+        paths = numpy.column_stack((paths[path_indexes], neighbours[path_indexes, neighbour_indexes]))
+    closing = (adjacency[paths[:, -1]] == paths[:, :1]).any(axis=1) & (paths[:, 1] < paths[:, -1])
+    cycles = paths[closing]
+    return cycles[numpy.lexsort(cycles.T[::-1])] if len(cycles) else cycles
+
+
+def short_cycles(adjacency, length):
+    """Enumerate the cycles of one length in a simple graph, and count those through each vertex and edge.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        length: The number of vertices in each cycle, at least three.
+
+    Returns:
+        A ShortCycles.
+    """
+    n = len(adjacency)
+    cycles = enumerate_cycles(adjacency, length)
+    vertex_counts = numpy.bincount(cycles.ravel(), minlength=n)
+    # Count each cycle edge in both directions, then find each directed edge's slot in the adjacency array
+    tails = cycles.ravel()
+    heads = numpy.roll(cycles, -1, axis=1).ravel()
+    tails, heads = numpy.concatenate((tails, heads)), numpy.concatenate((heads, tails))
+    arc_counts = numpy.bincount(tails * (n + 1) + heads, minlength=n * (n + 1))
+    slots = numpy.arange(n)[:, numpy.newaxis] * (n + 1) + adjacency
+    edge_counts = arc_counts[slots]
+    edge_counts[adjacency == n] = 0
+    return ShortCycles(length=length, cycles=cycles, vertex_counts=vertex_counts, edge_counts=edge_counts)
+
+
+def main(argv=None):
+    """Check the enumerated cycles against the closed forms, for Gewirtz and a g560 graph."""
+    import time
+
+    from g560 import gewirtz
+    from g560.gp_graph import DEFAULT_GEWIRTZ_SVG_FILEPATH, template_from_svg_file
+
+    argv = sys.argv[1:] if argv is None else argv
+    gewirtz_svg_filepath = argv[0] if argv else DEFAULT_GEWIRTZ_SVG_FILEPATH
+
+    genome = tuple(tuple(numpy.random.RandomState(0).permutation(10).tolist()) for _ in range(8))
+    graphs = (
+        ('Gewirtz', numpy.array(gewirtz.neighbours)),
+        ('g560', template_from_svg_file(gewirtz_svg_filepath).adjacency(genome)),
+    )
+    for name, adjacency in graphs:
+        start = time.perf_counter()
+        counts = cycle_counts(adjacency)
+        closed_form_time = time.perf_counter() - start
+        vertex_counts, edge_counts = four_cycle_participation(adjacency)
+        for length in range(3, 7):
+            start = time.perf_counter()
+            cycles = short_cycles(adjacency, length)
+            enumeration_time = time.perf_counter() - start
+            if length in counts:
+                assert len(cycles.cycles) == counts[length], (name, length, len(cycles.cycles), counts[length])
+            if length == 4:
+                assert numpy.array_equal(cycles.vertex_counts, vertex_counts), name
+                assert numpy.array_equal(cycles.edge_counts, edge_counts), name
+            assert cycles.vertex_counts.sum() == length * len(cycles.cycles)
+            print("{} : {} {}-cycles, enumerated in {:.4f}s".format(
+                name, len(cycles.cycles), length, enumeration_time))
+        print("{} : closed form counts {} in {:.4f}s".format(name, counts, closed_form_time))
+
+    assert cycle_counts(graphs[0][1])[4] == 630
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Adjacency spectra of graphs with a cyclic symmetry.
+
+If an automorphism of order k moves every vertex in an orbit of k vertices,
+numbering the vertices orbit by orbit makes the adjacency matrix block
+circulant: the block coupling the j-th vertices of the orbits to the
+j'-th depends only on j' - j (mod k). A discrete Fourier transform over the
+rotation then splits the matrix into k independent Hermitian blocks, each
+n/k square, whose eigenvalues together are the eigenvalues of the graph.
+Since the adjacency matrix is real, the blocks for frequencies t and k - t
+are complex conjugates with the same eigenvalues, so only about half of
+them need be solved. For a g560 graph with its 7-fold rotation this
+replaces one dense 560 x 560 eigendecomposition by four of 80 x 80.
+
+Graphs are represented by adjacency arrays, as in g560.distance.
+"""
+import sys
+import time
+
+import numpy
+
+from g560.distance import is_automorphism, orbits
+
+
+def adjacency_matrix(adjacency):
+    """The dense adjacency matrix of the graph with an adjacency array.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d), padded with the value n.
+
+    Returns:
+        A float array of shape (n, n).
+    """
+    n = len(adjacency)
+    matrix = numpy.zeros((n, n + 1))
+    rows = numpy.repeat(numpy.arange(n), adjacency.shape[1])
+    numpy.add.at(matrix, (rows, adjacency.ravel()), 1.0)
+    return matrix[:, :n]
+
+
+def circulant_blocks(adjacency, automorphism):
+    """The Fourier blocks of an adjacency matrix which is block circulant under an automorphism.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        automorphism: An integer array mapping each vertex to its image under
+            an automorphism of the graph, whose orbits all have the same size k.
+
+    Returns:
+        A complex array of shape (k, n / k, n / k), whose t-th element is the
+        Hermitian block for frequency t, or None if the orbits differ in size.
+    """
+    automorphism = numpy.asarray(automorphism, dtype=numpy.intp)
+    representatives, sizes = orbits(automorphism)
+    order = sizes[0]
+    if not numpy.all(sizes == order):
+        return None
+    n = len(adjacency)
+    num_orbits = len(representatives)
+    # Each vertex is the power-th image of the representative of its orbit
+    orbit_of = numpy.empty(n + 1, dtype=numpy.intp)
+    power_of = numpy.empty(n + 1, dtype=numpy.intp)
+    image = representatives
+    for power in range(order):
+        orbit_of[image] = numpy.arange(num_orbits)
+        power_of[image] = power
+        image = automorphism[image]
+    # Padding contributes to an extra orbit, which is discarded
+    orbit_of[n] = num_orbits
+    power_of[n] = 0
+    neighbours = adjacency[representatives]
+    offset_blocks = numpy.zeros((order, num_orbits, num_orbits + 1))
+    rows = numpy.repeat(numpy.arange(num_orbits), adjacency.shape[1])
+    numpy.add.at(offset_blocks, (power_of[neighbours].ravel(), rows, orbit_of[neighbours].ravel()), 1.0)
+    return numpy.fft.fft(offset_blocks[:, :, :num_orbits], axis=0)
+
+
+def eigenvalues(adjacency, automorphism=None):
+    """All the eigenvalues of the adjacency matrix of a graph, in ascending order.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        automorphism: An optional integer array mapping each vertex to its
+            image under a suspected automorphism of the graph. If it is an
+            automorphism whose orbits all have the same size, the matrix is
+            block-diagonalized over it, otherwise the full matrix is solved.
+
+    Returns:
+        A float array of the n eigenvalues, repeated according to their multiplicities.
+    """
+    blocks = None
+    if automorphism is not None and is_automorphism(adjacency, automorphism):
+        blocks = circulant_blocks(adjacency, automorphism)
+    if blocks is None:
+        return numpy.linalg.eigvalsh(adjacency_matrix(adjacency))
+    order = len(blocks)
+    # Frequencies t and order - t have the same eigenvalues
+    frequencies = numpy.arange(order // 2 + 1)
+    counts = numpy.where((frequencies == 0) | (2 * frequencies == order), 1, 2)
+    values = numpy.linalg.eigvalsh(blocks[frequencies])
+    return numpy.sort(numpy.repeat(values, counts, axis=0).ravel())
+
+
+def multiplicities(values, tolerance=1e-8):
+    """Group sorted eigenvalues which agree within a tolerance.
+
+    Returns:
+        A list of (eigenvalue, multiplicity) pairs in ascending order of
+        eigenvalue, each eigenvalue being the mean of its group.
+    """
+    values = numpy.asarray(values)
+    if len(values) == 0:
+        return []
+    starts = numpy.flatnonzero(numpy.diff(values) > tolerance) + 1
+    groups = numpy.split(values, starts)
+    return [(float(group.mean()), len(group)) for group in groups]
+
+
+def spectrum(adjacency, automorphism=None, tolerance=1e-8):
+    """The adjacency spectrum of a graph, as eigenvalues with their multiplicities.
+
+    Args:
+        adjacency: An adjacency array of shape (n, d).
+        automorphism: An optional automorphism over which to block-diagonalize.
+            See eigenvalues().
+        tolerance: The greatest difference between eigenvalues counted as equal.
+
+    Returns:
+        A list of (eigenvalue, multiplicity) pairs in ascending order of eigenvalue.
+    """
+    return multiplicities(eigenvalues(adjacency, automorphism), tolerance)
+
+
+def main(argv=None):
+    """Cross-check the symmetric spectrum against the dense one on random g560 graphs."""
+    import random
+
+    from g560.gp_graph import DEFAULT_GEWIRTZ_SVG_FILEPATH, template_from_svg_file
+
+    argv = sys.argv[1:] if argv is None else argv
+    gewirtz_svg_filepath = argv[0] if argv else DEFAULT_GEWIRTZ_SVG_FILEPATH
+    num_trials = int(argv[1]) if len(argv) > 1 else 3
+
+    template = template_from_svg_file(gewirtz_svg_filepath)
+    random.seed(0)
+    for _ in range(num_trials):
+        genome = tuple(tuple(random.sample(range(10), 10)) for _ in range(8))
+        adjacency = template.adjacency(genome)
+
+        start = time.perf_counter()
+        expected = eigenvalues(adjacency)
+        dense_time = time.perf_counter() - start
+
+        rotation = template.rotation(len(genome))
+        start = time.perf_counter()
+        actual = eigenvalues(adjacency, rotation)
+        symmetric_time = time.perf_counter() - start
+
+        assert numpy.allclose(actual, expected, atol=1e-9), numpy.abs(actual - expected).max()
+        print("{} distinct eigenvalues, largest {:.6f}: dense {:.4f}s symmetric {:.4f}s ({:.0f}x)".format(
+            len(multiplicities(actual, 1e-6)), actual[-1], dense_time, symmetric_time,
+            dense_time / symmetric_time))
+
+
+if __name__ == '__main__':
+    main()
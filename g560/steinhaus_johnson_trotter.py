@@ -1,3 +1,10 @@
+from collections.abc import Sequence
+from functools import lru_cache
+from math import factorial
+
+import numpy
+
+
 def permutations(seq):
     """Generate Steinhaus Johnson Trotter permutations.
 
@@ -21,3 +28,209 @@ def permutations(seq):
             else:
                 yield from (item[:j] + seq[-1:] + item[j:]
                             for j in range(len(item), -1, -1))
+
+
+def transpositions(size, start=0):
+    """Generate the swaps which step through the Steinhaus Johnson Trotter permutations.
+
+    Starting from the permutation unrank(start, size), swapping the items at
+    positions i and i + 1 for each i yielded in turn visits every subsequent
+    permutation in the same order as permutations(tuple(range(size))). The
+    generator is iterative, and takes constant amortized time per swap.
+
+    Args:
+        size: The number of items permuted.
+        start: The index of the permutation from which to begin.
+
+    Yields:
+        size! - 1 - start integers, each the lesser of the two adjacent positions
+        to be swapped.
+    """
+    items = list(unrank(start, size))
+    positions = [0] * size
+    for position, item in enumerate(items):
+        positions[item] = position
+    # The number of moves each item has made in its current sweep, and the
+    # direction of the sweep, are the digits of start and the parity of the
+    # index of the permutation of the smaller items.
+    directions = [+1] * size
+    moves = [0] * size
+    index = start
+    for item in range(size - 1, -1, -1):
+        index, moves[item] = divmod(index, item + 1)
+        directions[item] = +1 if index % 2 == 0 else -1
+    while True:
+        # The largest item which has not yet completed its sweep is the one to move.
+        # Larger items, having completed theirs, turn around ready for the next.
+        item = size - 1
+        while item > 0 and moves[item] == item:
+            moves[item] = 0
+            directions[item] = -directions[item]
+            item -= 1
+        if item <= 0:
+            return
+        moves[item] += 1
+        position = positions[item]
+        other_position = position + directions[item]
+        other_item = items[other_position]
+        items[position], items[other_position] = other_item, item
+        positions[item], positions[other_item] = other_position, position
+        yield min(position, other_position)
+
+
+def rank(permutation):
+    """The index of a permutation of range(n) in Steinhaus Johnson Trotter order.
+
+    This is the order in which permutations(tuple(range(n))) generates them.
+
+    Args:
+        permutation: A sequence containing each of the integers 0 to n - 1 once.
+
+    Returns:
+        An integer in the range 0 to n! - 1.
+    """
+    items = list(permutation)
+    # Remove the largest remaining item repeatedly, recording where it was
+    positions = []
+    for largest in range(len(items) - 1, -1, -1):
+        position = items.index(largest)
+        del items[position]
+        positions.append(position)
+    # Each item was swept left-to-right when the rank of the permutation of the
+    # smaller items was even, and right-to-left when it was odd
+    index = 0
+    for size, position in enumerate(reversed(positions), start=1):
+        offset = position if index % 2 == 0 else size - 1 - position
+        index = index * size + offset
+    return index
+
+
+def unrank(index, size):
+    """The permutation of range(size) at an index in Steinhaus Johnson Trotter order.
+
+    The inverse of rank().
+
+    Args:
+        index: An integer in the range 0 to size! - 1.
+        size: The number of items permuted.
+
+    Returns:
+        A tuple containing each of the integers 0 to size - 1 once.
+    """
+    offsets = []
+    for radix in range(size, 0, -1):
+        index, offset = divmod(index, radix)
+        offsets.append(offset)
+    items = []
+    index = 0
+    for item, offset in enumerate(reversed(offsets)):
+        position = offset if index % 2 == 0 else item - offset
+        items.insert(position, item)
+        index = index * (item + 1) + offset
+    return tuple(items)
+
+
+def unrank_many(indexes, size):
+    """The permutations of range(size) at many indexes in Steinhaus Johnson Trotter order.
+
+    A vectorized equivalent of unrank().
+
+    Args:
+        indexes: An integer array of indexes in the range 0 to size! - 1. At most 20! - 1,
+            so that they can be held in 64 bits.
+        size: The number of items permuted.
+
+    Returns:
+        A numpy array of shape (len(indexes), size) and type uint8, where row i is
+        unrank(indexes[i], size).
+    """
+    indexes = numpy.asarray(indexes, dtype=numpy.int64).reshape(-1)
+    # The permutations of the smallest items are looked up in a table, and the
+    # remaining items inserted into them one at a time
+    table_size = min(size, _TABLE_SIZE)
+    offsets = numpy.empty((len(indexes), size), dtype=numpy.int64)
+    index = indexes.copy()
+    for item in range(size - 1, table_size - 1, -1):
+        index, offsets[:, item] = numpy.divmod(index, item + 1)
+    items = _small_permutation_table(table_size)[index]
+    padding = numpy.zeros((len(indexes), 1), dtype=numpy.uint8)
+    for item in range(table_size, size):
+        offset = offsets[:, item]
+        position = numpy.where(index % 2 == 0, offset, item - offset)[:, None]
+        columns = numpy.arange(item + 1)
+        # Each row of the smaller permutations with item inserted at its position
+        before = numpy.concatenate((items, padding), axis=1)
+        after = numpy.concatenate((padding, items), axis=1)
+        items = numpy.where(columns < position, before, numpy.where(columns == position, numpy.uint8(item), after))
+        index = index * (item + 1) + offset
+    return items
+
+
+# The number of items in the largest permutations unrank_many() looks up
+_TABLE_SIZE = 7
+
+
+@lru_cache()
+def _small_permutation_table(size):
+    return permutation_table(size)
+
+
+class PermutationSequence(Sequence):
+    """A read-only sequence of all permutations of range(size) in Steinhaus Johnson Trotter order.
+
+    Equivalent to list(permutations(tuple(range(size)))), but elements are
+    computed on demand by unrank() rather than stored.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._length = factorial(size)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not (0 <= index < self._length):
+            raise IndexError("PermutationSequence index out of range")
+        return unrank(index, self.size)
+
+    def index(self, permutation, start=0, stop=None):
+        i = rank(permutation)
+        if not (start <= i < (self._length if stop is None else stop)):
+            raise ValueError("{!r} is not in range".format(permutation))
+        return i
+
+    def __contains__(self, permutation):
+        return sorted(permutation) == list(range(self.size))
+
+
+def permutation_table(size):
+    """All permutations of range(size) in Steinhaus Johnson Trotter order, as an array.
+
+    Args:
+        size: The number of items permuted. At most 255.
+
+    Returns:
+        A numpy array of shape (size!, size) and type uint8, where row i is unrank(i, size).
+    """
+    table = numpy.zeros((1, 0), dtype=numpy.uint8)
+    for item in range(size):
+        # Insert item into each of the permutations of the smaller items, sweeping
+        # it left-to-right for even ranks and right-to-left for odd ranks
+        width = item + 1
+        ranks = numpy.arange(len(table))
+        extended = numpy.empty((len(table) * width, width), dtype=numpy.uint8)
+        for parity in (0, 1):
+            parity_ranks = ranks[ranks % 2 == parity]
+            for offset in range(width):
+                position = offset if parity == 0 else item - offset
+                rows = parity_ranks * width + offset
+                extended[rows, :position] = table[parity_ranks, :position]
+                extended[rows, position] = item
+                extended[rows, position + 1:] = table[parity_ranks, position:]
+        table = extended
+    return table
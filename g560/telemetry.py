@@ -0,0 +1,201 @@
+"""Structured telemetry for long-running searches.
+
+A Telemetry object accumulates the wall time spent in each phase of a
+generation. At the end of each generation it emits a record of those times,
+together with any statistics the search supplies, as one line of JSON to a
+sink, which may be a file, standard output, or a TCP or Unix domain socket.
+Optionally one chosen generation is run under cProfile or tracemalloc, and the profile saved to a
+file, so the hot spots of a long run can be examined without profiling all of
+it.
+"""
+import cProfile
+import json
+import os
+import socket
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+PROFILERS = ('cprofile', 'tracemalloc')
+
+
+def peak_rss_bytes():
+    """The peak resident set size of this process in bytes, or None if it is unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def parse_socket_address(target):
+    """Parse a socket address of the form 'tcp://host:port' or 'unix://path'.
+
+    Returns:
+        A 2-tuple of the socket address family and the address, or None if
+        target is not a socket address.
+    """
+    if target.startswith('tcp://'):
+        host, _, port = target[len('tcp://'):].rpartition(':')
+        return socket.AF_INET, (host, int(port))
+    if target.startswith('unix://'):
+        return socket.AF_UNIX, target[len('unix://'):]
+    return None
+
+
+def connect(target):
+    """Open a stream socket connected to an address accepted by parse_socket_address()."""
+    family, address = parse_socket_address(target)
+    if family == socket.AF_INET:
+        return socket.create_connection(address)
+    connection = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        connection.connect(address)
+    except OSError:
+        connection.close()
+        raise
+    return connection
+
+
+def open_sink(target):
+    """Open a text stream to which telemetry records are written.
+
+    Args:
+        target: '-' for standard output, 'tcp://host:port' or 'unix://path'
+            for a socket, or otherwise the path of a file to be appended to.
+
+    Returns:
+        A writable text stream. Closing it does not close standard output.
+    """
+    if target == '-':
+        return _Unclosable(sys.stdout)
+    if parse_socket_address(target) is not None:
+        return connect(target).makefile('w', encoding='utf-8')
+    return open(target, 'a', encoding='utf-8')
+
+
+class _Unclosable:
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        return self._stream.write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+class Telemetry:
+    """Per-generation timings and counts, emitted as JSON lines."""
+
+    def __init__(self, sink=None, profile_generation=None, profiler='cprofile', profile_filepath=None):
+        """
+        Args:
+            sink: An optional writable text stream, such as the result of
+                open_sink(), to which a record is written for each generation.
+            profile_generation: The number of an optional generation to profile.
+            profiler: 'cprofile' to profile the time spent in each function,
+                or 'tracemalloc' to profile memory allocations.
+            profile_filepath: The file in which the profile is saved. Defaults
+                to generation-N.prof for cProfile or generation-N.txt for tracemalloc.
+        """
+        if profiler not in PROFILERS:
+            raise ValueError("profiler {!r} is not one of {}".format(profiler, ', '.join(PROFILERS)))
+        self.sink = sink
+        self.profile_generation = profile_generation
+        self.profiler = profiler
+        self.profile_filepath = profile_filepath
+        self.generation = None
+        self._phases = OrderedDict()
+        self._start = None
+        self._profile = None
+
+    def start_generation(self, generation):
+        """Begin recording a generation, starting the profiler if it is the chosen one."""
+        self.generation = generation
+        self._phases = OrderedDict()
+        if generation == self.profile_generation:
+            if self.profiler == 'cprofile':
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            else:
+                tracemalloc.start()
+                self._profile = tracemalloc
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """A context manager adding the wall time spent within it to the named phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    def phase_seconds(self, *names):
+        """The total time recorded so far in this generation in the named phases."""
+        return sum(self._phases.get(name, 0.0) for name in names)
+
+    def end_generation(self, **fields):
+        """Finish recording a generation, and emit its record.
+
+        Args:
+            **fields: Further items to include in the record.
+
+        Returns:
+            The record, as a dictionary.
+        """
+        wall_seconds = time.perf_counter() - self._start
+        record = OrderedDict()
+        record['generation'] = self.generation
+        record['time'] = time.time()
+        record['wall_seconds'] = wall_seconds
+        record['phases'] = OrderedDict((name, seconds) for name, seconds in self._phases.items())
+        record.update(fields)
+        record['peak_rss_bytes'] = peak_rss_bytes()
+        if self._profile is not None:
+            record['profile'] = self._save_profile()
+        if self.sink is not None:
+            self.sink.write(json.dumps(record) + '\n')
+            self.sink.flush()
+        return record
+
+    def _save_profile(self):
+        extension = '.prof' if self.profiler == 'cprofile' else '.txt'
+        filepath = self.profile_filepath or 'generation-{}{}'.format(self.generation, extension)
+        if self.profiler == 'cprofile':
+            self._profile.disable()
+            self._profile.dump_stats(filepath)
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(filepath, 'w') as profile_file:
+                print("Traced memory: current {} bytes, peak {} bytes".format(current, peak), file=profile_file)
+                for statistic in snapshot.statistics('lineno')[:50]:
+                    print(statistic, file=profile_file)
+        self._profile = None
+        return os.path.abspath(filepath)
+
+    def close(self):
+        if self._profile is not None and self.profiler == 'cprofile':
+            self._profile.disable()
+        elif self._profile is not None:
+            tracemalloc.stop()
+        self._profile = None
+        if self.sink is not None:
+            self.sink.close()
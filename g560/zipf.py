@@ -1,9 +1,34 @@
-from numpy import arange
-from scipy.stats import rv_discrete
+from numpy import arange, cumsum, searchsorted
 
 
-def zipf(n, a):
+def zipf(n, a, seed=None):
+    from scipy.stats import rv_discrete
     x = arange(1, n+1)
     weights = x ** (-a)
     weights /= weights.sum()
-    return rv_discrete(name='bounded_zipf', values=(x - 1, weights))
+    return rv_discrete(name='bounded_zipf', values=(x - 1, weights), seed=seed)
+
+
+class BoundedZipf:
+    """The distribution of zipf(), sampled in bulk by inverting its cumulative distribution.
+
+    The cumulative distribution is computed once, so drawing any number of
+    samples is a single vectorized search, without the per-call overhead of
+    scipy.stats.rv_discrete.
+    """
+
+    def __init__(self, n, a):
+        """
+        Args:
+            n: The number of values, 0 to n - 1, in the support.
+            a: The exponent of the distribution.
+        """
+        x = arange(1, n+1)
+        weights = x ** (-a)
+        weights /= weights.sum()
+        self.cdf = cumsum(weights)
+        self.cdf[-1] = 1.0
+
+    def rvs(self, size, random_state):
+        """Draw size samples using a numpy.random.RandomState."""
+        return searchsorted(self.cdf, random_state.random_sample(size), side='right')
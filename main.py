@@ -1,10 +1,9 @@
 import code
 import sys
-from collections import Counter
 
-from networkx import diameter, radius, eccentricity, adjacency_spectrum, average_shortest_path_length, adjacency_matrix
-
-from g560 import make, make_symmetrical
+from g560.distance import adjacency_array, adjacency_picture, distance_report
+from g560.gp_graph import make, make_symmetrical, find_cluster_rotation
+from g560.spectrum import spectrum
 
 
 def main():
@@ -13,27 +12,41 @@ def main():
     # g560 = make_symmetrical("/Users/rjs/dev/g560/embeddings/Gewirtz_graph_embeddings_4.svg")
     # print("g560 (a.k.a GP-graph)")
     g560 = make()
+
+    # Order the "G-P" nodes by cluster so any rotation of the clusters which
+    # is an automorphism can be found, and used to search from fewer sources
+    nodes = sorted(g560.nodes, key=lambda node: tuple(map(int, node.split('-'))))
+    _, adjacency = adjacency_array(g560, nodes)
+    rotation = find_cluster_rotation(adjacency, num_clusters=56, cluster_size=10)
+    report = distance_report(adjacency, rotation)
+
     print("=====================")
     print()
     print("Number of nodes :", len(g560))
     print("Number of edges :", len(g560.edges))
-    print("Diameter        :", diameter(g560))
-    print("Radius          :", radius(g560))
-    print("Average shortest path length :", average_shortest_path_length(g560))
+    print("Diameter        :", report.diameter)
+    print("Radius          :", report.radius)
+    print("Average shortest path length :", report.aspl)
 
     #code.interact(local=locals())
 
-    eccentricities = Counter(eccentricity(g560).values())
-
     print("Eccentricities")
-    for e in sorted(eccentricities):
-        print("  {} for {} nodes".format(e, eccentricities[e]))
+    for e, count in enumerate(report.eccentricity_histogram):
+        if count:
+            print("  {} for {} nodes".format(e, count))
+
+    print("Distances")
+    for k, count in enumerate(report.histogram):
+        print("  {} for {} ordered pairs".format(k, count))
 
-    print("Adjacency spectrum :", adjacency_spectrum(g560))
+    print("Closeness       : min {:.6f} max {:.6f}".format(report.closeness.min(), report.closeness.max()))
 
-    text_matrix = '\n'.join(''.join(" X"[g560.has_edge(u, v)] for v in g560.nodes) for u in g560.nodes)
+    # The cluster rotation also block-diagonalizes the adjacency matrix
+    print("Adjacency spectrum")
+    for eigenvalue, multiplicity in reversed(spectrum(adjacency, rotation, tolerance=1e-6)):
+        print("  {:+.6f} with multiplicity {}".format(eigenvalue, multiplicity))
 
-    print(text_matrix)
+    print(adjacency_picture(adjacency))
 
     return 0
 
@@ -1,70 +1,424 @@
+"""Exhaustively search for the best attachment of a Petersen graph to one Gewirtz vertex.
+
+For one representative vertex of each symmetry orbit of the Gewirtz graph, the
+vertex is replaced by a Petersen graph, and every one of the 10! ways of
+attaching the ten Petersen vertices to the ten Gewirtz neighbours is evaluated
+by the average shortest path length of the resulting 65 vertex graph.
+
+The permutations for each vertex are divided into shards by their leading
+elements, and the shards are searched by a pool of worker processes. Within a
+shard the permutations of the remaining elements are visited in
+Steinhaus-Johnson-Trotter order, by applying the stream of adjacent swaps
+from steinhaus_johnson_trotter.transpositions() to a single working graph,
+so that each permutation's graph is made from the last by exchanging the
+Gewirtz neighbours of two adjacent Petersen vertices, changing only two
+edges. The graphs are collected into batches, each evaluated with one
+batched search, and a position in the shard is simply an index into the
+order. Each shard periodically checkpoints its position and the best
+permutations found so far, so an interrupted search resumes where it
+stopped. Checkpoints are
+named by, and record, a digest of the embedding, so searches of different
+embeddings may share a checkpoint directory.
+
+The node problems are made once by the parent process and shared with the
+workers through memory-mapped files, so the workers do not rebuild the
+graphs, and the swap stream needs no table of the permutations.
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+from collections import OrderedDict
+from functools import lru_cache
 from itertools import permutations
+from math import factorial
+from multiprocessing import Pool
 
-from networkx import Graph, union, average_shortest_path_length
+import numpy
 
 from g560 import petersen
 from g560.analyze_symmetry import extract_symmetry_from_vertex_and_edge_lists
+from g560.checkpoint import write_json_atomically
+from g560.distance import SearchBuffers, batched_average_shortest_path_lengths
+from g560.fitness_store import embedding_digest
+from g560.gp_graph import DEFAULT_GEWIRTZ_SVG_FILEPATH
 from g560.read_svg_embedding import vertex_and_edge_lists_from_svg_file, graph_from_vertex_and_edge_lists
+from g560.shared import attach_arrays, release_arrays, share_arrays
+from g560.steinhaus_johnson_trotter import transpositions, unrank
 
+# Identifies the order in which checkpointed shard positions are counted
+ENUMERATION = 'steinhaus-johnson-trotter'
 
-def find_optimal_permutations_for_node(gewirtz_svg_filepath, p=None):
-    g_vertex_list, g_edge_list = vertex_and_edge_lists_from_svg_file(gewirtz_svg_filepath)
 
-    g = graph_from_vertex_and_edge_lists(g_vertex_list, g_edge_list)
-    p = p or petersen.make()
+class NodeProblem:
+    """The graph formed by replacing one Gewirtz vertex with a Petersen graph.
 
-    sources_to_offsets = extract_symmetry_from_vertex_and_edge_lists(g_vertex_list, g_edge_list)
+    The remaining Gewirtz vertices have indexes 0 to 54 in ascending order of
+    their labels, and the Petersen vertices 55 to 64 in the order of p.nodes.
+    """
+
+    def __init__(self, g_vertex_list, g_edge_list, g_node, targets, p=None):
+        """
+        Args:
+            g_vertex_list: A sequence of integer Gewirtz vertex labels.
+            g_edge_list: A sequence of 2-tuples representing the Gewirtz edges.
+            g_node: The Gewirtz vertex to be replaced.
+            targets: The neighbours of g_node, in the order in which they are
+                to be permuted.
+            p: An optional Peterson graph. If not supplied the default Peterson graph will be used.
+        """
+        g = graph_from_vertex_and_edge_lists(g_vertex_list, g_edge_list)
+        p = p or petersen.make()
+
+        self.g_node = g_node
+        self.targets = list(targets)
+
+        g_nodes = sorted(node for node in g.nodes if node != g_node)
+        index = {node: i for i, node in enumerate(g_nodes)}
+        index.update({('p', p_node): len(g_nodes) + i for i, p_node in enumerate(p.nodes)})
+        self.num_vertices = len(index)
+        self.petersen_indexes = numpy.array([index['p', p_node] for p_node in p.nodes], dtype=numpy.intp)
+        self.target_indexes = numpy.array([index[target] for target in self.targets], dtype=numpy.intp)
+
+        degree = max(d for _, d in g.degree)
+        adjacency = numpy.full((self.num_vertices, degree), self.num_vertices, dtype=numpy.intp)
+        # The column of each target's row which will hold its Petersen neighbour
+        self.target_columns = numpy.empty(len(self.targets), dtype=numpy.intp)
+        for node in g_nodes:
+            neighbours = [index[neighbour] for neighbour in g.neighbors(node) if neighbour != g_node]
+            adjacency[index[node], :len(neighbours)] = neighbours
+            if node in self.targets:
+                self.target_columns[self.targets.index(node)] = len(neighbours)
+        for p_node in p.nodes:
+            neighbours = [index['p', neighbour] for neighbour in p.neighbors(p_node)]
+            adjacency[index['p', p_node], :len(neighbours)] = neighbours
+        self.petersen_column = p.degree(next(iter(p.nodes)))
+        self.adjacency = adjacency
+
+    def arrays(self):
+        """The arrays from which from_arrays() remakes the problem, such as in another process.
+
+        Returns:
+            An OrderedDict mapping names to arrays.
+        """
+        return OrderedDict([
+            ('g_node', numpy.array(self.g_node)),
+            ('targets', numpy.array(self.targets)),
+            ('petersen_indexes', self.petersen_indexes),
+            ('target_indexes', self.target_indexes),
+            ('target_columns', self.target_columns),
+            ('petersen_column', numpy.array(self.petersen_column)),
+            ('adjacency', self.adjacency),
+        ])
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Remake a problem from the arrays of another, without building any graph.
+
+        Args:
+            arrays: A mapping like that returned by arrays(), whose arrays are
+                used without being copied.
+        """
+        problem = cls.__new__(cls)
+        problem.g_node = int(arrays['g_node'])
+        problem.targets = arrays['targets'].tolist()
+        problem.petersen_indexes = arrays['petersen_indexes']
+        problem.target_indexes = arrays['target_indexes']
+        problem.target_columns = arrays['target_columns']
+        problem.petersen_column = int(arrays['petersen_column'])
+        problem.adjacency = arrays['adjacency']
+        problem.num_vertices = len(problem.adjacency)
+        return problem
+
+    def batched_adjacency(self, orders):
+        """The adjacency array of the disjoint union of the graphs for many permutations.
+
+        Args:
+            orders: An integer array of shape (B, 10) where orders[b, i] is the
+                index into targets of the Gewirtz vertex attached to Petersen
+                vertex i in the b-th graph.
+
+        Returns:
+            An adjacency array of shape (B * num_vertices, degree).
+        """
+        num_graphs = len(orders)
+        n = self.num_vertices
+        offsets = (numpy.arange(num_graphs) * n)[:, None, None]
+        batched = numpy.where(self.adjacency == n, num_graphs * n, self.adjacency + offsets)
+        graphs = numpy.arange(num_graphs)[:, None]
+        attached_targets = self.target_indexes[orders]
+        batched[graphs, self.petersen_indexes, self.petersen_column] = graphs * n + attached_targets
+        batched[graphs, attached_targets, self.target_columns[orders]] = graphs * n + self.petersen_indexes
+        return batched.reshape(num_graphs * n, -1)
+
+    def adjacency_of(self, order):
+        """The adjacency array of the graph for one permutation, as a new array of shape (num_vertices, degree)."""
+        return self.batched_adjacency(numpy.asarray(order, dtype=numpy.intp).reshape(1, -1))
+
+    def swap_attachments(self, adjacency, order, position):
+        """Exchange the Gewirtz vertices attached to two adjacent Petersen vertices, in place.
+
+        Only the two edges between the Petersen vertices and their Gewirtz
+        neighbours change, so this takes constant time.
+
+        Args:
+            adjacency: The adjacency array of the graph for order, as made by adjacency_of().
+            order: A list of the indexes into targets attached to each Petersen vertex.
+            position: The lesser of the positions in order to be swapped.
+        """
+        first, second = order[position], order[position + 1]
+        first_petersen = self.petersen_indexes[position]
+        second_petersen = self.petersen_indexes[position + 1]
+        first_target, second_target = self.target_indexes[first], self.target_indexes[second]
+        adjacency[first_petersen, self.petersen_column] = second_target
+        adjacency[second_petersen, self.petersen_column] = first_target
+        adjacency[first_target, self.target_columns[first]] = second_petersen
+        adjacency[second_target, self.target_columns[second]] = first_petersen
+        order[position], order[position + 1] = second, first
+
+    def disjoint_union(self, adjacencies):
+        """The adjacency array of the disjoint union of several graphs on the vertices of this problem.
+
+        Args:
+            adjacencies: An integer array of shape (B, num_vertices, degree) of
+                the adjacency arrays of B graphs, as made by adjacency_of().
 
+        Returns:
+            An adjacency array of shape (B * num_vertices, degree).
+        """
+        num_graphs = len(adjacencies)
+        n = self.num_vertices
+        offsets = (numpy.arange(num_graphs) * n)[:, None, None]
+        return numpy.where(adjacencies == n, num_graphs * n, adjacencies + offsets).reshape(num_graphs * n, -1)
+
+    def average_shortest_path_lengths(self, orders, buffers=None):
+        """The average shortest path lengths of the graphs for many permutations.
+
+        Args:
+            orders: An integer array of shape (B, 10), as for batched_adjacency().
+            buffers: An optional SearchBuffers holding the working arrays of the search.
+        """
+        orders = numpy.asarray(orders, dtype=numpy.intp).reshape(-1, len(self.targets))
+        return batched_average_shortest_path_lengths(self.batched_adjacency(orders), len(orders), buffers)
+
+
+@lru_cache()
+def node_problems(gewirtz_svg_filepath, p=None):
+    """Make a NodeProblem for one representative of each symmetry orbit of the Gewirtz vertices."""
+    g_vertex_list, g_edge_list = vertex_and_edge_lists_from_svg_file(gewirtz_svg_filepath)
+    sources_to_offsets = extract_symmetry_from_vertex_and_edge_lists(g_vertex_list, g_edge_list)
+    problems = []
     for sources, offsets in sources_to_offsets:
-        s = Graph()
         g_node = sources[0]  # We only need the first - the others are the same, by symmetry
+        targets = [(g_node + offset) % len(g_vertex_list) for offset in offsets]
+        problems.append(NodeProblem(g_vertex_list, g_edge_list, g_node, targets, p))
+    return tuple(problems)
+
+
+def _shared_arrays(problems):
+    """The arrays of the node problems, for sharing."""
+    arrays = OrderedDict()
+    for problem_index, problem in enumerate(problems):
+        for name, array in problem.arrays().items():
+            arrays['problem-{}-{}'.format(problem_index, name)] = array
+    return arrays
+
+
+# The node problems attached from the parent, and the search buffers reused
+# by every batch, in a worker process
+_worker_problems = None
+_worker_buffers = None
+
+
+def _initialize_worker(shared_dirpath=None):
+    global _worker_problems, _worker_buffers
+    if shared_dirpath is not None:
+        arrays = attach_arrays(shared_dirpath)
+        problem_arrays = {}
+        for name, array in arrays.items():
+            _, index, field = name.split('-', 2)
+            problem_arrays.setdefault(int(index), {})[field] = array
+        _worker_problems = tuple(NodeProblem.from_arrays(problem_arrays[index]) for index in sorted(problem_arrays))
+    _worker_buffers = SearchBuffers()
+
+
+def _checkpoint_filepath(checkpoint_dirpath, digest, g_node, prefix):
+    return os.path.join(checkpoint_dirpath, 'shard-{}-{}-{}.json'.format(
+        digest[:16], g_node, '-'.join(map(str, prefix))))
+
+
+def search_shard(gewirtz_svg_filepath, problem_index, prefix, checkpoint_dirpath,
+                 top_k=10, batch_size=1024, checkpoint_interval=65536):
+    """Evaluate every permutation in one shard, checkpointing progress periodically.
+
+    Args:
+        gewirtz_svg_filepath: An SVG file containing a symmetrical embedding of the Gewirtz graph.
+        problem_index: The index of the NodeProblem into the result of node_problems().
+        prefix: The leading elements of the permutations in this shard.
+        checkpoint_dirpath: The directory in which the checkpoint for this shard is kept.
+        top_k: The number of best permutations to retain.
+        batch_size: The number of permutations evaluated together.
+        checkpoint_interval: The approximate number of permutations between checkpoints.
+
+    Returns:
+        A dictionary describing the completed shard, as stored in its checkpoint.
+
+    Raises:
+        ValueError: If the checkpoint of the shard was made for another embedding.
+    """
+    problems = node_problems(gewirtz_svg_filepath) if _worker_problems is None else _worker_problems
+    problem = problems[problem_index]
+    digest = embedding_digest(gewirtz_svg_filepath)
+    filepath = _checkpoint_filepath(checkpoint_dirpath, digest, problem.g_node, prefix)
+
+    state = {'embedding': digest, 'g_node': problem.g_node, 'prefix': list(prefix), 'enumeration': ENUMERATION,
+             'top_k': top_k, 'position': 0, 'complete': False, 'top': []}
+    if os.path.exists(filepath):
+        with open(filepath) as checkpoint_file:
+            saved_state = json.load(checkpoint_file)
+        if saved_state.get('embedding') != digest:
+            raise ValueError("Checkpoint {} was made for embedding {!r}, not {!r}".format(
+                filepath, saved_state.get('embedding'), digest))
+        # A shard retaining another number of permutations, or whose position is counted
+        # in another order, is meaningless, so starts afresh
+        if saved_state.get('top_k') == top_k and (
+                saved_state.get('enumeration') == ENUMERATION or saved_state['complete']):
+            state = saved_state
+        if state['complete']:
+            return state
+
+    # A heap of the best permutations, with the worst at the root
+    top = [(-aspl, tuple(order)) for aspl, order in state['top']]
+    heapq.heapify(top)
+
+    # The permutations of the shard are the prefix followed by each permutation of the rest, in
+    # Steinhaus-Johnson-Trotter order, made from the permutation at the position by the swap stream
+    rest = [i for i in range(len(problem.targets)) if i not in prefix]
+    num_permutations = factorial(len(rest))
+    if state['position'] < num_permutations:
+        order = list(prefix) + [rest[i] for i in unrank(state['position'], len(rest))]
+        adjacency = problem.adjacency_of(order)
+        swaps = transpositions(len(rest), state['position'])
+    adjacencies = numpy.empty((batch_size,) + problem.adjacency.shape, dtype=problem.adjacency.dtype)
+    since_checkpoint = 0
+    while state['position'] < num_permutations:
+        batch = []
+        for index in range(min(batch_size, num_permutations - state['position'])):
+            adjacencies[index] = adjacency
+            batch.append(tuple(order))
+            # Step to the next permutation, if any
+            swap = next(swaps, None)
+            if swap is not None:
+                problem.swap_attachments(adjacency, order, swap + len(prefix))
+        union = problem.disjoint_union(adjacencies[:len(batch)])
+        aspls = batched_average_shortest_path_lengths(union, len(batch), _worker_buffers)
+        for aspl, permutation in zip(aspls.tolist(), batch):
+            item = (-aspl, permutation)
+            if len(top) < top_k:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+        state['position'] += len(batch)
+        since_checkpoint += len(batch)
+        if since_checkpoint >= checkpoint_interval:
+            state['top'] = sorted([-negative_aspl, list(order)] for negative_aspl, order in top)
+            write_json_atomically(filepath, state)
+            since_checkpoint = 0
 
-        for g_edge in g.edges:
-            if g_node not in g_edge:
-                s.add_edge(*g_edge)
+    state['top'] = sorted([-negative_aspl, list(order)] for negative_aspl, order in top)
+    state['complete'] = True
+    write_json_atomically(filepath, state)
+    return state
 
-        s = union(s, p, rename=('', '{}-'.format(g_node)))
 
-        assert len(s) == 65
+def _search_shard(args):
+    return search_shard(*args)
 
-        print(s.nodes)
 
-        targets = [str((g_node + offset) % len(g_vertex_list)) for offset in offsets]
+def find_optimal_permutations_for_node(gewirtz_svg_filepath, checkpoint_dirpath, workers=1, top_k=10,
+                                       prefix_length=1, checkpoint_interval=65536, results_filepath=None):
+    """Find the best attachments of a Petersen graph to one vertex of each Gewirtz symmetry orbit.
 
-        print("source = {}, targets = {}".format(g_node, targets))
+    Args:
+        gewirtz_svg_filepath: An SVG file containing a symmetrical embedding of the Gewirtz graph.
+        checkpoint_dirpath: A directory in which shard checkpoints are kept. An interrupted
+            search resumes from the checkpoints it finds there.
+        workers: The number of worker processes.
+        top_k: The number of best permutations to retain for each vertex.
+        prefix_length: The number of leading permutation elements which define a shard.
+        checkpoint_interval: The approximate number of permutations between checkpoints.
+        results_filepath: The JSON file in which the results are saved. Defaults to
+            results.json in the checkpoint directory.
 
-        min_aspl = float("+inf")
-        t = s.copy()     # We add and remove edges from a single copy of the graph
-        gp_edges = []    # rather than making a new graph every time for performance reasons
-        for i, target_g_nodes in enumerate(permutations(targets)):
-            #print(target_g_nodes)
+    Returns:
+        A dictionary mapping each representative Gewirtz vertex to a list of its top_k
+        (aspl, targets) pairs in ascending order of ASPL, where targets is the sequence
+        of Gewirtz vertices attached to each Petersen vertex in turn.
+    """
+    os.makedirs(checkpoint_dirpath, exist_ok=True)
+    problems = node_problems(gewirtz_svg_filepath)
 
-            assert len(p.nodes) == len(target_g_nodes)
+    tasks = [(gewirtz_svg_filepath, problem_index, prefix, checkpoint_dirpath, top_k, 1024, checkpoint_interval)
+             for problem_index, problem in enumerate(problems)
+             for prefix in permutations(range(len(problem.targets)), prefix_length)]
 
-            gp_edges.clear()
-            for p_node, target_g_node in zip(p.nodes, target_g_nodes):
-                tp_node = '{}-{}'.format(g_node, p_node)
-                #print(tp_node, target_g_node)
-                gp_edges.append((tp_node, target_g_node))
-                #t.add_edge(tp_node, target_g_node)
-            #print(len(t))
+    results = {problem.g_node: [] for problem in problems}
+    # Workers attach the problems through shared memory rather than each making their own
+    shared_dirpath = None
+    pool = None
+    if workers > 1:
+        shared_dirpath = share_arrays(_shared_arrays(problems))
+    try:
+        if workers > 1:
+            pool = Pool(workers, initializer=_initialize_worker, initargs=(shared_dirpath,))
+        else:
+            _initialize_worker()
+        shards = pool.imap_unordered(_search_shard, tasks) if pool is not None else map(_search_shard, tasks)
+        for shard in shards:
+            results[shard['g_node']].extend(shard['top'])
+            print("Completed shard {} of vertex {}: best ASPL {}".format(
+                shard['prefix'], shard['g_node'], shard['top'][0][0] if shard['top'] else None))
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if shared_dirpath is not None:
+            release_arrays(shared_dirpath)
 
-            t.add_edges_from(gp_edges)
+    targets = {problem.g_node: problem.targets for problem in problems}
+    results = {g_node: [(aspl, [targets[g_node][i] for i in order]) for aspl, order in sorted(candidates)[:top_k]]
+               for g_node, candidates in results.items()}
 
-            #assert len(t) == 65
-            #assert len(t.edges) == 295
+    if results_filepath is None:
+        results_filepath = os.path.join(checkpoint_dirpath, 'results.json')
+    write_json_atomically(results_filepath, {
+        'embedding': gewirtz_svg_filepath,
+        'nodes': {str(g_node): [{'aspl': aspl, 'targets': node_targets} for aspl, node_targets in top]
+                  for g_node, top in results.items()},
+    })
+    return results
 
-            # TODO: Remember which permuation improved the ASPL!
-            aspl = average_shortest_path_length(t)
-            if aspl < min_aspl:
-                print("New minimum ASPL: {aspl} for permutation {i} which is {target_g_nodes}".format(
-                    aspl=aspl, i=i, target_g_nodes=target_g_nodes))
-                min_aspl = aspl
 
-            t.remove_edges_from(gp_edges)
-            #assert len(t) == 65
-            #assert len(t.edges) == 285
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Exhaustively search the attachments of a Petersen graph to each Gewirtz vertex.")
+    parser.add_argument('embedding', nargs='?', default=DEFAULT_GEWIRTZ_SVG_FILEPATH,
+                        help="An SVG file containing a symmetrical embedding of the Gewirtz graph.")
+    parser.add_argument('--checkpoint-dir', default='optimize-checkpoints',
+                        help="The directory in which progress is checkpointed and results saved.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="The number of worker processes.")
+    parser.add_argument('--top-k', type=int, default=10,
+                        help="The number of best permutations to retain for each vertex.")
+    parser.add_argument('--prefix-length', type=int, default=1,
+                        help="The number of leading permutation elements defining each shard.")
+    parser.add_argument('--checkpoint-interval', type=int, default=65536,
+                        help="The approximate number of permutations between checkpoints.")
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
-    find_optimal_permutations_for_node("/Users/rjs/dev/g560/embeddings/Gewirtz_graph_embeddings_1.svg")
\ No newline at end of file
+    args = parse_args(sys.argv[1:])
+    find_optimal_permutations_for_node(args.embedding, args.checkpoint_dir, workers=args.workers,
+                                       top_k=args.top_k, prefix_length=args.prefix_length,
+                                       checkpoint_interval=args.checkpoint_interval)